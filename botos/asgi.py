@@ -0,0 +1,27 @@
+"""
+ASGI config for botos project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+The ASGI application can serve everything the WSGI application serves. It
+must be used to serve the live results stream, so that the connections of the
+clients watching the results do not pin worker processes.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'botos.settings')
+
+# Every request served through ASGI runs its database queries in a thread of
+# its own, so a persistent connection would never be reused by another
+# request, and would be left open until it gets too old. So, connections are
+# always closed at the end of every request, whatever
+# BOTOS_DATABASE_CONN_MAX_AGE is set to.
+os.environ['BOTOS_DATABASE_CONN_MAX_AGE'] = '0'
+
+application = get_asgi_application()
@@ -15,9 +15,12 @@ import sys
 
 
 def get_env_var(var_name, env_source=os.environ, value_meanings=None,
-                debug=False, debug_value=None):
+                debug=False, debug_value=None, default=None):
     # We use this function to get environment variables in order for this
     # settings module to be testable.
+    #
+    # Variables that have a default are optional, and the default is used
+    # when they do not exist, even when not in debug mode.
     if debug:
         return debug_value
 
@@ -43,6 +46,9 @@ def get_env_var(var_name, env_source=os.environ, value_meanings=None,
     try:
         env_value = env_source[var_name]
     except KeyError:
+        if default is not None:
+            return default
+
         error_message = (
             'Environment variable, {}, does not exist. '
             'Make sure that the variable exists.{}'
@@ -93,6 +99,23 @@ SECRET_KEY = get_env_var(
 )
 
 # Database setup
+#
+# Opening a database connection takes up a noticeable part of a request, and
+# every voter logs in within a short window on election day. So, connections
+# are kept open for BOTOS_DATABASE_CONN_MAX_AGE seconds, and reused by the
+# requests served by the same worker in the meantime. Setting it to 0 closes
+# connections at the end of every request. Reused connections are checked
+# before being used, so that a restart of the database server does not make
+# requests fail. Use the `benchmarkconnections` management command to see how
+# much time these save per request. The ASGI application ignores
+# BOTOS_DATABASE_CONN_MAX_AGE, and always closes connections at the end of
+# every request (see `botos/asgi.py`).
+#
+# Django 5.0 does not pool connections by itself. To share a small number of
+# connections among many worker processes, put a connection pooler (e.g.
+# PgBouncer) in front of the database server, and set BOTOS_DATABASE_POOLER to
+# True. Server-side cursors do not work with poolers in transaction pooling
+# mode, so they get disabled.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -101,6 +124,30 @@ DATABASES = {
         'NAME': get_env_var('BOTOS_DATABASE_NAME'),
         'USER': get_env_var('BOTOS_DATABASE_USERNAME'),
         'PASSWORD': get_env_var('BOTOS_DATABASE_PASSWORD'),
+        'CONN_MAX_AGE': int(
+            get_env_var('BOTOS_DATABASE_CONN_MAX_AGE', default='60')
+        ),
+        'CONN_HEALTH_CHECKS': get_env_var(
+            'BOTOS_DATABASE_CONN_HEALTH_CHECKS',
+            value_meanings={
+                "True": True, "1": True, "False": False, "0": False
+            },
+            default=True
+        ),
+        'DISABLE_SERVER_SIDE_CURSORS': get_env_var(
+            'BOTOS_DATABASE_POOLER',
+            value_meanings={
+                "True": True, "1": True, "False": False, "0": False
+            },
+            default=False
+        ),
+        'OPTIONS': {
+            # Fail fast instead of letting requests pile up when the database
+            # server cannot be reached.
+            'connect_timeout': int(
+                get_env_var('BOTOS_DATABASE_CONNECT_TIMEOUT', default='10')
+            )
+        },
         'TEST': {
             'NAME': get_env_var('BOTOS_TEST_DATABASE_NAME')
         }
@@ -116,6 +163,78 @@ MEDIA_ROOT = get_env_var('BOTOS_MEDIA_ROOT',
                          debug=DEBUG,
                          debug_value=os.path.join(BASE_DIR, 'botos/media/'))
 
+# Cache setup
+#
+# The cache must be shared by all the worker processes serving Botos (e.g. all
+# the Gunicorn workers), since it is used to let the workers know when the
+# cached app settings must be reloaded, among other things. A file-based cache
+# is shared by all the workers in the same machine, and does not need any
+# additional service to be running.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': get_env_var(
+            'BOTOS_CACHE_ROOT',
+            debug=DEBUG,
+            debug_value=os.path.join(BASE_DIR, 'botos/cache/')
+        ),
+    }
+}
+
+# Results export setup
+#
+# The exported results are kept outside of the media root, since they must
+# only be downloadable by admins.
+EXPORT_ROOT = get_env_var(
+    'BOTOS_EXPORT_ROOT',
+    debug=DEBUG,
+    debug_value=os.path.join(BASE_DIR, 'botos/exports/')
+)
+
+# Password hashing setup
+#
+# Every voter logs in within a short window on election day, so hashing
+# passwords is what takes up most of the CPU time of logging in. Voter
+# accounts only last for an election, and get random passwords (see the
+# `generatecredentials` management command), so their passwords are hashed
+# with a cheaper, tunable profile. Admin passwords are hashed with the first
+# hasher in PASSWORD_HASHERS. Passwords hashed with an outdated profile are
+# rehashed when their users log in. Use the `benchmarklogins` management
+# command to see how many logins per second a CPU core can handle with the
+# current profile.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'core.hashers.VoterPBKDF2PasswordHasher',
+    'core.hashers.VoterScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+VOTER_PASSWORD_HASHER = get_env_var(
+    'BOTOS_VOTER_PASSWORD_HASHER',
+    value_meanings={
+        'pbkdf2': 'voter_pbkdf2_sha256',
+        'scrypt': 'voter_scrypt'
+    },
+    default='voter_pbkdf2_sha256'
+)
+VOTER_PASSWORD_ITERATIONS = int(
+    get_env_var('BOTOS_VOTER_PASSWORD_ITERATIONS', default='100000')
+)
+VOTER_PASSWORD_SCRYPT_WORK_FACTOR = int(
+    get_env_var('BOTOS_VOTER_PASSWORD_SCRYPT_WORK_FACTOR', default='16384')
+)
+
+# Ballot encryption setup
+#
+# The ballots of elections with a key pair are encrypted with Paillier
+# encryption (see `core.encryption`). This is the size of the key pairs
+# generated for the elections, in bits.
+BALLOT_ENCRYPTION_KEY_SIZE = int(
+    get_env_var('BOTOS_BALLOT_ENCRYPTION_KEY_SIZE', default='2048')
+)
+
 # Allowed hosts setup
 ALLOWED_HOSTS = list(
     map(
@@ -135,12 +254,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.staticfiles',
     'django.contrib.messages',
+    'django.contrib.postgres',
     'dal',
     'dal_select2',
     'django.contrib.admin'
 ]
 
 MIDDLEWARE = [
+    # This must be the first middleware, so that it measures the time spent in
+    # the other middleware as well.
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -154,7 +277,9 @@ ROOT_URLCONF = 'botos.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django template backend, but with the time spent rendering
+        # templates added to the request metrics.
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [ os.path.join(BASE_DIR, 'botos/templates') ],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -171,6 +296,36 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'botos.wsgi.application'
 
+# Request metrics and logging setup
+#
+# When enabled, the number of SQL queries, and the time spent on the database,
+# on rendering templates, and on the whole request are measured for every
+# request to a view. The metrics are logged to the `botos.requests` logger,
+# and a summary of the most recent requests is shown in the election settings
+# page of the admin panel. This is disabled by default, since it adds a bit of
+# work to every request.
+REQUEST_METRICS = get_env_var(
+    'BOTOS_REQUEST_METRICS',
+    value_meanings={ "True": True, "1": True, "False": False, "0": False },
+    default=False
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'botos': {
+            'handlers': [ 'console' ],
+            'level': 'INFO',
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
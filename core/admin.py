@@ -1,3 +1,4 @@
+import json
 import urllib
 
 from django import forms
@@ -7,14 +8,17 @@ from django.contrib import (
 from django.contrib.admin.utils import model_ngettext
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.core.paginator import Paginator
+from django.db import connections
 from django.db.models import (
-    F, Q
+    Q, QuerySet
 )
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
 from django.urls import (
     path, reverse
 )
+from django.utils.functional import cached_property
 from django.utils.translation import ngettext
 
 from core.forms.admin import (
@@ -24,11 +28,70 @@ from core.forms.admin import (
 )
 from core.models import (
     User, Batch, Section, VoterProfile, Candidate, CandidateParty,
-    CandidatePosition, UserType, Election, Vote
+    CandidatePosition, UserType, Election
 )
+from core.utils import clear_election_votes
 from core.views.admin.admin import ClearElectionConfirmationView
 
 
+# Querysets with at least this many rows, as estimated by the query planner,
+# get their counts estimated by `EstimatedCountPaginator`.
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the number of rows estimated by the query planner as
+    the count, instead of counting the rows, if the estimate is at least
+    ESTIMATED_COUNT_THRESHOLD. PostgreSQL has to scan every row to count
+    them, which gets slow for large tables, while the estimate comes from
+    the table statistics. Since the estimate may be off, the last page may
+    have fewer rows than expected. Smaller querysets, and querysets in other
+    databases, are counted exactly.
+
+    The counts are only estimated if `estimate_count` is True. The estimates
+    of filtered querysets can be far off (e.g. a search that only matches a
+    few rows may be estimated to match thousands), which would make pages
+    that do not exist get linked to. So, only the counts of unfiltered
+    querysets should be estimated.
+    """
+    def __init__(self, *args, estimate_count=False, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.estimate_count = estimate_count
+
+    @cached_property
+    def count(self):
+        if not self.estimate_count:
+            return super().count
+
+        estimated_count = self._get_estimated_count()
+        if (estimated_count is None
+                or estimated_count < ESTIMATED_COUNT_THRESHOLD):
+            return super().count
+
+        return estimated_count
+
+    def _get_estimated_count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return None
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+            plan = cursor.fetchone()[0]
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return plan[0]['Plan']['Plan Rows']
+
+
 class BaseUserAdmin(UserAdmin):
     fieldsets = (
         (
@@ -126,32 +189,56 @@ class VoterAdmin(BaseUserAdmin):
         'voter_profile__section',
     )
 
+    # Counting every voter on every page load gets slow with large numbers
+    # of voters, so the count is estimated for large tables instead. Filtered
+    # and searched voters are still counted exactly (see get_paginator()).
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     def batch(self, obj):
         return obj.voter_profile.batch.year
 
     batch.short_description = 'Batch'
-    batch.admin_order_field = 'batch'
+    batch.admin_order_field = 'voter_profile__batch__year'
 
     def section(self, obj):
         return obj.voter_profile.section.section_name
 
     section.short_description = 'Section'
-    section.admin_order_field = 'section'
+    section.admin_order_field = 'voter_profile__section__section_name'
 
     def election(self, obj):
         return obj.voter_profile.batch.election.name
 
-    # TODO: Fix error when sorting by batch. This error may also occur when
-    #       sorting by section.
+    election.short_description = 'Election'
+    election.admin_order_field = 'voter_profile__batch__election__name'
 
     def get_queryset(self, request):
+        # The batch, section, and election of each voter are shown in the
+        # changelist, so they are joined in, instead of being queried for
+        # every row.
         return self.model.objects \
                          .filter(type=UserType.VOTER) \
-                         .select_related('voter_profile') \
-                         .annotate(
-                            batch=F('voter_profile__batch'),
-                            section=F('voter_profile__section')
-                          )
+                         .select_related(
+                             'voter_profile__batch__election',
+                             'voter_profile__section'
+                         )
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        # The changelist applies its filters and searches on top of the
+        # queryset from get_queryset(), so the queryset is unfiltered if it
+        # has the same conditions as that queryset.
+        is_unfiltered = \
+            queryset.query.where == self.get_queryset(request).query.where
+
+        return self.paginator(
+            queryset,
+            per_page,
+            orphans,
+            allow_empty_first_page,
+            estimate_count=is_unfiltered
+        )
 
     def change_view(self, request, object_id, form_url='', extra_context=None):
         if request.method == 'POST':
@@ -417,11 +504,7 @@ class ElectionAdmin(admin.ModelAdmin):
         if request.method == 'POST' and 'clear_elections' in request.POST:
             num_elections = queryset.count()
             for election in queryset:
-                Vote.objects.filter(election=election).delete()
-                voter_profiles = VoterProfile.objects.filter(
-                    batch__election=election
-                )
-                voter_profiles.update(has_voted=False)
+                clear_election_votes(election)
 
             messages.success(
                 request,
@@ -0,0 +1,261 @@
+"""
+Public bulletin board of vote receipts.
+
+Every cast ballot gets a receipt, which is appended to the receipt log of its
+election. The log is a Merkle tree, hashed the same way as the logs of
+Certificate Transparency (RFC 6962), so that the log can be checked with
+existing tools. The hash of a receipt is `SHA-256(0x00 || receipt)`, and the
+hash of a node is `SHA-256(0x01 || left || right)`, where the receipt and
+hashes are in bytes. The root of an empty log is `SHA-256()`.
+
+The root of the log is public. Voters can check that their ballots are in
+the log with an inclusion proof, which only has O(log n) hashes for a log
+with n receipts. Since the log is append-only, once voters have checked their
+receipts against a root, their ballots cannot be removed from the log
+without changing the root.
+
+The log does not prove that the ballots were counted. The receipts are not
+linked to the votes, encrypted ballots, and tallies stored in the database,
+so changing those is not detected by checking receipts.
+"""
+import hashlib
+import json
+import secrets
+
+from django.db.models import Q
+
+from core.models import (
+    Receipt, ReceiptLog, ReceiptLogNode
+)
+
+
+EMPTY_ROOT = hashlib.sha256().hexdigest()
+
+
+def create_receipt(election_id, ballot):
+    """
+    Create the receipt of `ballot`, which can be anything that can be
+    serialized to JSON, in the election with an ID of `election_id`. The
+    receipt is the SHA-256 hash, in hexadecimal, of the ballot and a random
+    nonce. The nonce is thrown away, so that the receipt does not reveal the
+    votes in the ballot.
+    """
+    data = json.dumps(
+        {
+            'election': election_id,
+            'ballot': ballot,
+            'nonce': secrets.token_hex(32)
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def append_receipt(election_id, receipt):
+    """
+    Append `receipt` to the receipt log of the election with an ID of
+    `election_id`. Must be called inside a transaction. The receipt log of
+    the election is locked until the transaction ends, so this should be
+    called as late in the transaction as possible. Returns the receipt.
+    """
+    # The log is created along with the first receipt. Other ballots may be
+    # creating the log at the same time, so conflicts are ignored. This is
+    # done for every receipt, so that casting the first ballot does not take
+    # more queries than casting the rest.
+    ReceiptLog.objects.bulk_create(
+        [ ReceiptLog(election_id=election_id) ],
+        ignore_conflicts=True
+    )
+    receipt_log = ReceiptLog.objects \
+                            .select_for_update() \
+                            .get(election__id=election_id)
+
+    # Each complete subtree in the frontier with the same level as the new
+    # node is merged with the node, the same way as adding 1 to a binary
+    # number carries over.
+    level = 0
+    index = receipt_log.size
+    node_hash = hash_receipt(receipt)
+    nodes = [
+        ReceiptLogNode(
+            election_id=election_id,
+            level=level,
+            index=index,
+            hash=node_hash
+        )
+    ]
+    frontier = receipt_log.frontier
+    while frontier and frontier[-1][0] == level:
+        _, left_hash = frontier.pop()
+        level += 1
+        index //= 2
+        node_hash = hash_children(left_hash, node_hash)
+        nodes.append(
+            ReceiptLogNode(
+                election_id=election_id,
+                level=level,
+                index=index,
+                hash=node_hash
+            )
+        )
+
+    frontier.append([ level, node_hash ])
+
+    log_receipt = Receipt.objects.create(
+        election_id=election_id,
+        index=receipt_log.size,
+        receipt=receipt
+    )
+    ReceiptLogNode.objects.bulk_create(nodes)
+
+    receipt_log.size += 1
+    receipt_log.frontier = frontier
+    receipt_log.save(update_fields=[ 'size', 'frontier', 'date_updated' ])
+
+    return log_receipt
+
+
+def get_root(receipt_log):
+    """
+    Get the root hash of `receipt_log`, which may be None if the log has no
+    receipts yet. No queries are made.
+    """
+    if receipt_log is None or receipt_log.size == 0:
+        return EMPTY_ROOT
+
+    return _hash_frontier(receipt_log.frontier)
+
+
+def get_inclusion_proof(receipt, receipt_log):
+    """
+    Get the inclusion proof of `receipt`, a receipt in `receipt_log`, for the
+    current root of the log. The proof is the list of the hashes needed to
+    get from the hash of the receipt to the root, from the bottom of the
+    tree up. Only the stored nodes in the proof are queried, with a single
+    query.
+    """
+    ranges = _get_proof_ranges(receipt.index, 0, receipt_log.size)
+
+    # Complete subtrees are stored. The rest are at the right edge of the
+    # log, and are hashed from the frontier.
+    frontier_starts = dict()
+    start = 0
+    for position, (level, _) in enumerate(receipt_log.frontier):
+        frontier_starts[start] = position
+        start += 2 ** level
+
+    node_keys = [
+        _get_node_key(start, end) for start, end in ranges
+            if _is_complete(start, end)
+    ]
+    node_hashes = dict()
+    if node_keys:
+        query = Q()
+        for level, index in node_keys:
+            query |= Q(level=level, index=index)
+
+        nodes = ReceiptLogNode.objects \
+                              .filter(query) \
+                              .filter(election__id=receipt.election_id) \
+                              .values_list('level', 'index', 'hash')
+        node_hashes = {
+            (level, index): node_hash for level, index, node_hash in nodes
+        }
+
+    proof = list()
+    for start, end in ranges:
+        if _is_complete(start, end):
+            proof.append(node_hashes[_get_node_key(start, end)])
+        else:
+            proof.append(
+                _hash_frontier(
+                    receipt_log.frontier[frontier_starts[start]:]
+                )
+            )
+
+    return proof
+
+
+def verify_inclusion_proof(receipt, index, size, proof, root):
+    """
+    Check that `receipt` is at `index` of a log with `size` receipts and a
+    root of `root`, with the inclusion `proof`. This follows the
+    verification algorithm of RFC 9162.
+    """
+    if index >= size:
+        return False
+
+    first_node = index
+    last_node = size - 1
+    node_hash = hash_receipt(receipt)
+    for proof_hash in proof:
+        if last_node == 0:
+            return False
+
+        if first_node % 2 == 1 or first_node == last_node:
+            node_hash = hash_children(proof_hash, node_hash)
+            if first_node % 2 == 0:
+                while first_node % 2 == 0 and first_node != 0:
+                    first_node //= 2
+                    last_node //= 2
+        else:
+            node_hash = hash_children(node_hash, proof_hash)
+
+        first_node //= 2
+        last_node //= 2
+
+    return last_node == 0 and node_hash == root
+
+
+def hash_receipt(receipt):
+    return hashlib.sha256(b'\x00' + bytes.fromhex(receipt)).hexdigest()
+
+
+def hash_children(left_hash, right_hash):
+    return hashlib.sha256(
+        b'\x01' + bytes.fromhex(left_hash) + bytes.fromhex(right_hash)
+    ).hexdigest()
+
+
+def _hash_frontier(frontier):
+    # The subtrees are merged from right to left, since the left subtrees of
+    # the log are always the larger ones.
+    node_hash = frontier[-1][1]
+    for _, left_hash in reversed(frontier[:-1]):
+        node_hash = hash_children(left_hash, node_hash)
+
+    return node_hash
+
+
+def _get_proof_ranges(index, start, end):
+    """
+    Get the ranges of receipts whose subtrees make up the inclusion proof of
+    the receipt at `index` in the subtree of the receipts from `start` up to,
+    but not including, `end`. The ranges are ordered from the bottom of the
+    tree up.
+    """
+    ranges = list()
+    while end - start > 1:
+        # The left subtree is the largest complete subtree that is smaller
+        # than the subtree.
+        split = 2 ** ((end - start - 1).bit_length() - 1)
+        if index < start + split:
+            ranges.append(( start + split, end ))
+            end = start + split
+        else:
+            ranges.append(( start, start + split ))
+            start += split
+
+    ranges.reverse()
+    return ranges
+
+
+def _is_complete(start, end):
+    # Subtrees are complete if they have a power of two number of receipts.
+    num_receipts = end - start
+    return num_receipts & (num_receipts - 1) == 0
+
+
+def _get_node_key(start, end):
+    level = (end - start).bit_length() - 1
+    return ( level, start >> level )
@@ -0,0 +1,278 @@
+"""
+Encryption of the ballots of elections with a Paillier key pair.
+
+Paillier encryption is additively homomorphic: multiplying two ciphertexts
+gives the encryption of the sum of their plaintexts. So, each vote is
+encrypted as 1 or 0, and the encrypted votes of a candidate are summed into
+an encrypted tally, without ever decrypting them. Only the final tally of
+each candidate has to be decrypted.
+
+Encrypting a number takes two steps. The number is first turned into a
+"nude" ciphertext, which is cheap. The nude ciphertext is then obfuscated by
+multiplying it with `r^n mod n^2`, where `r` is a random number, which takes
+up almost all of the time of encrypting. The obfuscators do not depend on the
+number being encrypted, so they are precomputed in the background (see
+`ObfuscatorPool`), keeping them out of the requests that cast ballots.
+
+Once an election is over, its tallies are summed up from the encrypted
+ballots and decrypted by the `finalizetally` management command.
+"""
+import collections
+import concurrent.futures
+import functools
+import random
+import threading
+
+from phe import paillier
+from phe.util import (
+    mulmod, powmod
+)
+
+from django.conf import settings
+
+from core.models import (
+    ElectionKey, Vote, VoterProfile
+)
+from core.utils import AppSettings
+
+
+# The number of obfuscators kept precomputed for each public key. The pool is
+# refilled once it is down to half of this.
+OBFUSCATOR_POOL_SIZE = 256
+
+# Obfuscators are computed by a single background thread, so that computing
+# them does not take up more than a core of each process.
+_obfuscator_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='botos-obfuscators'
+)
+
+_obfuscator_pools = dict()
+_obfuscator_pools_lock = threading.Lock()
+
+_system_random = random.SystemRandom()
+
+
+def check_election_key_can_be_generated(election):
+    """
+    Raise a ValueError, with the reason as its message, if a key pair cannot
+    be generated for `election`. Key pairs can only be generated while the
+    elections are closed, and for elections without a key pair and without
+    votes, since ballots cast before and after the key pair was generated
+    could not be tallied together.
+    """
+    if AppSettings().get('election_state', 'closed') == 'open':
+        raise ValueError(
+            'Keys cannot be generated while the elections are open.'
+        )
+
+    if ElectionKey.objects.filter(election=election).exists():
+        raise ValueError('The election has a key already.')
+
+    are_votes_present = Vote.objects.filter(election=election).exists() \
+        or VoterProfile.objects \
+                       .filter(batch__election=election, has_voted=True) \
+                       .exists()
+    if are_votes_present:
+        raise ValueError(
+            'Keys cannot be generated for elections that have votes already.'
+        )
+
+
+def generate_election_key(election):
+    """
+    Generate a Paillier key pair with BALLOT_ENCRYPTION_KEY_SIZE bits for
+    `election`, making its ballots get encrypted. Returns the election key.
+    """
+    return create_election_key(election, *generate_key_pair())
+
+
+def generate_key_pair():
+    """
+    Generate a Paillier key pair with BALLOT_ENCRYPTION_KEY_SIZE bits. Returns
+    the public key and the private key.
+    """
+    return paillier.generate_paillier_keypair(
+        n_length=settings.BALLOT_ENCRYPTION_KEY_SIZE
+    )
+
+
+def create_election_key(election, public_key, private_key):
+    """
+    Store the key pair of `election`, making its ballots get encrypted.
+    Returns the election key.
+    """
+    return ElectionKey.objects.create(
+        election=election,
+        public_key=str(public_key.n),
+        private_key={
+            'p': str(private_key.p),
+            'q': str(private_key.q)
+        }
+    )
+
+
+def get_public_key(election_key):
+    return paillier.PaillierPublicKey(int(election_key.public_key))
+
+
+def get_private_key(election_key):
+    return paillier.PaillierPrivateKey(
+        get_public_key(election_key),
+        int(election_key.private_key['p']),
+        int(election_key.private_key['q'])
+    )
+
+
+def encrypt_votes(public_key, candidate_ids, voted_candidate_ids):
+    """
+    Encrypt the votes of a ballot in a position, as a vector that maps each
+    ID in `candidate_ids`, as a string, to the ciphertext of 1 if the ID is
+    in `voted_candidate_ids`, or of 0 otherwise. The ciphertexts are in
+    decimal.
+    """
+    obfuscator_pool = get_obfuscator_pool(public_key)
+    return {
+        str(candidate_id): str(
+            _encrypt(
+                public_key,
+                int(candidate_id in voted_candidate_ids),
+                obfuscator_pool.get()
+            )
+        )
+        for candidate_id in candidate_ids
+    }
+
+
+def add_ciphertexts(public_key, ciphertexts):
+    """
+    Get the ciphertext of the sum of the plaintexts of `ciphertexts`. The
+    ciphertexts may be given as ints or in decimal.
+    """
+    ciphertext_sum = 1  # The nude ciphertext of 0.
+    for ciphertext in ciphertexts:
+        ciphertext_sum = mulmod(
+            ciphertext_sum,
+            int(ciphertext),
+            public_key.nsquare
+        )
+
+    return ciphertext_sum
+
+
+def sum_ciphertexts(public_key, ciphertexts, pool=None, fan_in=1000):
+    """
+    Get the ciphertext of the sum of the plaintexts of `ciphertexts` with a
+    tree reduction. The ciphertexts are summed in groups of `fan_in`, using
+    the processes of `pool` if there is one, and the sums of the groups are
+    then summed the same way, until only one sum is left.
+    """
+    ciphertexts = list(ciphertexts)
+    add = functools.partial(add_ciphertexts, public_key)
+    while len(ciphertexts) > 1:
+        groups = [
+            ciphertexts[index:index + fan_in]
+            for index in range(0, len(ciphertexts), fan_in)
+        ]
+        if pool is None:
+            ciphertexts = [ add(group) for group in groups ]
+        else:
+            ciphertexts = list(pool.map(add, groups))
+
+    return add(ciphertexts)
+
+
+def decrypt_ciphertexts(private_key, ciphertexts, pool=None):
+    """
+    Decrypt `ciphertexts`, using the processes of `pool` if there is one.
+    The ciphertexts may be given as ints or in decimal. Returns a list of
+    the plaintexts, in the same order as the ciphertexts.
+    """
+    decrypt = functools.partial(_decrypt, private_key)
+    if pool is None:
+        return [ decrypt(ciphertext) for ciphertext in ciphertexts ]
+
+    return list(pool.map(decrypt, ciphertexts))
+
+
+def get_obfuscator_pool(public_key):
+    """ Get the pool of precomputed obfuscators of `public_key`. """
+    with _obfuscator_pools_lock:
+        try:
+            return _obfuscator_pools[public_key.n]
+        except KeyError:
+            pool = ObfuscatorPool(public_key)
+            _obfuscator_pools[public_key.n] = pool
+
+    pool.refill()
+    return pool
+
+
+class ObfuscatorPool(object):
+    """
+    Pool of obfuscators of a public key, precomputed in a background thread.
+    Each obfuscator is only ever given out once, since reusing obfuscators
+    would let ciphertexts be linked to each other. Should the pool run out
+    (e.g. when a lot of ballots are cast at once), obfuscators are computed
+    on the spot until the pool is refilled.
+    """
+    def __init__(self, public_key, size=OBFUSCATOR_POOL_SIZE):
+        self._public_key = public_key
+        self._size = size
+        self._obfuscators = collections.deque()
+        self._lock = threading.Lock()
+        self._is_refilling = False
+
+    def __len__(self):
+        return len(self._obfuscators)
+
+    def get(self):
+        try:
+            obfuscator = self._obfuscators.popleft()
+        except IndexError:
+            obfuscator = _compute_obfuscator(self._public_key)
+
+        self.refill()
+        return obfuscator
+
+    def refill(self):
+        """
+        Refill the pool in the background, if it is down to half of its size
+        and is not already being refilled. Returns the future of the refill,
+        or None if the pool does not need to be refilled.
+        """
+        with self._lock:
+            if self._is_refilling or len(self) > self._size // 2:
+                return None
+
+            self._is_refilling = True
+
+        return _obfuscator_executor.submit(self._fill)
+
+    def _fill(self):
+        try:
+            while len(self) < self._size:
+                self._obfuscators.append(
+                    _compute_obfuscator(self._public_key)
+                )
+        finally:
+            with self._lock:
+                self._is_refilling = False
+
+
+# The modular arithmetic below is done with the helpers of the Paillier
+# library, which use gmpy2 when it is installed.
+def _compute_obfuscator(public_key):
+    r = _system_random.randrange(1, public_key.n)
+    return powmod(r, public_key.n, public_key.nsquare)
+
+
+def _decrypt(private_key, ciphertext):
+    return private_key.raw_decrypt(int(ciphertext))
+
+
+def _encrypt(public_key, plaintext, obfuscator):
+    # Since the generator of the key pairs is n + 1, the nude ciphertext of a
+    # plaintext is just 1 + n * plaintext (mod n^2).
+    nude_ciphertext = (1 + public_key.n * plaintext) % public_key.nsquare
+    return mulmod(nude_ciphertext, obfuscator, public_key.nsquare)
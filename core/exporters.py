@@ -0,0 +1,359 @@
+"""
+Exporters that write the results of the elections to files.
+
+The exporters are used by the export job worker (see the `runexportjobs`
+management command), so that results are exported outside of the requests
+of the admins.
+"""
+import csv
+import io
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import (
+    Alignment, Font
+)
+from openpyxl.utils import get_column_letter
+
+from django.db.models import Count
+from django.db.models.functions import Coalesce
+
+from core.models import (
+    Candidate, CandidateParty, CandidatePosition, Election, ExportFormat,
+    Vote, VoterProfile
+)
+
+
+class ResultsExporter(object):
+    """
+    Base class of the results exporters.
+
+    Subclasses must implement `write(election_id, export_file)`, which writes
+    the results of the election with an ID of `election_id` to the binary
+    file `export_file`. The results of all elections are written if
+    `election_id` is None.
+    """
+    def write(self, election_id, export_file):
+        raise NotImplementedError
+
+    def _get_elections(self, election_id):
+        elections = Election.objects.all()
+        if election_id:
+            elections = [ elections.get(id=election_id) ]
+
+        return elections
+
+    def _get_positions_and_parties(self, election):
+        positions = list(CandidatePosition.objects.filter(election=election))
+        parties = list(CandidateParty.objects.filter(election=election))
+
+        return positions, parties
+
+    def _get_grouped_candidates(self, election):
+        """
+        Get the candidates of the election, with their total votes, grouped
+        by `(position_id, party_id)`.
+        """
+        candidates = Candidate.objects \
+                              .filter(election=election) \
+                              .select_related('user') \
+                              .annotate(
+                                  total_votes=Coalesce(
+                                      'tally__total_votes', 0
+                                  )
+                              )
+        grouped_candidates = dict()
+        for candidate in candidates:
+            key = (candidate.position_id, candidate.party_id)
+            grouped_candidates.setdefault(key, list()).append(candidate)
+
+        return grouped_candidates
+
+    def _get_batch_sections(self, election):
+        """
+        Get the batches and sections that have voters in the election, in the
+        order they are shown in the header, as a list of
+        `(batch_id, batch_year, [ (section_id, section_name), ... ])` tuples.
+        """
+        voter_sections = VoterProfile.objects \
+                                     .filter(batch__election=election) \
+                                     .order_by(
+                                         'batch__year',
+                                         'batch_id',
+                                         'section__section_name',
+                                         'section_id'
+                                     ) \
+                                     .values_list(
+                                         'batch_id',
+                                         'batch__year',
+                                         'section_id',
+                                         'section__section_name'
+                                     ) \
+                                     .distinct()
+
+        batch_sections = list()
+        for batch_id, batch_year, section_id, section_name in voter_sections:
+            if len(batch_sections) == 0 or batch_sections[-1][0] != batch_id:
+                batch_sections.append((batch_id, batch_year, list()))
+
+            batch_sections[-1][2].append((section_id, section_name))
+
+        return batch_sections
+
+    def _get_num_votes_matrix(self, election):
+        """
+        Get the number of votes each candidate in the election got from each
+        batch and section, keyed by `(candidate_id, batch_id, section_id)`.
+        """
+        num_votes = Vote.objects \
+                        .filter(election=election) \
+                        .order_by() \
+                        .values_list(
+                            'candidate_id',
+                            # Temporary fix while a section can be used by
+                            # different students in different batches. :-(
+                            'user__voter_profile__batch_id',
+                            'user__voter_profile__section_id'
+                        ) \
+                        .annotate(num_votes=Count('id'))
+
+        return {
+            (candidate_id, batch_id, section_id): count
+            for candidate_id, batch_id, section_id, count in num_votes
+        }
+
+
+class XLSXResultsExporter(ResultsExporter):
+    """
+    Exports the results to an XLSX file, with each election having its own
+    worksheet.
+    """
+    def write(self, election_id, export_file):
+        elections = self._get_elections(election_id)
+
+        # We use a write-only workbook so that rows are written to disk as
+        # soon as they are appended. As a consequence, rows must be written
+        # in order, and column widths and merged cells must be set before the
+        # rows are written.
+        wb = Workbook(write_only=True)
+        for election in elections:
+            self._write_election_worksheet(wb, election)
+
+        if len(wb.worksheets) == 0:
+            # A workbook must have at least one worksheet.
+            wb.create_sheet()
+
+        wb.save(export_file)
+
+    def _write_election_worksheet(self, wb, election):
+        ws = wb.create_sheet(election.name)
+
+        batch_sections = self._get_batch_sections(election)
+        section_keys = [
+            (batch_id, section_id)
+            for batch_id, _, sections in batch_sections
+            for section_id, _ in sections
+        ]
+        num_votes_matrix = self._get_num_votes_matrix(election)
+
+        # +2 since we have a column for the candidates and another column
+        # for the total votes.
+        num_columns = len(section_keys) + 2
+
+        grouped_candidates = self._get_grouped_candidates(election)
+        len_longest_cand_name = max(
+            [
+                len(str(candidate))
+                for candidates in grouped_candidates.values()
+                for candidate in candidates
+            ],
+            default=0
+        )
+
+        # Set up the column widths and the merged cells.
+        # +12 for spacing.
+        ws.column_dimensions['A'].width = len_longest_cand_name + 12
+        ws.column_dimensions[get_column_letter(num_columns)].width = 14
+
+        last_column_letter = get_column_letter(num_columns)
+        ws.merged_cells.add('A1:{}1'.format(last_column_letter))
+        ws.merged_cells.add('B2:{}2'.format(last_column_letter))
+        ws.merged_cells.add('A2:A4')
+        ws.merged_cells.add(
+            '{0}3:{0}4'.format(last_column_letter)
+        )
+
+        curr_batch_col = 2
+        for _, _, sections in batch_sections:
+            if len(sections) > 1:
+                ws.merged_cells.add('{}3:{}3'.format(
+                    get_column_letter(curr_batch_col),
+                    # We need a -1 here, because, otherwise, we'll invade
+                    # one cell of an adjacent batch cell.
+                    get_column_letter(curr_batch_col + (len(sections) - 1))
+                ))
+
+            for section_idx, (_, section_name) in enumerate(sections):
+                col_letter = get_column_letter(curr_batch_col + section_idx)
+                col_width = len(section_name) + 4
+                ws.column_dimensions[col_letter].width = col_width
+
+            curr_batch_col += len(sections)
+
+        # Set up the sheet header.
+        centered = Alignment(horizontal='center', vertical='center')
+        ws.append([
+            self._make_cell(
+                ws,
+                '{} Results'.format(election.name),
+                alignment=centered
+            )
+        ])
+        ws.append([
+            self._make_cell(ws, 'Candidates', alignment=centered),
+            self._make_cell(
+                ws,
+                'Number of Votes',
+                alignment=Alignment(horizontal='center')
+            )
+        ])
+
+        batch_row = [ None ] * num_columns
+        section_row = [ None ] * num_columns
+        curr_batch_col = 2
+        for _, batch_year, sections in batch_sections:
+            batch_row[curr_batch_col - 1] = self._make_cell(
+                ws,
+                str(batch_year),
+                alignment=Alignment(horizontal='center')
+            )
+
+            for section_idx, (_, section_name) in enumerate(sections):
+                section_row[curr_batch_col + section_idx - 1] = \
+                    self._make_cell(
+                        ws,
+                        section_name,
+                        alignment=Alignment(horizontal='center')
+                    )
+
+            curr_batch_col += len(sections)
+
+        batch_row[num_columns - 1] = self._make_cell(
+            ws,
+            'Total Votes',
+            alignment=centered
+        )
+        ws.append(batch_row)
+        ws.append(section_row)
+
+        # Set up the candidate rows.
+        positions, parties = self._get_positions_and_parties(election)
+        for position in positions:
+            ws.append([
+                self._make_cell(ws, str(position), font=Font(bold=True))
+            ])
+
+            for party in parties:
+                ws.append([
+                    self._make_cell(ws, str(party), font=Font(italic=True))
+                ])
+
+                party_candidates = grouped_candidates.get(
+                    (position.id, party.id),
+                    list()
+                )
+                if len(party_candidates) > 0:
+                    for candidate in party_candidates:
+                        ws.append(self._get_candidate_votes_row(
+                            ws, candidate, section_keys, num_votes_matrix
+                        ))
+                else:
+                    ws.append(self._get_no_candidate_row(
+                        ws, num_columns
+                    ))
+
+    def _get_candidate_votes_row(self, ws, candidate, section_keys,
+                                 num_votes_matrix):
+        row = [ str(candidate) ]
+        for batch_id, section_id in section_keys:
+            row.append(
+                num_votes_matrix.get((candidate.id, batch_id, section_id), 0)
+            )
+
+        row.append(self._make_cell(
+            ws,
+            candidate.total_votes,
+            alignment=Alignment(horizontal='right')
+        ))
+
+        return row
+
+    def _get_no_candidate_row(self, ws, num_columns):
+        row = [ 'None' ]
+        for _ in range(num_columns - 1):
+            row.append(self._make_cell(
+                ws,
+                'N/A',
+                alignment=Alignment(horizontal='right')
+            ))
+
+        return row
+
+    def _make_cell(self, ws, value, alignment=None, font=None):
+        cell = WriteOnlyCell(ws, value=value)
+        if alignment is not None:
+            cell.alignment = alignment
+        if font is not None:
+            cell.font = font
+
+        return cell
+
+
+class CSVResultsExporter(ResultsExporter):
+    """
+    Exports the results to a CSV file. Each row has the number of votes a
+    candidate got from a section, and the total number of votes of the
+    candidate.
+    """
+    def write(self, election_id, export_file):
+        # The CSV writer needs a text file.
+        text_file = io.TextIOWrapper(export_file, encoding='utf-8', newline='')
+        writer = csv.writer(text_file)
+        writer.writerow([
+            'Election', 'Position', 'Party', 'Candidate', 'Batch', 'Section',
+            'Number of Votes', 'Total Votes'
+        ])
+
+        for election in self._get_elections(election_id):
+            batch_sections = self._get_batch_sections(election)
+            num_votes_matrix = self._get_num_votes_matrix(election)
+            grouped_candidates = self._get_grouped_candidates(election)
+            positions, parties = self._get_positions_and_parties(election)
+            for position in positions:
+                for party in parties:
+                    party_candidates = grouped_candidates.get(
+                        (position.id, party.id),
+                        list()
+                    )
+                    for candidate in party_candidates:
+                        for batch_id, batch_year, sections in batch_sections:
+                            for section_id, section_name in sections:
+                                num_votes = num_votes_matrix.get(
+                                    (candidate.id, batch_id, section_id),
+                                    0
+                                )
+                                writer.writerow([
+                                    election.name, str(position), str(party),
+                                    str(candidate), batch_year, section_name,
+                                    num_votes, candidate.total_votes
+                                ])
+
+        # Detach the wrapper, so that closing it does not close the file.
+        text_file.flush()
+        text_file.detach()
+
+
+RESULTS_EXPORTERS = {
+    ExportFormat.XLSX: XLSXResultsExporter,
+    ExportFormat.CSV: CSVResultsExporter
+}
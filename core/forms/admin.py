@@ -11,7 +11,7 @@ from dal import autocomplete
 
 from core.models import (
     User, Batch, Section, VoterProfile, Candidate, CandidateParty,
-    CandidatePosition, UserType, Election
+    CandidatePosition, UserType, Election, ExportJobStatus
 )
 from core.utils import AppSettings
 
@@ -61,6 +61,26 @@ class ElectionSettingsElectionStateForm(forms.Form):
         )
 
 
+class ElectionSettingsElectionKeyForm(forms.Form):
+    """
+    Form for generating the key pair of an election, which makes the ballots
+    of the election get encrypted. Only elections without a key pair, and
+    whose key pair is not already being generated, can be chosen.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['election'] = forms.ModelChoiceField(
+            queryset=Election.objects \
+                             .filter(key__isnull=True) \
+                             .exclude(
+                                 key_jobs__status__in=[
+                                     ExportJobStatus.PENDING,
+                                     ExportJobStatus.RUNNING
+                                 ]
+                             )
+        )
+
+
 # The following classes are based on the code by @kdh454 from:
 #    https://stackoverflow.com/a/17496836/1116098
 # and on the code by @adrianoviedo from:
@@ -0,0 +1,29 @@
+"""
+Password hashers for the passwords of voters.
+
+The hashers read their parameters from the project settings (see the
+VOTER_PASSWORD_* settings), so that the cost of hashing the passwords of
+voters can be tuned to the expected number of logins on election day without
+changing the hashers of admins. Passwords hashed with different parameters
+are rehashed with the current ones when their users log in.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher, ScryptPasswordHasher
+)
+
+
+class VoterPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    algorithm = 'voter_pbkdf2_sha256'
+
+    @property
+    def iterations(self):
+        return settings.VOTER_PASSWORD_ITERATIONS
+
+
+class VoterScryptPasswordHasher(ScryptPasswordHasher):
+    algorithm = 'voter_scrypt'
+
+    @property
+    def work_factor(self):
+        return settings.VOTER_PASSWORD_SCRYPT_WORK_FACTOR
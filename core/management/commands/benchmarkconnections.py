@@ -0,0 +1,124 @@
+"""
+Benchmarks the time database connections add to every request.
+
+The command simulates requests that each run a cheap query, so that most of
+their time is spent getting a database connection, and times them with a new
+connection opened for every request (i.e. when BOTOS_DATABASE_CONN_MAX_AGE is
+0), with a persistent connection, and with a persistent connection that is
+checked before being reused (i.e. when BOTOS_DATABASE_CONN_HEALTH_CHECKS is
+enabled). The requests go through the same request signals that open and
+close connections in real requests. The difference between the first and the
+last is roughly the time persistent connections save per request.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import (
+    request_finished, request_started
+)
+from django.db import connection
+
+from core.metrics import get_percentile
+from core.models import Election
+
+
+MODES = [
+    ( 'New connection per request', 0, False ),
+    ( 'Persistent connection', None, False ),
+    ( 'Persistent connection with health checks', None, True )
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the time database connections add to every request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help=(
+                'Specifies the number of requests to time for each way of '
+                'connecting. Defaults to 100.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('The number of requests must be at least 1.')
+
+        # Connections cannot be closed inside a transaction.
+        if connection.in_atomic_block:
+            raise CommandError(
+                'The benchmark cannot be run inside a transaction.'
+            )
+
+        request_times = dict()
+        for mode, conn_max_age, conn_health_checks in MODES:
+            request_times[mode] = self._time_requests(
+                options['requests'],
+                conn_max_age,
+                conn_health_checks
+            )
+
+        self.stdout.write(
+            '{:<42}{:>12}{:>12}'.format('Connection', 'Avg. (ms)', 'p95 (ms)')
+        )
+        for mode, _, _ in MODES:
+            times = request_times[mode]
+            self.stdout.write(
+                '{:<42}{:>12.2f}{:>12.2f}'.format(
+                    mode,
+                    sum(times) / len(times) * 1000,
+                    get_percentile(times, 95) * 1000
+                )
+            )
+
+        new_connection_times = request_times[MODES[0][0]]
+        persistent_connection_times = request_times[MODES[-1][0]]
+        self.stdout.write(
+            'Time saved per request by persistent connections: '
+            '{:.2f} ms'.format(
+                (sum(new_connection_times) - sum(persistent_connection_times))
+                / options['requests']
+                * 1000
+            )
+        )
+
+    def _time_requests(self, num_requests, conn_max_age, conn_health_checks):
+        """
+        Time `num_requests` simulated requests with the given connection
+        settings. Returns a list of the times of each request in seconds.
+        """
+        settings_dict = connection.settings_dict
+        original_conn_max_age = settings_dict['CONN_MAX_AGE']
+        original_conn_health_checks = settings_dict['CONN_HEALTH_CHECKS']
+
+        # The connection settings are only read when connecting, so we have
+        # to start from a closed connection.
+        connection.close()
+        settings_dict['CONN_MAX_AGE'] = conn_max_age
+        settings_dict['CONN_HEALTH_CHECKS'] = conn_health_checks
+        try:
+            # The first request opens the persistent connection, which is not
+            # what we want to time.
+            self._simulate_request()
+
+            times = list()
+            for _ in range(num_requests):
+                start_time = time.perf_counter()
+                self._simulate_request()
+                times.append(time.perf_counter() - start_time)
+        finally:
+            connection.close()
+            settings_dict['CONN_MAX_AGE'] = original_conn_max_age
+            settings_dict['CONN_HEALTH_CHECKS'] = original_conn_health_checks
+
+        return times
+
+    def _simulate_request(self):
+        request_started.send(sender=self.__class__)
+        try:
+            Election.objects.exists()
+        finally:
+            request_finished.send(sender=self.__class__)
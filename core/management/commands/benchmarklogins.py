@@ -0,0 +1,106 @@
+"""
+Benchmarks the number of logins per second a CPU core can handle.
+
+Checking the password of a user takes up most of the CPU time of logging in,
+so this command times password checks with the hasher profile of voters (see
+the VOTER_PASSWORD_* settings), or with another hasher. Since password checks
+take up a whole core, the number of logins per second of a server is roughly
+the number of logins per second per core times the number of cores available
+to the server's worker processes.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    check_password, get_hasher, make_password
+)
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.crypto import get_random_string
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the number of logins per second a CPU core can handle.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasher',
+            help=(
+                'Specifies the algorithm of the password hasher to benchmark '
+                '(e.g. "default" for the hasher of admins). Defaults to the '
+                'hasher of voters.'
+            )
+        )
+        parser.add_argument(
+            '--logins',
+            type=int,
+            default=20,
+            help=(
+                'Specifies the number of logins to time. Defaults to 20.'
+            )
+        )
+        parser.add_argument(
+            '--voters',
+            type=int,
+            help=(
+                'Specifies the number of voters expected to log in within '
+                'the window given by --window, to estimate the number of '
+                'cores needed.'
+            )
+        )
+        parser.add_argument(
+            '--window',
+            type=float,
+            default=10.0,
+            help=(
+                'Specifies the number of minutes within which the voters '
+                'given by --voters are expected to log in. Defaults to 10 '
+                'minutes.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1:
+            raise CommandError('The number of logins must be at least 1.')
+        if options['window'] <= 0:
+            raise CommandError('The window must be longer than 0 minutes.')
+
+        algorithm = options['hasher'] or settings.VOTER_PASSWORD_HASHER
+        try:
+            hasher = get_hasher(algorithm)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        password = get_random_string(10)
+        encoded = make_password(password, hasher=hasher.algorithm)
+
+        # Do a check first, so that any one-time set-up cost (e.g. importing
+        # the hasher's library) is not timed.
+        check_password(password, encoded, preferred=hasher.algorithm)
+
+        start_time = time.perf_counter()
+        for _ in range(options['logins']):
+            check_password(password, encoded, preferred=hasher.algorithm)
+
+        login_time = (time.perf_counter() - start_time) / options['logins']
+        logins_per_second = 1 / login_time
+
+        self.stdout.write('Hasher: {}'.format(hasher.algorithm))
+        self.stdout.write(
+            'Time per login: {:.1f} ms'.format(login_time * 1000)
+        )
+        self.stdout.write(
+            'Logins per second per core: {:.1f}'.format(logins_per_second)
+        )
+
+        if options['voters'] is not None:
+            peak_logins_per_second = \
+                options['voters'] / (options['window'] * 60)
+            self.stdout.write(
+                'Cores needed for {} voters to log in within {:g} '
+                'minutes: {}'.format(
+                    options['voters'],
+                    options['window'],
+                    math.ceil(peak_logins_per_second / logins_per_second)
+                )
+            )
@@ -0,0 +1,415 @@
+"""
+Benchmarks getting and exporting the results of elections of different sizes.
+
+For every combination of the given numbers of votes and sections, the command
+creates a synthetic election, and measures the number of queries, the wall
+time, the database time, and the peak memory usage of getting the results
+(`ResultsView._get_vote_results()`) and of exporting them in every supported
+file format. The measurements are written to a JSON file, which can be
+compared against the JSON file of a previous run (e.g. of another commit) with
+--compare, so that scaling regressions get caught before deployment.
+
+Each synthetic election is created in a transaction that is rolled back once
+its measurements are done, so nothing is left behind in the database. Since
+caches are not used inside transactions, the measured times are those of
+uncached results.
+"""
+import datetime
+import json
+import math
+import platform
+import random
+import string
+import tempfile
+import tracemalloc
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    connection, transaction
+)
+from django.db.models import Max
+from django.utils.crypto import get_random_string
+
+from core.exporters import RESULTS_EXPORTERS
+from core.metrics import RequestMetrics
+from core.models import (
+    Batch, Candidate, CandidateParty, CandidatePosition,
+    CandidateSectionTally, CandidateTally, Election, Section, User, UserType,
+    Vote, VoterProfile
+)
+from core.views.results import ResultsView
+
+
+NUM_BATCHES = 2
+NUM_POSITIONS = 5
+NUM_CANDIDATES_PER_POSITION = 3
+
+
+def _parse_sizes(value):
+    try:
+        sizes = [ int(size) for size in value.split(',') ]
+    except ValueError:
+        raise CommandError('Sizes must be comma-separated numbers.')
+
+    if any(size < 1 for size in sizes):
+        raise CommandError('Sizes must be at least 1.')
+
+    return sizes
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks getting and exporting the results of elections of ' \
+           'different sizes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--votes',
+            default='1000,10000,100000',
+            help=(
+                'Specifies the comma-separated numbers of votes of the '
+                'synthetic elections. Defaults to 1000,10000,100000.'
+            )
+        )
+        parser.add_argument(
+            '--sections',
+            default='10,100',
+            help=(
+                'Specifies the comma-separated numbers of sections of the '
+                'synthetic elections. Defaults to 10,100.'
+            )
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help=(
+                'Specifies the number of times each measurement is repeated. '
+                'The fastest time is kept. Defaults to 3.'
+            )
+        )
+        parser.add_argument(
+            '--output',
+            default='results-benchmark.json',
+            help=(
+                'Specifies the path of the JSON file the measurements are '
+                'written to. Defaults to results-benchmark.json.'
+            )
+        )
+        parser.add_argument(
+            '--compare',
+            help=(
+                'Specifies the path of the JSON file of a previous run to '
+                'compare the measurements against.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        votes_sizes = _parse_sizes(options['votes'])
+        sections_sizes = _parse_sizes(options['sections'])
+        if options['repeat'] < 1:
+            raise CommandError('The number of repeats must be at least 1.')
+
+        previous_cases = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as previous_file:
+                    previous_cases = json.load(previous_file)['cases']
+            except (OSError, ValueError, KeyError):
+                raise CommandError(
+                    'The file, {}, is not a benchmark file.'.format(
+                        options['compare']
+                    )
+                )
+
+        cases = list()
+        for num_votes in votes_sizes:
+            for num_sections in sections_sizes:
+                if options['verbosity'] >= 1:
+                    self.stdout.write(
+                        'Benchmarking an election with {} votes and {} '
+                        'sections...'.format(num_votes, num_sections)
+                    )
+
+                cases.extend(
+                    self._benchmark_election(
+                        num_votes,
+                        num_sections,
+                        options['repeat']
+                    )
+                )
+
+        with open(options['output'], 'w') as output_file:
+            json.dump(
+                {
+                    'created': datetime.datetime.now(
+                        datetime.timezone.utc
+                    ).isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'cases': cases
+                },
+                output_file,
+                indent=2
+            )
+
+        self._report(cases, previous_cases)
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                'Wrote the measurements to {} successfully.'.format(
+                    options['output']
+                )
+            )
+
+    def _benchmark_election(self, num_votes, num_sections, repeat):
+        benchmarks = [ ( 'results', self._get_vote_results ) ]
+        for file_format, exporter_class in RESULTS_EXPORTERS.items():
+            benchmarks.append((
+                'export_{}'.format(file_format),
+                lambda election_id, exporter_class=exporter_class: \
+                    self._export_results(exporter_class, election_id)
+            ))
+
+        cases = list()
+        with transaction.atomic():
+            election_id = self._seed(num_votes, num_sections)
+
+            for target, func in benchmarks:
+                case = {
+                    'target': target,
+                    'votes': num_votes,
+                    'sections': num_sections
+                }
+                case.update(self._measure(func, election_id, repeat))
+                cases.append(case)
+
+            # We do not want to leave the synthetic election behind.
+            transaction.set_rollback(True)
+
+        return cases
+
+    def _seed(self, num_votes, num_sections):
+        """
+        Create a synthetic election with `num_votes` votes spread across
+        `num_sections` sections. Returns the ID of the election.
+        """
+        # The synthetic data is tagged so that it does not clash with any
+        # existing data.
+        tag = get_random_string(4, allowed_chars=string.ascii_lowercase)
+
+        # Always generate the same votes, so that runs can be compared.
+        rng = random.Random(0)
+
+        election = Election.objects.create(name='Benchmark {}'.format(tag))
+
+        first_year = (Batch.objects.aggregate(Max('year'))['year__max'] or 0) \
+                     + 1
+        batches = Batch.objects.bulk_create([
+            Batch(year=first_year + index, election=election)
+            for index in range(NUM_BATCHES)
+        ])
+        sections = Section.objects.bulk_create([
+            Section(section_name='bm{}-{}'.format(tag, index))
+            for index in range(num_sections)
+        ])
+
+        # Every voter votes for a candidate in each position. Candidates are
+        # voters too, so there must be enough voters for them.
+        num_voters = max(
+            math.ceil(num_votes / NUM_POSITIONS),
+            NUM_POSITIONS * NUM_CANDIDATES_PER_POSITION
+        )
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username='benchmark-{}-{}'.format(tag, index),
+                    first_name='Voter {}'.format(index),
+                    last_name='Benchmark',
+                    type=UserType.VOTER
+                )
+                for index in range(num_voters)
+            ],
+            batch_size=5000
+        )
+
+        # Sections cannot be shared by batches, so each batch gets its own
+        # share of the sections.
+        VoterProfile.objects.bulk_create(
+            [
+                VoterProfile(
+                    user=user,
+                    batch=batches[
+                        (index % num_sections) * NUM_BATCHES // num_sections
+                    ],
+                    section=sections[index % num_sections],
+                    has_voted=True
+                )
+                for index, user in enumerate(users)
+            ],
+            batch_size=5000
+        )
+
+        self._analyze_tables()
+
+        parties = CandidateParty.objects.bulk_create([
+            CandidateParty(
+                party_name='Party {}'.format(index),
+                election=election
+            )
+            for index in range(NUM_CANDIDATES_PER_POSITION)
+        ])
+        positions = CandidatePosition.objects.bulk_create([
+            CandidatePosition(
+                position_name='Position {}'.format(index),
+                position_level=index,
+                election=election
+            )
+            for index in range(NUM_POSITIONS)
+        ])
+
+        # The first voters are also the candidates.
+        candidate_users = iter(users)
+        candidates = Candidate.objects.bulk_create([
+            Candidate(
+                user=next(candidate_users),
+                party=party,
+                position=position,
+                election=election
+            )
+            for position in positions
+            for party in parties
+        ])
+
+        position_candidates = [
+            [
+                candidate for candidate in candidates
+                if candidate.position_id == position.id
+            ]
+            for position in positions
+        ]
+        votes = list()
+        for user in users:
+            for candidates_in_position in position_candidates:
+                if len(votes) == num_votes:
+                    break
+
+                votes.append(Vote(
+                    user=user,
+                    candidate=rng.choice(candidates_in_position),
+                    election=election
+                ))
+
+        # The candidate tallies get updated by the database as the votes get
+        # inserted. However, since all the votes are inserted in one
+        # transaction, every tally row is left with a long chain of row
+        # versions that would slow down reading the tallies, which would not
+        # happen with votes cast in their own transactions. So, we rebuild the
+        # tallies from scratch.
+        Vote.objects.bulk_create(votes, batch_size=5000)
+        call_command('rebuildtallies', election=election.id, verbosity=0)
+
+        self._analyze_tables()
+
+        return election.id
+
+    def _analyze_tables(self):
+        # The database would normally have up-to-date statistics of the
+        # tables by the time the results get viewed. Without them, the query
+        # planner would assume that the tables we just filled up are still
+        # empty, and use plans that are only fast with tiny tables.
+        with connection.cursor() as cursor:
+            for model in [
+                        User, VoterProfile, Vote, CandidateTally,
+                        CandidateSectionTally
+                    ]:
+                cursor.execute(
+                    'ANALYZE {}'.format(
+                        connection.ops.quote_name(model._meta.db_table)
+                    )
+                )
+
+    def _measure(self, func, election_id, repeat):
+        wall_times = list()
+        for _ in range(repeat):
+            metrics = RequestMetrics()
+            metrics.start()
+            try:
+                with connection.execute_wrapper(metrics.record_query):
+                    func(election_id)
+            finally:
+                metrics.stop()
+
+            wall_times.append(metrics.wall_time)
+            if metrics.wall_time == min(wall_times):
+                fastest_metrics = metrics
+
+        # Tracing memory allocations slows everything down, so the peak
+        # memory usage is measured in a separate run.
+        tracemalloc.start()
+        try:
+            func(election_id)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'queries': fastest_metrics.num_queries,
+            'wall_time_ms': round(fastest_metrics.wall_time * 1000, 3),
+            'db_time_ms': round(fastest_metrics.db_time * 1000, 3),
+            'peak_memory_kb': round(peak_memory / 1024, 1)
+        }
+
+    def _get_vote_results(self, election_id):
+        ResultsView()._get_vote_results(election_id)
+
+    def _export_results(self, exporter_class, election_id):
+        with tempfile.TemporaryFile() as export_file:
+            exporter_class().write(election_id, export_file)
+
+    def _report(self, cases, previous_cases):
+        if previous_cases is not None:
+            previous_cases = {
+                (case['target'], case['votes'], case['sections']): case
+                for case in previous_cases
+            }
+
+        self.stdout.write('')
+        self.stdout.write(
+            '{:<12}{:>8}{:>10}{:>9}{:>11}{:>14}{}'.format(
+                'Target',
+                'Votes',
+                'Sections',
+                'Queries',
+                'Time (ms)',
+                'Memory (KiB)',
+                '  Change' if previous_cases is not None else ''
+            )
+        )
+        for case in cases:
+            change = ''
+            if previous_cases is not None:
+                previous_case = previous_cases.get(
+                    (case['target'], case['votes'], case['sections'])
+                )
+                if previous_case is None:
+                    change = '  (new)'
+                else:
+                    change = '  {:+.1f}% time, {:+d} queries'.format(
+                        (case['wall_time_ms'] / previous_case['wall_time_ms']
+                         - 1) * 100,
+                        case['queries'] - previous_case['queries']
+                    )
+
+            self.stdout.write(
+                '{:<12}{:>8}{:>10}{:>9}{:>11.1f}{:>14.1f}{}'.format(
+                    case['target'],
+                    case['votes'],
+                    case['sections'],
+                    case['queries'],
+                    case['wall_time_ms'],
+                    case['peak_memory_kb'],
+                    change
+                )
+            )
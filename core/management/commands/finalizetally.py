@@ -0,0 +1,221 @@
+"""
+Decrypts the final tallies of an election whose ballots are encrypted.
+
+The encrypted votes of each candidate are summed up from the encrypted
+ballots with a tree reduction, and the sums are then decrypted, both across a
+pool of processes, since both are CPU-heavy big-integer work. The decrypted
+tallies are saved as the candidate tallies, from which the results are read,
+and the sums are saved as the encrypted tallies of the candidates, so that
+the decrypted tallies can be checked against them.
+
+The tallies can only be finalized while the elections are closed, so that no
+ballots get cast in the meantime. The tallies by batch and section are not
+available for elections whose ballots are encrypted, since encrypted ballots
+are not linked to their voters.
+"""
+import functools
+import itertools
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.encryption import (
+    add_ciphertexts, decrypt_ciphertexts, get_private_key, get_public_key,
+    sum_ciphertexts
+)
+from core.models import (
+    Candidate, CandidateTally, Election, ElectionKey, EncryptedBallot,
+    EncryptedTally
+)
+from core.utils import (
+    AppSettings, change_cache_version, create_process_pool
+)
+
+
+class Command(BaseCommand):
+    help = 'Decrypts the final tallies of an election whose ballots are ' \
+           'encrypted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'election',
+            type=int,
+            help='Specifies the ID of the election whose tallies to finalize.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help=(
+                'Specifies the number of ballots read and summed up at a '
+                'time. Defaults to 1000.'
+            )
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help=(
+                'Specifies the number of processes used to sum up and '
+                'decrypt the tallies. Defaults to the number of CPUs.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('The chunk size must be at least 1.')
+
+        try:
+            election = Election.objects.get(id=options['election'])
+        except Election.DoesNotExist:
+            raise CommandError(
+                'There is no election with an ID of {}.'.format(
+                    options['election']
+                )
+            )
+
+        try:
+            election_key = ElectionKey.objects.get(election=election)
+        except ElectionKey.DoesNotExist:
+            raise CommandError(
+                'The ballots of the election, {}, are not encrypted.'.format(
+                    election.name
+                )
+            )
+
+        if AppSettings().get('election_state', 'closed') == 'open':
+            raise CommandError(
+                'The tallies can only be finalized while the elections are '
+                'closed.'
+            )
+
+        pool = create_process_pool(options['processes'])
+        try:
+            start_time = time.perf_counter()
+            ciphertexts = self._sum_ballots(
+                election,
+                election_key,
+                options['chunk_size'],
+                pool,
+                options['verbosity']
+            )
+            sum_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            candidate_ids = sorted(ciphertexts.keys())
+            tallies = decrypt_ciphertexts(
+                get_private_key(election_key),
+                [
+                    ciphertexts[candidate_id]
+                    for candidate_id in candidate_ids
+                ],
+                pool
+            )
+            decryption_time = time.perf_counter() - start_time
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        with transaction.atomic():
+            CandidateTally.objects \
+                          .filter(candidate__election=election) \
+                          .delete()
+            CandidateTally.objects.bulk_create([
+                CandidateTally(candidate_id=candidate_id, total_votes=tally)
+                for candidate_id, tally in zip(candidate_ids, tallies)
+            ])
+
+            EncryptedTally.objects \
+                          .filter(candidate__election=election) \
+                          .delete()
+            EncryptedTally.objects.bulk_create([
+                EncryptedTally(
+                    candidate_id=candidate_id,
+                    ciphertext=str(ciphertexts[candidate_id])
+                )
+                for candidate_id in candidate_ids
+            ])
+
+            change_cache_version('results')
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                'Summed up the ballots in {:.1f} s.'.format(sum_time)
+            )
+            self.stdout.write(
+                'Decrypted the tallies in {:.1f} s.'.format(decryption_time)
+            )
+            self.stdout.write(
+                'Finalized the tallies of {} candidate(s) '
+                'successfully.'.format(len(candidate_ids))
+            )
+
+    def _sum_ballots(self, election, election_key, chunk_size, pool,
+                     verbosity):
+        """
+        Sum up the encrypted votes of every candidate of `election` from its
+        encrypted ballots. Returns a dict of the ciphertexts of the sums,
+        keyed by candidate ID.
+        """
+        public_key = get_public_key(election_key)
+        add = functools.partial(add_ciphertexts, public_key)
+
+        # The ballots are summed up a chunk at a time, so that the ballots do
+        # not have to fit in memory. The sums of the chunks are the first
+        # level of the tree reduction.
+        chunk_sums = {
+            candidate_id: list()
+            for candidate_id in Candidate.objects
+                                         .filter(election=election)
+                                         .values_list('id', flat=True)
+        }
+        ballots = EncryptedBallot.objects \
+                                 .filter(election=election) \
+                                 .order_by() \
+                                 .values_list('votes', flat=True)
+        num_ballots = ballots.count()
+        ballots = ballots.iterator(chunk_size=chunk_size)
+        num_summed_ballots = 0
+        while True:
+            chunk = list(itertools.islice(ballots, chunk_size))
+            if not chunk:
+                break
+
+            candidate_ciphertexts = dict()
+            for votes in chunk:
+                for candidate_id, ciphertext in votes.items():
+                    candidate_ciphertexts.setdefault(
+                        int(candidate_id),
+                        list()
+                    ).append(ciphertext)
+
+            candidate_ids = list(candidate_ciphertexts.keys())
+            ciphertext_lists = [
+                candidate_ciphertexts[candidate_id]
+                for candidate_id in candidate_ids
+            ]
+            if pool is None:
+                sums = map(add, ciphertext_lists)
+            else:
+                sums = pool.map(add, ciphertext_lists)
+
+            for candidate_id, ciphertext_sum in zip(candidate_ids, sums):
+                chunk_sums.setdefault(candidate_id, list()).append(
+                    ciphertext_sum
+                )
+
+            num_summed_ballots += len(chunk)
+            if verbosity >= 1:
+                self.stdout.write(
+                    'Summed up {} of {} ballot(s)...'.format(
+                        num_summed_ballots,
+                        num_ballots
+                    )
+                )
+
+        return {
+            candidate_id: sum_ciphertexts(public_key, sums, pool)
+            for candidate_id, sums in chunk_sums.items()
+        }
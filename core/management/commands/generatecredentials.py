@@ -0,0 +1,306 @@
+"""
+Generates random passwords for voters, and writes a credential sheet.
+
+The credential sheet has the username, name, batch, section, and new password
+of every voter, sorted by batch, section, and name, so that it can be printed
+and handed out. The passwords of the voters are changed in chunks. The new
+passwords of each chunk are hashed in parallel, and written to the database
+in bulk. The passwords are all changed in one transaction, so no passwords
+are changed if there is an error, and the credential sheet is only written
+once the passwords have been changed.
+"""
+import csv
+import io
+import os
+
+from openpyxl import Workbook
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils.crypto import get_random_string
+
+from core.models import (
+    Election, ExportFormat, User, UserType
+)
+from core.utils import (
+    create_process_pool, hash_passwords
+)
+
+
+# Characters that are easily mistaken for one another when printed (e.g. l,
+# 1, and I) are left out.
+PASSWORD_CHARS = 'abcdefghjkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+
+SHEET_HEADER = [ 'Username', 'Name', 'Batch', 'Section', 'Password' ]
+
+
+class Command(BaseCommand):
+    help = 'Generates random passwords for voters, and writes a credential ' \
+           'sheet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output_file',
+            help='Specifies the path of the credential sheet.'
+        )
+        parser.add_argument(
+            '--format',
+            default=ExportFormat.CSV,
+            choices=[ ExportFormat.CSV, ExportFormat.XLSX ],
+            help=(
+                'Specifies the file format of the credential sheet. Defaults '
+                'to CSV.'
+            )
+        )
+        parser.add_argument(
+            '--election',
+            type=int,
+            help=(
+                'Specifies the ID of the election whose voters will be given '
+                'new passwords. Defaults to the voters of all elections.'
+            )
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            help=(
+                'Specifies the year of the batch whose voters will be given '
+                'new passwords.'
+            )
+        )
+        parser.add_argument(
+            '--unusable-only',
+            action='store_true',
+            help=(
+                'Only give new passwords to voters who cannot log in because '
+                'they have no password (e.g. imported voters without a '
+                'password).'
+            )
+        )
+        parser.add_argument(
+            '--length',
+            type=int,
+            default=10,
+            help=(
+                'Specifies the length of the generated passwords. Defaults to '
+                '10.'
+            )
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help=(
+                'Specifies the number of passwords changed at a time. '
+                'Defaults to 1000.'
+            )
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help=(
+                'Specifies the number of processes used to hash the '
+                'passwords. Defaults to the number of CPUs.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['length'] < 8:
+            raise CommandError('The passwords must be at least 8 characters.')
+        if options['chunk_size'] < 1:
+            raise CommandError('The chunk size must be at least 1.')
+        if options['processes'] < 1:
+            raise CommandError('The number of processes must be at least 1.')
+
+        election_id = options['election']
+        if election_id is not None \
+                and not Election.objects.filter(id=election_id).exists():
+            raise CommandError(
+                'The election with an ID of {} does not exist.'.format(
+                    election_id
+                )
+            )
+
+        voters = self._get_voters(
+            election_id,
+            options['batch'],
+            options['unusable_only']
+        )
+
+        # The sheet is written under a temporary name first, and is only
+        # moved into place before the new passwords are committed. Should
+        # saving or moving the sheet fail, the passwords are rolled back, so
+        # there is never a sheet with passwords that have not been saved, nor
+        # saved passwords without a sheet.
+        output_file_path = options['output_file']
+        temp_file_path = '{}.part'.format(output_file_path)
+        is_sheet_replaced = False
+        pool = create_process_pool(options['processes'])
+        try:
+            with transaction.atomic():
+                with open(temp_file_path, 'wb') as output_file:
+                    if options['format'] == ExportFormat.XLSX:
+                        sheet = _XLSXCredentialSheet(output_file)
+                    else:
+                        sheet = _CSVCredentialSheet(output_file)
+
+                    num_voters = self._change_passwords(
+                        voters,
+                        sheet,
+                        options['length'],
+                        options['chunk_size'],
+                        pool
+                    )
+
+                    sheet.close()
+
+                os.replace(temp_file_path, output_file_path)
+                is_sheet_replaced = True
+        except BaseException:
+            # The passwords have been rolled back, so the sheet is useless.
+            if is_sheet_replaced:
+                sheet_file_path = output_file_path
+            else:
+                sheet_file_path = temp_file_path
+
+            if os.path.exists(sheet_file_path):
+                os.remove(sheet_file_path)
+
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                'Generated the passwords of {} voter(s) successfully.'.format(
+                    num_voters
+                )
+            )
+
+    def _get_voters(self, election_id, batch_year, unusable_only):
+        voters = User.objects \
+                     .filter(
+                         type=UserType.VOTER,
+                         voter_profile__isnull=False
+                     )
+        if election_id is not None:
+            voters = voters.filter(
+                voter_profile__batch__election__id=election_id
+            )
+        if batch_year is not None:
+            voters = voters.filter(voter_profile__batch__year=batch_year)
+        if unusable_only:
+            voters = voters.filter(
+                Q(password='')
+                | Q(password__startswith=UNUSABLE_PASSWORD_PREFIX)
+            )
+
+        voters = voters.order_by(
+            'voter_profile__batch__year',
+            'voter_profile__section__section_name',
+            'last_name',
+            'first_name',
+            'username'
+        )
+
+        return voters.values_list(
+            'id',
+            'username',
+            'first_name',
+            'last_name',
+            'voter_profile__batch__year',
+            'voter_profile__section__section_name'
+        )
+
+    def _change_passwords(self, voters, sheet, length, chunk_size, pool):
+        num_voters = 0
+        chunk = list()
+        for voter in voters.iterator(chunk_size=chunk_size):
+            chunk.append(voter)
+            if len(chunk) == chunk_size:
+                num_voters += self._change_chunk_passwords(
+                    chunk,
+                    sheet,
+                    length,
+                    pool
+                )
+                chunk = list()
+
+        if chunk:
+            num_voters += self._change_chunk_passwords(
+                chunk,
+                sheet,
+                length,
+                pool
+            )
+
+        return num_voters
+
+    def _change_chunk_passwords(self, chunk, sheet, length, pool):
+        passwords = [
+            get_random_string(length, allowed_chars=PASSWORD_CHARS)
+            for _ in chunk
+        ]
+        hashes = hash_passwords(
+            passwords,
+            pool,
+            hasher=settings.VOTER_PASSWORD_HASHER
+        )
+
+        User.objects.bulk_update(
+            [
+                User(id=voter[0], password=password_hash)
+                for voter, password_hash in zip(chunk, hashes)
+            ],
+            [ 'password' ]
+        )
+
+        for voter, password in zip(chunk, passwords):
+            _, username, first_name, last_name, batch_year, section = voter
+            sheet.write_row([
+                username,
+                '{}, {}'.format(last_name, first_name),
+                batch_year,
+                section,
+                password
+            ])
+
+        return len(chunk)
+
+
+class _CSVCredentialSheet(object):
+    def __init__(self, output_file):
+        self._text_file = io.TextIOWrapper(
+            output_file,
+            encoding='utf-8',
+            newline=''
+        )
+        self._writer = csv.writer(self._text_file)
+        self._writer.writerow(SHEET_HEADER)
+
+    def write_row(self, row):
+        self._writer.writerow(row)
+
+    def close(self):
+        # Detach the wrapper so that it does not close the output file.
+        self._text_file.flush()
+        self._text_file.detach()
+
+
+class _XLSXCredentialSheet(object):
+    def __init__(self, output_file):
+        self._output_file = output_file
+        self._workbook = Workbook(write_only=True)
+        self._worksheet = self._workbook.create_sheet('Credentials')
+        self._worksheet.append(SHEET_HEADER)
+
+    def write_row(self, row):
+        self._worksheet.append(row)
+
+    def close(self):
+        self._workbook.save(self._output_file)
@@ -0,0 +1,249 @@
+"""
+Imports voters from a CSV file.
+
+The CSV file must have a header with the following columns: username,
+first_name, last_name, batch, section, and password. The batch column must
+have the year of an existing batch. Sections that do not exist yet are
+created. Voters with an empty password will not be able to log in until they
+are given a password.
+
+The CSV file is read in chunks. The passwords of each chunk are hashed in
+parallel, and the users and voter profiles of each chunk are inserted in
+bulk. All voters are imported in one transaction, so no voters are imported
+if there is an error in any of the rows.
+"""
+import csv
+import os
+
+from django.conf import settings
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core import exceptions
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import (
+    Batch, Section, User, UserType, VoterProfile
+)
+from core.utils import (
+    change_cache_version, create_process_pool, hash_passwords
+)
+
+
+COLUMNS = [
+    'username', 'first_name', 'last_name', 'batch', 'section', 'password'
+]
+
+
+class Command(BaseCommand):
+    help = 'Imports voters from a CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'csv_file',
+            help='Specifies the path of the CSV file of the voters.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help=(
+                'Specifies the number of voters inserted at a time. Defaults '
+                'to 1000.'
+            )
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help=(
+                'Specifies the number of processes used to hash the '
+                'passwords. Defaults to the number of CPUs.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('The chunk size must be at least 1.')
+        if options['processes'] < 1:
+            raise CommandError('The number of processes must be at least 1.')
+
+        pool = create_process_pool(options['processes'])
+        try:
+            with open(options['csv_file'], newline='',
+                      encoding='utf-8-sig') as csv_file:
+                num_voters = self._import_voters(
+                    csv.DictReader(csv_file),
+                    options['chunk_size'],
+                    pool
+                )
+        except FileNotFoundError:
+            raise CommandError(
+                'The file, {}, does not exist.'.format(options['csv_file'])
+            )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                'Imported {} voter(s) successfully.'.format(num_voters)
+            )
+
+    def _import_voters(self, reader, chunk_size, pool):
+        missing_columns = set(COLUMNS) - set(reader.fieldnames or [])
+        if missing_columns:
+            raise CommandError(
+                'The CSV file is missing the following columns: {}.'.format(
+                    ', '.join(sorted(missing_columns))
+                )
+            )
+
+        num_voters = 0
+        with transaction.atomic():
+            self._batch_ids = dict(Batch.objects.values_list('year', 'id'))
+            self._section_ids = dict(
+                Section.objects.values_list('section_name', 'id')
+            )
+
+            # No two batches can have the same section.
+            self._section_batch_ids = dict(
+                VoterProfile.objects
+                            .order_by()
+                            .values_list('section_id', 'batch_id')
+                            .distinct()
+            )
+            self._usernames = set()
+
+            chunk = list()
+            for row in reader:
+                chunk.append((reader.line_num, row))
+                if len(chunk) == chunk_size:
+                    num_voters += self._import_chunk(chunk, pool)
+                    chunk = list()
+
+            if chunk:
+                num_voters += self._import_chunk(chunk, pool)
+
+            # Bulk inserts do not send signals, so we have to let everyone
+            # know that the results have changed ourselves.
+            change_cache_version('results')
+
+        return num_voters
+
+    def _import_chunk(self, chunk, pool):
+        username_validator = UnicodeUsernameValidator()
+
+        voters = list()
+        for line_num, row in chunk:
+            username = (row['username'] or '').strip()
+            try:
+                username_validator(username)
+            except exceptions.ValidationError:
+                raise CommandError(
+                    'Line {}: The username, {}, is invalid.'.format(
+                        line_num,
+                        username
+                    )
+                )
+
+            if username in self._usernames:
+                raise CommandError(
+                    'Line {}: The username, {}, appears more than once.'
+                    .format(line_num, username)
+                )
+            self._usernames.add(username)
+
+            try:
+                batch_id = self._batch_ids[int(row['batch'])]
+            except (KeyError, TypeError, ValueError):
+                raise CommandError(
+                    'Line {}: The batch, {}, does not exist.'.format(
+                        line_num,
+                        row['batch']
+                    )
+                )
+
+            section_name = (row['section'] or '').strip()
+            if not section_name or len(section_name) > 15:
+                raise CommandError(
+                    'Line {}: The section, {}, is invalid.'.format(
+                        line_num,
+                        section_name
+                    )
+                )
+
+            voters.append((line_num, username, row, batch_id, section_name))
+
+        existing_usernames = set(
+            User.objects
+                .filter(username__in=[ voter[1] for voter in voters ])
+                .values_list('username', flat=True)
+        )
+        if existing_usernames:
+            raise CommandError(
+                'The following users already exist: {}.'.format(
+                    ', '.join(sorted(existing_usernames))
+                )
+            )
+
+        self._create_missing_sections(
+            [ voter[4] for voter in voters ]
+        )
+
+        for line_num, _, _, batch_id, section_name in voters:
+            section_id = self._section_ids[section_name]
+            section_batch_id = self._section_batch_ids.setdefault(
+                section_id,
+                batch_id
+            )
+            if section_batch_id != batch_id:
+                raise CommandError(
+                    'Line {}: The section, {}, is already used by another '
+                    'batch. No two batches can have the same section.'
+                    .format(line_num, section_name)
+                )
+
+        hashes = hash_passwords(
+            [ voter[2]['password'] for voter in voters ],
+            pool,
+            hasher=settings.VOTER_PASSWORD_HASHER
+        )
+
+        users = User.objects.bulk_create([
+            User(
+                username=username,
+                first_name=(row['first_name'] or '').strip(),
+                last_name=(row['last_name'] or '').strip(),
+                password=password_hash,
+                type=UserType.VOTER
+            ) for (_, username, row, _, _), password_hash
+              in zip(voters, hashes)
+        ])
+        VoterProfile.objects.bulk_create([
+            VoterProfile(
+                user=user,
+                batch_id=batch_id,
+                section_id=self._section_ids[section_name]
+            ) for user, (_, _, _, batch_id, section_name)
+              in zip(users, voters)
+        ])
+
+        return len(users)
+
+    def _create_missing_sections(self, section_names):
+        missing_section_names = set(section_names) - set(self._section_ids)
+        if not missing_section_names:
+            return
+
+        Section.objects.bulk_create(
+            [
+                Section(section_name=section_name)
+                for section_name in missing_section_names
+            ],
+            ignore_conflicts=True
+        )
+        self._section_ids.update(
+            Section.objects
+                   .filter(section_name__in=missing_section_names)
+                   .values_list('section_name', 'id')
+        )
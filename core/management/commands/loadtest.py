@@ -0,0 +1,443 @@
+"""
+Simulates an election-day voting storm, and reports how Botos held up.
+
+The command seeds a synthetic election (or elections), with its own batches,
+sections, positions, candidates, and voters, and then has the voters log in,
+load the ballot, and vote, with a number of voters doing so at the same time.
+Each step is a request made through the Django test client, so the requests
+go through the same middleware, views, and database queries as real requests
+do, minus the web server. The throughput, the latency percentiles, and the
+number of queries of each step are reported at the end.
+
+The synthetic data is deleted after the load test, unless --keep is given.
+Since the data is written to the database Botos is configured to use, this
+command should not be run against a database with a running election.
+"""
+import concurrent.futures
+import json
+import random
+import string
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    connection, transaction
+)
+from django.db.models import Max
+from django.test import (
+    Client, override_settings
+)
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from core.metrics import (
+    RequestMetrics, get_percentile
+)
+from core.models import (
+    Batch, Candidate, CandidateParty, CandidatePosition, Election, Section,
+    User, UserType, VoterProfile
+)
+from core.utils import (
+    change_cache_version, hash_passwords
+)
+
+
+PASSWORD = 'load-test-password'
+
+STEPS = [ 'login', 'index', 'vote' ]
+
+
+class Command(BaseCommand):
+    help = 'Simulates an election-day voting storm, and reports how Botos ' \
+           'held up.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--elections',
+            type=int,
+            default=1,
+            help='Specifies the number of elections. Defaults to 1.'
+        )
+        parser.add_argument(
+            '--batches',
+            type=int,
+            default=2,
+            help=(
+                'Specifies the number of batches in each election. Defaults '
+                'to 2.'
+            )
+        )
+        parser.add_argument(
+            '--sections',
+            type=int,
+            default=5,
+            help=(
+                'Specifies the number of sections in each batch. Defaults to '
+                '5.'
+            )
+        )
+        parser.add_argument(
+            '--positions',
+            type=int,
+            default=5,
+            help=(
+                'Specifies the number of positions in each election. '
+                'Defaults to 5.'
+            )
+        )
+        parser.add_argument(
+            '--candidates',
+            type=int,
+            default=3,
+            help=(
+                'Specifies the number of candidates for each position. '
+                'Defaults to 3.'
+            )
+        )
+        parser.add_argument(
+            '--voters',
+            type=int,
+            default=1000,
+            help=(
+                'Specifies the number of voters, spread evenly across the '
+                'sections. Defaults to 1000.'
+            )
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help=(
+                'Specifies the number of voters voting at the same time. '
+                'Defaults to 10.'
+            )
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the synthetic data after the load test.'
+        )
+
+    def handle(self, *args, **options):
+        for option in [
+                    'elections', 'batches', 'sections', 'positions',
+                    'candidates', 'voters', 'concurrency'
+                ]:
+            if options[option] < 1:
+                raise CommandError(
+                    'The number of {} must be at least 1.'.format(option)
+                )
+
+        num_voters_per_election = options['voters'] // options['elections']
+        if num_voters_per_election \
+                < options['positions'] * options['candidates']:
+            raise CommandError(
+                'There must be enough voters in each election for all the '
+                'candidates, since candidates are voters too.'
+            )
+
+        # The synthetic data is tagged so that it does not clash with any
+        # existing data, and can be found again when it gets deleted.
+        tag = get_random_string(4, allowed_chars=string.ascii_lowercase)
+
+        if options['verbosity'] >= 1:
+            self.stdout.write('Seeding the synthetic election data...')
+
+        voters, ballots = self._seed(tag, options)
+        try:
+            if options['verbosity'] >= 1:
+                self.stdout.write(
+                    'Simulating {} voters, with {} voting at the same '
+                    'time...'.format(len(voters), options['concurrency'])
+                )
+
+            # The test client uses `testserver` as its host.
+            with override_settings(
+                        ALLOWED_HOSTS=[ *settings.ALLOWED_HOSTS, 'testserver' ]
+                    ):
+                start_time = time.perf_counter()
+                with concurrent.futures.ThreadPoolExecutor(
+                            max_workers=options['concurrency']
+                        ) as executor:
+                    results = list(executor.map(
+                        lambda voter: self._simulate_voter(
+                            voter[0],
+                            ballots[voter[1]]
+                        ),
+                        voters
+                    ))
+
+                total_time = time.perf_counter() - start_time
+
+            # Voters whose ballots were rejected are still redirected to the
+            # index page, so we count the ballots that actually got cast.
+            num_ballots = VoterProfile.objects \
+                                      .filter(
+                                          batch__election__name__startswith=(
+                                              'Load Test {} '.format(tag)
+                                          ),
+                                          has_voted=True
+                                      ) \
+                                      .count()
+        finally:
+            if not options['keep']:
+                self._delete_synthetic_data(tag)
+
+        self._report(
+            results,
+            total_time,
+            num_ballots,
+            options['concurrency']
+        )
+
+    def _seed(self, tag, options):
+        """
+        Create the synthetic elections. Returns a list of
+        `(username, election_id)` tuples of the voters, and the ballots of
+        each election, as a dict of lists of the candidate IDs of each
+        position, keyed by election ID.
+        """
+        # Hashing a password for every voter would take a long time, and
+        # logging in costs the same no matter which password is checked.
+        password_hash = hash_passwords(
+            [ PASSWORD ],
+            hasher=settings.VOTER_PASSWORD_HASHER
+        )[0]
+
+        # Batch years are unique, so we start after the latest one.
+        first_year = (Batch.objects.aggregate(Max('year'))['year__max'] or 0) \
+                     + 1
+
+        voters = list()
+        ballots = dict()
+        num_sections = 0
+        with transaction.atomic():
+            for election_index in range(options['elections']):
+                election = Election.objects.create(
+                    name='Load Test {} {}'.format(tag, election_index)
+                )
+
+                sections = list()
+                for batch_index in range(options['batches']):
+                    batch = Batch.objects.create(
+                        year=first_year
+                             + election_index * options['batches']
+                             + batch_index,
+                        election=election
+                    )
+                    for _ in range(options['sections']):
+                        # Section names are unique, and are at most 15
+                        # characters long.
+                        section_name = 'lt{}-{}'.format(tag, num_sections)
+                        sections.append((
+                            batch,
+                            Section(section_name=section_name)
+                        ))
+                        num_sections += 1
+
+                Section.objects.bulk_create(
+                    [ section for _, section in sections ]
+                )
+
+                num_voters = options['voters'] // options['elections']
+                users = User.objects.bulk_create(
+                    [
+                        User(
+                            username='loadtest-{}-{}-{}'.format(
+                                tag,
+                                election_index,
+                                voter_index
+                            ),
+                            first_name='Voter {}'.format(voter_index),
+                            last_name='Load Test',
+                            password=password_hash,
+                            type=UserType.VOTER
+                        )
+                        for voter_index in range(num_voters)
+                    ],
+                    batch_size=1000
+                )
+                VoterProfile.objects.bulk_create(
+                    [
+                        VoterProfile(
+                            user=user,
+                            batch=sections[index % len(sections)][0],
+                            section=sections[index % len(sections)][1]
+                        )
+                        for index, user in enumerate(users)
+                    ],
+                    batch_size=1000
+                )
+
+                # The results need every candidate to have a party.
+                party = CandidateParty.objects.create(
+                    party_name='Load Test Party',
+                    election=election
+                )
+                positions = CandidatePosition.objects.bulk_create([
+                    CandidatePosition(
+                        position_name='Position {}'.format(position_index),
+                        position_level=position_index,
+                        election=election
+                    )
+                    for position_index in range(options['positions'])
+                ])
+
+                # The first voters are also the candidates.
+                candidate_users = iter(users)
+                candidates = Candidate.objects.bulk_create([
+                    Candidate(
+                        user=next(candidate_users),
+                        party=party,
+                        position=position,
+                        election=election
+                    )
+                    for position in positions
+                    for _ in range(options['candidates'])
+                ])
+
+                ballots[election.id] = [
+                    [
+                        candidate.id for candidate in candidates
+                        if candidate.position_id == position.id
+                    ]
+                    for position in positions
+                ]
+                voters.extend(
+                    (user.username, election.id) for user in users
+                )
+
+            # Bulk inserts do not send signals, so we have to let everyone
+            # know that the ballots and results have changed ourselves.
+            change_cache_version('ballots')
+            change_cache_version('results')
+
+        # Shuffle the voters, so that the elections, batches, and sections
+        # vote at the same time, like they would on election day.
+        random.shuffle(voters)
+
+        return voters, ballots
+
+    def _simulate_voter(self, username, ballot):
+        """
+        Have a voter log in, load the ballot, and vote. Returns a dict of the
+        request metrics of each step, and the number of failed steps.
+        """
+        client = Client()
+        step_metrics = dict()
+        num_failures = 0
+        try:
+            for step in STEPS:
+                metrics = RequestMetrics()
+                metrics.start()
+                try:
+                    with connection.execute_wrapper(metrics.record_query):
+                        response = self._do_step(
+                            client,
+                            step,
+                            username,
+                            ballot
+                        )
+                finally:
+                    metrics.stop()
+
+                step_metrics[step] = metrics
+
+                expected_status_code = 200 if step == 'index' else 302
+                if response.status_code != expected_status_code:
+                    num_failures += 1
+                    break
+        except Exception as e:
+            self.stderr.write(
+                'The voter, {}, failed to vote: {}'.format(username, e)
+            )
+            num_failures += 1
+        finally:
+            # Each thread has its own database connection.
+            connection.close()
+
+        return step_metrics, num_failures
+
+    def _do_step(self, client, step, username, ballot):
+        if step == 'login':
+            return client.post(
+                reverse('auth-login'),
+                { 'username': username, 'password': PASSWORD }
+            )
+        elif step == 'index':
+            return client.get(reverse('index'))
+        else:
+            candidates_voted = [
+                random.choice(position_candidate_ids)
+                for position_candidate_ids in ballot
+            ]
+            return client.post(
+                reverse('vote-processing'),
+                { 'candidates_voted': json.dumps(candidates_voted) }
+            )
+
+    def _delete_synthetic_data(self, tag):
+        elections = Election.objects.filter(
+            name__startswith='Load Test {} '.format(tag)
+        )
+        with transaction.atomic():
+            # Deleting the users also deletes their voter profiles, votes,
+            # and candidacies.
+            User.objects \
+                .filter(username__startswith='loadtest-{}-'.format(tag)) \
+                .delete()
+            Section.objects \
+                   .filter(section_name__startswith='lt{}-'.format(tag)) \
+                   .delete()
+            Batch.objects.filter(election__in=elections).delete()
+            elections.delete()
+
+    def _report(self, results, total_time, num_ballots, concurrency):
+        num_voters = len(results)
+        num_failures = sum(num_failures for _, num_failures in results)
+
+        self.stdout.write('')
+        self.stdout.write(
+            'Simulated {} voters in {:.1f} s ({:.1f} voters/s), with {} '
+            'voting at the same time.'.format(
+                num_voters,
+                total_time,
+                num_voters / total_time,
+                concurrency
+            )
+        )
+        self.stdout.write(
+            'Ballots cast: {} of {}'.format(num_ballots, num_voters)
+        )
+        self.stdout.write('Failed steps: {}'.format(num_failures))
+        self.stdout.write('')
+        self.stdout.write(
+            '{:<8}{:>10}{:>12}{:>12}{:>12}{:>14}'.format(
+                'Step',
+                'Requests',
+                'p50 (ms)',
+                'p95 (ms)',
+                'p99 (ms)',
+                'Avg. Queries'
+            )
+        )
+        for step in STEPS:
+            step_metrics = [
+                metrics[step] for metrics, _ in results if step in metrics
+            ]
+            if not step_metrics:
+                continue
+
+            wall_times = [ metrics.wall_time for metrics in step_metrics ]
+            num_queries = [ metrics.num_queries for metrics in step_metrics ]
+            self.stdout.write(
+                '{:<8}{:>10}{:>12.1f}{:>12.1f}{:>12.1f}{:>14.1f}'.format(
+                    step,
+                    len(step_metrics),
+                    get_percentile(wall_times, 50) * 1000,
+                    get_percentile(wall_times, 95) * 1000,
+                    get_percentile(wall_times, 99) * 1000,
+                    sum(num_queries) / len(num_queries)
+                )
+            )
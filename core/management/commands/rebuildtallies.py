@@ -0,0 +1,117 @@
+"""
+Rebuilds the candidate tallies from the votes.
+
+The tallies are kept current by a database trigger on the votes table, so
+there is usually no need to run this command. However, the tallies by batch
+and section are based on the batch and section of the voter at the time the
+vote was cast, since votes do not record them. When a vote is deleted, the
+trigger can only decrement the tally of the voter's current batch and
+section. So, should the batch or section of a voter who has already voted be
+changed, or should the voter's profile be deleted before the voter's votes,
+deleting the votes decrements the wrong tally, or none at all, and leaves a
+stale count in the old one. Clearing the votes of an election is not
+affected, since it deletes the tallies of the election outright. In the other
+cases, or should a vote be modified outside of Botos, this command can be
+used to bring the tallies back in sync with the votes.
+
+The tallies of elections whose ballots are encrypted are not rebuilt, since
+their ballots are not stored as votes (see the `finalizetally` command).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    connection, transaction
+)
+from django.db.models import Count
+
+from core.models import (
+    CandidateSectionTally, CandidateTally, Election, Vote
+)
+from core.utils import change_cache_version
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the candidate tallies from the votes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--election',
+            type=int,
+            help=(
+                'Specifies the ID of the election whose tallies will be '
+                'rebuilt. The tallies of all elections will be rebuilt if '
+                'this is not specified.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        election_id = options['election']
+        if election_id is not None:
+            if not Election.objects.filter(id=election_id).exists():
+                raise CommandError(
+                    'There is no election with an ID of {}.'.format(
+                        election_id
+                    )
+                )
+
+        with transaction.atomic():
+            # Prevent votes from being cast while we rebuild the tallies.
+            # Otherwise, the votes cast in the meantime will be lost from the
+            # rebuilt tallies. Votes can still be read while the lock is held.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'LOCK TABLE {} IN SHARE MODE'.format(Vote._meta.db_table)
+                )
+
+            # We remove the default ordering, since it would only add joins
+            # to the queries that we do not need. The tallies of elections
+            # whose ballots are encrypted are left alone, since they have no
+            # votes to rebuild the tallies from. Their tallies are finalized
+            # by the `finalizetally` command instead.
+            votes = Vote.objects.order_by()
+            tallies = CandidateTally.objects.filter(
+                candidate__election__key__isnull=True
+            )
+            section_tallies = CandidateSectionTally.objects.all()
+            if election_id is not None:
+                votes = votes.filter(candidate__election__id=election_id)
+                tallies = tallies.filter(candidate__election__id=election_id)
+                section_tallies = section_tallies.filter(
+                    candidate__election__id=election_id
+                )
+
+            tallies.delete()
+            section_tallies.delete()
+
+            candidate_totals = votes.values('candidate') \
+                                    .annotate(total_votes=Count('id'))
+            CandidateTally.objects.bulk_create([
+                CandidateTally(
+                    candidate_id=total['candidate'],
+                    total_votes=total['total_votes']
+                ) for total in candidate_totals
+            ])
+
+            section_totals = votes.filter(user__voter_profile__isnull=False) \
+                                  .values(
+                                      'candidate',
+                                      'user__voter_profile__batch',
+                                      'user__voter_profile__section'
+                                  ) \
+                                  .annotate(total_votes=Count('id'))
+            CandidateSectionTally.objects.bulk_create([
+                CandidateSectionTally(
+                    candidate_id=total['candidate'],
+                    batch_id=total['user__voter_profile__batch'],
+                    section_id=total['user__voter_profile__section'],
+                    total_votes=total['total_votes']
+                ) for total in section_totals
+            ])
+
+            change_cache_version('results')
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                'Rebuilt the tallies of {} candidate(s).'.format(
+                    len(candidate_totals)
+                )
+            )
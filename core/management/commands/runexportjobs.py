@@ -0,0 +1,236 @@
+"""
+Runs the jobs that export the results of the elections, and the jobs that
+generate the keys of the elections.
+
+Admins request results exports from the results page, and election keys from
+the election settings page, which only creates the jobs. This command must be
+kept running alongside the web server so that the jobs get run. Multiple
+instances of this command may run at the same time, since each job is only
+claimed by one instance.
+
+Jobs that have been running for longer than the job timeout are assumed to
+have been abandoned by their workers (e.g. because the workers got killed),
+and are marked as failed, so that they do not block newer jobs.
+"""
+import datetime
+import os
+import time
+import traceback
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import (
+    close_old_connections, transaction
+)
+from django.db.models import Q
+from django.utils import timezone
+
+from core.encryption import (
+    check_election_key_can_be_generated, create_election_key,
+    generate_key_pair
+)
+from core.exporters import RESULTS_EXPORTERS
+from core.models import (
+    Election, ElectionKeyJob, ExportJob, ExportJobStatus
+)
+
+
+class Command(BaseCommand):
+    help = 'Runs the jobs that export the results of the elections, and ' \
+           'that generate the keys of the elections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help=(
+                'Run the pending jobs, and exit, instead of waiting for new '
+                'jobs.'
+            )
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help=(
+                'Specifies the number of seconds to wait before checking for '
+                'new jobs, when there are none. Defaults to 2 seconds.'
+            )
+        )
+        parser.add_argument(
+            '--job-timeout',
+            type=float,
+            default=3600.0,
+            help=(
+                'Specifies the number of seconds after which running jobs are '
+                'assumed to have been abandoned by their workers, and are '
+                'marked as failed. Defaults to 1 hour.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        job_timeout = datetime.timedelta(seconds=options['job_timeout'])
+
+        # Jobs left running by a worker that got killed are failed right
+        # away, instead of waiting for a job to be claimed.
+        self._fail_stale_jobs(ExportJob, job_timeout)
+        self._fail_stale_jobs(ElectionKeyJob, job_timeout)
+
+        while True:
+            # Export jobs take less time, so they are run first.
+            job = self._claim_job(ExportJob, job_timeout)
+            if job is not None:
+                self._run_job(job, options['verbosity'])
+                continue
+
+            key_job = self._claim_job(ElectionKeyJob, job_timeout)
+            if key_job is not None:
+                self._run_key_job(key_job, options['verbosity'])
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
+
+                # Connections are only closed when they get too old or broken
+                # at the start and end of requests, and the worker does not
+                # serve any, so we have to close them ourselves.
+                close_old_connections()
+
+    def _claim_job(self, job_model, job_timeout):
+        self._fail_stale_jobs(job_model, job_timeout)
+
+        with transaction.atomic():
+            # Jobs claimed by other workers are locked, so we skip them.
+            job = job_model.objects \
+                           .select_for_update(skip_locked=True) \
+                           .filter(status=ExportJobStatus.PENDING) \
+                           .order_by('date_created') \
+                           .first()
+            if job is not None:
+                job.status = ExportJobStatus.RUNNING
+                job.date_claimed = timezone.now()
+                job.save()
+
+        return job
+
+    def _fail_stale_jobs(self, job_model, job_timeout):
+        now = timezone.now()
+
+        # Jobs claimed before the claim times were recorded do not have one.
+        stale_jobs = job_model.objects.filter(
+            Q(date_claimed__lt=now - job_timeout)
+            | Q(date_claimed__isnull=True),
+            status=ExportJobStatus.RUNNING
+        )
+        stale_jobs.update(
+            status=ExportJobStatus.FAILED,
+            error=(
+                'The job was abandoned by its worker, or took longer than '
+                '{:.0f} s.'.format(job_timeout.total_seconds())
+            ),
+            date_updated=now
+        )
+
+    def _run_job(self, job, verbosity):
+        os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+
+        file_name = '{}-{}.{}'.format(
+            job.id,
+            job.results_version,
+            job.file_format
+        )
+        file_path = os.path.join(settings.EXPORT_ROOT, file_name)
+
+        # The file is written under a temporary name first, so that a
+        # partially written file never gets served.
+        temp_file_path = '{}.part'.format(file_path)
+        try:
+            exporter = RESULTS_EXPORTERS[job.file_format]()
+            with open(temp_file_path, 'wb') as export_file:
+                exporter.write(job.election_id, export_file)
+
+            os.replace(temp_file_path, file_path)
+        except Exception:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+            job.status = ExportJobStatus.FAILED
+            job.error = traceback.format_exc()
+            job.save()
+
+            self.stderr.write('Export job #{} failed.\n{}'.format(
+                job.id,
+                job.error
+            ))
+            return
+
+        job.status = ExportJobStatus.DONE
+        job.file_name = file_name
+        job.save()
+
+        self._delete_old_exports(job)
+
+        if verbosity >= 1:
+            self.stdout.write(
+                'Export job #{} finished successfully.'.format(job.id)
+            )
+
+    def _run_key_job(self, job, verbosity):
+        start_time = time.perf_counter()
+        try:
+            # The election may have gotten votes or a key since the job was
+            # requested.
+            check_election_key_can_be_generated(job.election)
+            public_key, private_key = generate_key_pair()
+
+            # Ballots may have been cast while the key pair was being
+            # generated, so we have to check again. Ballots lock the row of
+            # their election until they are committed (see
+            # `VoteProcessingView`), so locking the row here waits for the
+            # ballots being cast to be committed, and keeps new ballots from
+            # being cast until the key is stored.
+            with transaction.atomic():
+                Election.objects.select_for_update().get(id=job.election_id)
+                check_election_key_can_be_generated(job.election)
+                create_election_key(job.election, public_key, private_key)
+        except Exception as e:
+            job.status = ExportJobStatus.FAILED
+            job.error = str(e) if isinstance(e, ValueError) \
+                               else traceback.format_exc()
+            job.save()
+
+            self.stderr.write('Election key job #{} failed.\n{}'.format(
+                job.id,
+                job.error
+            ))
+            return
+
+        job.status = ExportJobStatus.DONE
+        job.duration = time.perf_counter() - start_time
+        job.save()
+
+        if verbosity >= 1:
+            self.stdout.write(
+                'Election key job #{} finished in {:.1f} s '
+                'successfully.'.format(job.id, job.duration)
+            )
+
+    def _delete_old_exports(self, job):
+        # Exports of older versions of the results will never be served
+        # again, so we can delete them.
+        old_jobs = ExportJob.objects \
+                            .filter(
+                                election__id=job.election_id,
+                                file_format=job.file_format,
+                                date_created__lt=job.date_created,
+                                status__in=[
+                                    ExportJobStatus.DONE,
+                                    ExportJobStatus.FAILED
+                                ]
+                            ) \
+                            .exclude(id=job.id)
+        for old_job in old_jobs:
+            if old_job.file_name and os.path.exists(old_job.file_path):
+                os.remove(old_job.file_path)
+
+        old_jobs.delete()
@@ -0,0 +1,148 @@
+"""
+Metrics of the requests served by Botos.
+
+The metrics of a request (the number of SQL queries, and the time spent on
+the database, on rendering templates, and on the whole request) are collected
+by the request metrics middleware (see `core.middleware`), which is only used
+when the REQUEST_METRICS setting is enabled. The metrics of each request are
+logged to the `botos.requests` logger, and the metrics of the most recent
+requests to each view are kept in the cache shared by all the processes
+serving Botos, so that a rolling summary can be shown to admins.
+"""
+import contextvars
+import logging
+import math
+import time
+
+from django.core.cache import cache
+
+
+# The number of the most recent requests to each view kept for the summary.
+SUMMARY_WINDOW = 100
+
+_VIEWS_KEY = 'botos:request_metrics:views'
+_SAMPLES_KEY = 'botos:request_metrics:views:{}'
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+logger = logging.getLogger('botos.requests')
+
+
+class RequestMetrics(object):
+    """
+    Collects the metrics of a request. While collecting, the metrics are made
+    the current metrics, so that code outside of the middleware (e.g. the
+    template backend) can add to them.
+    """
+    def __init__(self):
+        self.num_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.wall_time = 0.0
+
+    def start(self):
+        self._token = _current_metrics.set(self)
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        self.wall_time = time.perf_counter() - self._start_time
+        _current_metrics.reset(self._token)
+
+    def record_query(self, execute, sql, params, many, context):
+        """ Database execute wrapper that records the queries. """
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.num_queries += 1
+            self.db_time += time.perf_counter() - start_time
+
+
+def add_template_time(template_time):
+    """
+    Add `template_time` seconds spent rendering a template to the metrics of
+    the current request, if its metrics are being collected.
+    """
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.template_time += template_time
+
+
+def record_request_metrics(request, response, view_name, metrics):
+    """
+    Log the metrics of a request to the view named `view_name`, and add them
+    to the rolling summary.
+    """
+    logger.info(
+        'view=%s method=%s path=%s status=%d queries=%d db_ms=%.1f '
+        'template_ms=%.1f wall_ms=%.1f',
+        view_name,
+        request.method,
+        request.path,
+        response.status_code,
+        metrics.num_queries,
+        metrics.db_time * 1000,
+        metrics.template_time * 1000,
+        metrics.wall_time * 1000,
+        extra={
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.num_queries,
+            'db_ms': metrics.db_time * 1000,
+            'template_ms': metrics.template_time * 1000,
+            'wall_ms': metrics.wall_time * 1000
+        }
+    )
+
+    # Requests served at the same time by different processes may overwrite
+    # each other's samples. That is fine, since we only need a rough summary,
+    # and it saves us from having to lock the cache on every request.
+    views = cache.get(_VIEWS_KEY, set())
+    if view_name not in views:
+        views.add(view_name)
+        cache.set(_VIEWS_KEY, views, timeout=None)
+
+    key = _SAMPLES_KEY.format(view_name)
+    samples = cache.get(key, list())
+    samples.append((
+        metrics.num_queries,
+        metrics.db_time,
+        metrics.template_time,
+        metrics.wall_time
+    ))
+    cache.set(key, samples[-SUMMARY_WINDOW:], timeout=None)
+
+
+def get_request_metrics_summary():
+    """
+    Get the summary of the metrics of the most recent requests to each view,
+    as a list of dicts sorted by view name. Times are in milliseconds.
+    """
+    summary = list()
+    for view_name in sorted(cache.get(_VIEWS_KEY, set())):
+        samples = cache.get(_SAMPLES_KEY.format(view_name))
+        if not samples:
+            continue
+
+        num_queries, db_times, template_times, wall_times = zip(*samples)
+        summary.append({
+            'view': view_name,
+            'num_requests': len(samples),
+            'avg_queries': sum(num_queries) / len(samples),
+            'max_queries': max(num_queries),
+            'avg_db_ms': sum(db_times) / len(samples) * 1000,
+            'avg_template_ms': sum(template_times) / len(samples) * 1000,
+            'avg_wall_ms': sum(wall_times) / len(samples) * 1000,
+            'p95_wall_ms': get_percentile(wall_times, 95) * 1000
+        })
+
+    return summary
+
+
+def get_percentile(values, percentile):
+    """ Get the `percentile`th percentile of `values` (nearest rank). """
+    values = sorted(values)
+    index = math.ceil(percentile / 100 * len(values)) - 1
+    return values[max(index, 0)]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from core.metrics import (
+    RequestMetrics, record_request_metrics
+)
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Middleware that collects the metrics of the requests to views (see
+    `core.metrics`). The middleware is only used when the REQUEST_METRICS
+    setting is enabled, and should be the first middleware so that the wall
+    time covers the other middleware as well.
+
+    Note that only the time spent producing a response is measured. The time
+    spent sending the content of streaming responses (e.g. exported results)
+    is not.
+    """
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        metrics.start()
+        try:
+            with connection.execute_wrapper(metrics.record_query):
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+
+        # Requests that did not get to a view (e.g. requests to non-existent
+        # pages) are not recorded.
+        view_name = getattr(request, '_metrics_view_name', None)
+        if view_name is not None:
+            record_request_metrics(request, response, view_name, metrics)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        request._metrics_view_name = view.__name__
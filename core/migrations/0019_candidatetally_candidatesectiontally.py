@@ -0,0 +1,132 @@
+# Generated by Django 5.0.14 on 2026-10-17 04:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Keeps the candidate tallies current whenever votes are inserted or deleted,
+# in the same transaction where the change to the votes happen. This covers
+# every path that modifies votes (casting votes, clearing elections, and
+# cascading deletes), including the ones that bypass model methods and
+# signals, such as bulk creates and queryset deletes.
+#
+# Note that the tally rows are only ever inserted when votes are inserted.
+# When votes are deleted, we only decrement existing rows, since the tallies
+# may already be deleted if the candidate itself is being deleted.
+CREATE_VOTE_TALLY_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION core_vote_update_tallies() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE core_candidatetally
+           SET total_votes = total_votes - 1, date_updated = now()
+         WHERE candidate_id = OLD.candidate_id;
+
+        UPDATE core_candidatesectiontally AS tally
+           SET total_votes = tally.total_votes - 1, date_updated = now()
+          FROM core_voterprofile AS profile
+         WHERE profile.user_id = OLD.user_id
+           AND tally.candidate_id = OLD.candidate_id
+           AND tally.batch_id = profile.batch_id
+           AND tally.section_id = profile.section_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO core_candidatetally
+               (date_created, date_updated, candidate_id, total_votes)
+        VALUES (now(), now(), NEW.candidate_id, 1)
+        ON CONFLICT (candidate_id) DO UPDATE
+           SET total_votes = core_candidatetally.total_votes + 1,
+               date_updated = now();
+
+        INSERT INTO core_candidatesectiontally
+               (date_created, date_updated, candidate_id, batch_id,
+                section_id, total_votes)
+        SELECT now(), now(), NEW.candidate_id, profile.batch_id,
+               profile.section_id, 1
+          FROM core_voterprofile AS profile
+         WHERE profile.user_id = NEW.user_id
+        ON CONFLICT (candidate_id, batch_id, section_id) DO UPDATE
+           SET total_votes = core_candidatesectiontally.total_votes + 1,
+               date_updated = now();
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_vote_update_tallies
+    AFTER INSERT OR DELETE OR UPDATE OF candidate_id, user_id ON core_vote
+    FOR EACH ROW EXECUTE FUNCTION core_vote_update_tallies();
+"""
+
+DROP_VOTE_TALLY_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS core_vote_update_tallies ON core_vote;
+DROP FUNCTION IF EXISTS core_vote_update_tallies();
+"""
+
+# Tally the votes that were cast before the tallies existed.
+POPULATE_TALLIES_SQL = """
+INSERT INTO core_candidatetally
+       (date_created, date_updated, candidate_id, total_votes)
+SELECT now(), now(), vote.candidate_id, COUNT(*)
+  FROM core_vote AS vote
+ GROUP BY vote.candidate_id;
+
+INSERT INTO core_candidatesectiontally
+       (date_created, date_updated, candidate_id, batch_id, section_id,
+        total_votes)
+SELECT now(), now(), vote.candidate_id, profile.batch_id, profile.section_id,
+       COUNT(*)
+  FROM core_vote AS vote
+  JOIN core_voterprofile AS profile ON profile.user_id = vote.user_id
+ GROUP BY vote.candidate_id, profile.batch_id, profile.section_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_auto_20200716_0937'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateTally',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('total_votes', models.IntegerField(default=0, verbose_name='total votes')),
+                ('candidate', models.OneToOneField(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='tally', to='core.candidate')),
+            ],
+            options={
+                'verbose_name': 'candidate tally',
+                'verbose_name_plural': 'candidate tallies',
+            },
+        ),
+        migrations.CreateModel(
+            name='CandidateSectionTally',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('total_votes', models.IntegerField(default=0, verbose_name='total votes')),
+                ('batch', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='candidate_section_tallies', to='core.batch')),
+                ('candidate', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='section_tallies', to='core.candidate')),
+                ('section', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='candidate_section_tallies', to='core.section')),
+            ],
+            options={
+                'verbose_name': 'candidate section tally',
+                'verbose_name_plural': 'candidate section tallies',
+                'unique_together': {('candidate', 'batch', 'section')},
+            },
+        ),
+        migrations.RunSQL(
+            sql=POPULATE_TALLIES_SQL,
+            reverse_sql=migrations.RunSQL.noop
+        ),
+        migrations.RunSQL(
+            sql=CREATE_VOTE_TALLY_TRIGGER_SQL,
+            reverse_sql=DROP_VOTE_TALLY_TRIGGER_SQL
+        ),
+    ]
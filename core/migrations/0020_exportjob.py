@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-17 05:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_candidatetally_candidatesectiontally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('file_format', models.CharField(choices=[('xlsx', 'XLSX'), ('csv', 'CSV')], default='xlsx', max_length=4, verbose_name='file format')),
+                ('results_version', models.CharField(default=None, max_length=32, verbose_name='results version')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0, verbose_name='status')),
+                ('file_name', models.CharField(blank=True, default='', max_length=255, verbose_name='file name')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('election', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='core.election')),
+            ],
+            options={
+                'verbose_name': 'export job',
+                'verbose_name_plural': 'export jobs',
+                'ordering': ['date_created'],
+                'indexes': [models.Index(fields=['election', 'file_format', 'results_version'], name='core_export_electio_4c7feb_idx'), models.Index(fields=['status'], name='core_export_status_3eafef_idx')],
+            },
+        ),
+    ]
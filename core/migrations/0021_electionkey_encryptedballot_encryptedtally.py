@@ -0,0 +1,58 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectionKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('public_key', models.TextField(default=None, verbose_name='public key')),
+                ('private_key', models.JSONField(default=None, verbose_name='private key')),
+                ('election', models.OneToOneField(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='key', to='core.election')),
+            ],
+            options={
+                'verbose_name': 'election key',
+                'verbose_name_plural': 'election keys',
+            },
+        ),
+        migrations.CreateModel(
+            name='EncryptedBallot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('votes', models.JSONField(default=dict, verbose_name='votes')),
+                ('election', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='encrypted_ballots', to='core.election')),
+                ('position', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='encrypted_ballots', to='core.candidateposition')),
+            ],
+            options={
+                'verbose_name': 'encrypted ballot',
+                'verbose_name_plural': 'encrypted ballots',
+            },
+        ),
+        migrations.CreateModel(
+            name='EncryptedTally',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('ciphertext', models.TextField(default=None, verbose_name='ciphertext')),
+                ('candidate', models.OneToOneField(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='encrypted_tally', to='core.candidate')),
+            ],
+            options={
+                'verbose_name': 'encrypted tally',
+                'verbose_name_plural': 'encrypted tallies',
+            },
+        ),
+    ]
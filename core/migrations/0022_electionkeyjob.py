@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_electionkey_encryptedballot_encryptedtally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectionKeyJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Running'), (2, 'Done'), (3, 'Failed')], default=0, verbose_name='status')),
+                ('duration', models.FloatField(blank=True, default=None, null=True, verbose_name='duration')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('election', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='key_jobs', to='core.election')),
+            ],
+            options={
+                'verbose_name': 'election key job',
+                'verbose_name_plural': 'election key jobs',
+                'ordering': ['date_created'],
+                'indexes': [models.Index(fields=['status'], name='core_electi_status_e28178_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_electionkeyjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='size')),
+                ('frontier', models.JSONField(default=list, verbose_name='frontier')),
+                ('election', models.OneToOneField(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='receipt_log', to='core.election')),
+            ],
+            options={
+                'verbose_name': 'receipt log',
+                'verbose_name_plural': 'receipt logs',
+            },
+        ),
+        migrations.CreateModel(
+            name='Receipt',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('index', models.PositiveIntegerField(default=None, verbose_name='index')),
+                ('receipt', models.CharField(default=None, max_length=64, unique=True, verbose_name='receipt')),
+                ('election', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='core.election')),
+            ],
+            options={
+                'verbose_name': 'receipt',
+                'verbose_name_plural': 'receipts',
+                'ordering': ['election', 'index'],
+                'unique_together': {('election', 'index')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ReceiptLogNode',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True, null=True, verbose_name='date_created')),
+                ('date_updated', models.DateTimeField(auto_now=True, null=True, verbose_name='date_updated')),
+                ('level', models.PositiveSmallIntegerField(default=None, verbose_name='level')),
+                ('index', models.PositiveIntegerField(default=None, verbose_name='index')),
+                ('hash', models.CharField(default=None, max_length=64, verbose_name='hash')),
+                ('election', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='receipt_log_nodes', to='core.election')),
+            ],
+            options={
+                'verbose_name': 'receipt log node',
+                'verbose_name_plural': 'receipt log nodes',
+                'unique_together': {('election', 'level', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_receipt_receiptlog_receiptlognode'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['type', 'username'], name='core_user_type_b0f31c_idx'),
+        ),
+    ]
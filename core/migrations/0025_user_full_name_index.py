@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:41
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_user_type_username_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(models.Func('last_name', models.Value(', '), 'first_name', arg_joiner=' || ', output_field=models.CharField(), template='(%(expressions)s)')), name='text_pattern_ops'), name='core_user_full_name_idx'),
+        ),
+    ]
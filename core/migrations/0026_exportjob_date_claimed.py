@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_user_full_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='date_claimed',
+            field=models.DateTimeField(blank=True, default=None, null=True, verbose_name='date claimed'),
+        ),
+    ]
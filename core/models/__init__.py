@@ -1,5 +1,15 @@
+from .bulletin_board_models import (
+    Receipt, ReceiptLog, ReceiptLogNode
+)
 from .election_models import (
-    Vote, Candidate, CandidateParty, CandidatePosition, Election
+    Vote, Candidate, CandidateParty, CandidatePosition, Election,
+    CandidateTally, CandidateSectionTally
+)
+from .encryption_models import (
+    ElectionKey, ElectionKeyJob, EncryptedBallot, EncryptedTally
+)
+from .export_job_model import (
+    ExportFormat, ExportJob, ExportJobStatus
 )
 from .settings_model import Setting
 from .user_models import (
@@ -10,5 +20,9 @@ from .user_models import (
 __all__ = [
     'User', 'Batch', 'Section', 'VoterProfile',
     'Vote', 'Election', 'Candidate', 'CandidateParty', 'CandidatePosition',
+    'CandidateTally', 'CandidateSectionTally',
+    'ElectionKey', 'ElectionKeyJob', 'EncryptedBallot', 'EncryptedTally',
+    'ExportJob', 'ExportFormat', 'ExportJobStatus',
+    'Receipt', 'ReceiptLog', 'ReceiptLogNode',
     'Setting', 'UserType'
 ]
@@ -0,0 +1,144 @@
+from django.db import models
+
+from .base_model import Base
+from .election_models import Election
+
+
+class ReceiptLog(Base):
+    """
+    Model for the append-only Merkle log of the vote receipts of an election
+    (see `core.bulletin_board`). Only the number of receipts in the log and
+    the frontier of the log are kept here. The frontier is the list of the
+    hashes of the largest complete subtrees of the log, from left to right,
+    as `[ <level>, <hash> ]` pairs. The root of the log is computed from the
+    frontier alone, and new receipts are appended with the frontier without
+    reading any other node of the log.
+    """
+    election = models.OneToOneField(
+        Election,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        related_name='receipt_log'
+    )
+    size = models.PositiveIntegerField(
+        'size',
+        null=False,
+        blank=False,
+        default=0,
+        unique=False
+    )
+    frontier = models.JSONField(
+        'frontier',
+        null=False,
+        blank=False,
+        default=list,
+        unique=False
+    )
+
+    class Meta:
+        verbose_name = 'receipt log'
+        verbose_name_plural = 'receipt logs'
+
+    def __str__(self):
+        return '<Receipt Log of \'{}\'>'.format(self.election.name)
+
+
+class Receipt(Base):
+    """
+    Model for a vote receipt in the receipt log of an election. The receipt
+    is given to the voter once the voter's ballot has been cast, so that the
+    voter can check that the ballot is in the log. Receipts are not linked to
+    their voters.
+    """
+    election = models.ForeignKey(
+        Election,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='receipts'
+    )
+    index = models.PositiveIntegerField(
+        'index',
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+    receipt = models.CharField(
+        'receipt',
+        max_length=64,
+        null=False,
+        blank=False,
+        default=None,
+        unique=True
+    )
+
+    class Meta:
+        ordering = [ 'election', 'index' ]
+        unique_together = ( ( 'election', 'index', ), )
+        verbose_name = 'receipt'
+        verbose_name_plural = 'receipts'
+
+    def __str__(self):
+        return '<Receipt #{} of \'{}\'>'.format(
+            self.index,
+            self.election.name
+        )
+
+
+class ReceiptLogNode(Base):
+    """
+    Model for the hash of a complete subtree of the receipt log of an
+    election. The node at `level` and `index` covers the receipts with
+    indices from `index * 2^level` up to, but not including,
+    `(index + 1) * 2^level`. Level 0 holds the hashes of the receipts. Since
+    the log is append-only, a node never changes once it is complete, so
+    only complete subtrees are stored.
+    """
+    election = models.ForeignKey(
+        Election,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='receipt_log_nodes'
+    )
+    level = models.PositiveSmallIntegerField(
+        'level',
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+    index = models.PositiveIntegerField(
+        'index',
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+    hash = models.CharField(
+        'hash',
+        max_length=64,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+
+    class Meta:
+        unique_together = ( ( 'election', 'level', 'index', ), )
+        verbose_name = 'receipt log node'
+        verbose_name_plural = 'receipt log nodes'
+
+    def __str__(self):
+        return '<Receipt Log Node ({}, {}) of \'{}\'>'.format(
+            self.level,
+            self.index,
+            self.election.name
+        )
@@ -4,7 +4,7 @@ from django.db import models
 
 from .base_model import Base
 from .user_models import (
-    User, Batch
+    User, Batch, Section
 )
 
 
@@ -291,3 +291,97 @@ class Vote(Base):
             self.candidate.user.username,
             self.user.username
         )
+
+
+class CandidateTally(Base):
+    """
+    Model for the running vote tally of a candidate. This is a materialized
+    view of the number of votes a candidate has, and is kept current by a
+    database trigger on the votes table (see migration 0019), in the same
+    transaction where the votes are cast. This allows us to get the results
+    by reading one row per candidate instead of counting all the votes.
+
+    Should the tallies ever get out of sync with the votes, they can be
+    rebuilt by running `manage.py rebuildtallies`.
+    """
+    candidate = models.OneToOneField(
+        Candidate,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        related_name='tally'
+    )
+    total_votes = models.IntegerField(
+        'total votes',
+        null=False,
+        blank=False,
+        default=0,
+        unique=False
+    )
+
+    class Meta:
+        verbose_name = 'candidate tally'
+        verbose_name_plural = 'candidate tallies'
+
+    def __str__(self):
+        return '<Tally for \'{}\': {}>'.format(
+            self.candidate.user.username,
+            self.total_votes
+        )
+
+
+class CandidateSectionTally(Base):
+    """
+    Model for the running vote tally of a candidate from the voters of a
+    batch and section. Like CandidateTally, this is kept current by a database
+    trigger on the votes table. The batch and section are those of the voter
+    at the time the vote was cast.
+    """
+    candidate = models.ForeignKey(
+        Candidate,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='section_tallies'
+    )
+    batch = models.ForeignKey(
+        Batch,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='candidate_section_tallies'
+    )
+    section = models.ForeignKey(
+        Section,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='candidate_section_tallies'
+    )
+    total_votes = models.IntegerField(
+        'total votes',
+        null=False,
+        blank=False,
+        default=0,
+        unique=False
+    )
+
+    class Meta:
+        unique_together = ( ( 'candidate', 'batch', 'section', ), )
+        verbose_name = 'candidate section tally'
+        verbose_name_plural = 'candidate section tallies'
+
+    def __str__(self):
+        return '<Tally for \'{}\' in \'{}\' ({}): {}>'.format(
+            self.candidate.user.username,
+            self.section.section_name,
+            self.batch.year,
+            self.total_votes
+        )
@@ -0,0 +1,198 @@
+from django.db import models
+
+from .base_model import Base
+from .election_models import (
+    Candidate, CandidatePosition, Election
+)
+from .export_job_model import ExportJobStatus
+
+
+class ElectionKey(Base):
+    """
+    Model for the Paillier key pair of an election. Elections with a key pair
+    have their ballots encrypted (see `core.encryption`). The key pair must
+    not be changed once ballots have been cast, since the ballots can only be
+    decrypted with the key pair they were encrypted with.
+
+    The public key is stored as its modulus, and the private key as its
+    primes, all in decimal.
+
+    The private key is stored in plaintext, in the same database as the
+    ballots. So, anyone who can read the database can decrypt the ballots.
+    """
+    election = models.OneToOneField(
+        Election,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        related_name='key'
+    )
+    public_key = models.TextField(
+        'public key',
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+    private_key = models.JSONField(
+        'private key',
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+
+    class Meta:
+        verbose_name = 'election key'
+        verbose_name_plural = 'election keys'
+
+    def __str__(self):
+        return '<Key of \'{}\'>'.format(self.election.name)
+
+
+class ElectionKeyJob(Base):
+    """
+    Model for the jobs that generate the key pairs of elections. Generating a
+    key pair can take a while, so, like export jobs, the jobs are run in the
+    background by the job worker (see the `runexportjobs` management command).
+    The jobs share the statuses of export jobs. The number of seconds taken
+    to generate the key pair is recorded, along with the time a worker
+    claimed the job.
+    """
+    election = models.ForeignKey(
+        Election,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='key_jobs'
+    )
+    status = models.PositiveSmallIntegerField(
+        'status',
+        null=False,
+        blank=False,
+        default=ExportJobStatus.PENDING,
+        choices=[
+            (ExportJobStatus.PENDING, 'Pending'),
+            (ExportJobStatus.RUNNING, 'Running'),
+            (ExportJobStatus.DONE, 'Done'),
+            (ExportJobStatus.FAILED, 'Failed')
+        ],
+        unique=False
+    )
+    duration = models.FloatField(
+        'duration',
+        null=True,
+        blank=True,
+        default=None,
+        unique=False
+    )
+    error = models.TextField(
+        'error',
+        null=False,
+        blank=True,
+        default='',
+        unique=False
+    )
+    date_claimed = models.DateTimeField(
+        'date claimed',
+        null=True,
+        blank=True,
+        default=None
+    )
+
+    class Meta:
+        indexes = [ models.Index(fields=[ 'status' ]) ]
+        ordering = [ 'date_created' ]
+        verbose_name = 'election key job'
+        verbose_name_plural = 'election key jobs'
+
+    def __str__(self):
+        return '<Election Key Job #{} ({})>'.format(
+            self.id,
+            self.get_status_display()
+        )
+
+
+class EncryptedBallot(Base):
+    """
+    Model for the encrypted votes of a ballot in a position. The votes are
+    stored as a vector that maps the ID of every candidate in the position,
+    as a string, to the encryption of 1 if the candidate was voted, or of 0
+    otherwise. Every position the voter can vote in gets an encrypted ballot,
+    even if the voter did not vote in it, so that the ballots do not reveal
+    which positions were skipped.
+
+    Encrypted ballots are not linked to their voters.
+    """
+    election = models.ForeignKey(
+        Election,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='encrypted_ballots'
+    )
+    position = models.ForeignKey(
+        CandidatePosition,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False,
+        related_name='encrypted_ballots'
+    )
+    votes = models.JSONField(
+        'votes',
+        null=False,
+        blank=False,
+        default=dict,
+        unique=False
+    )
+
+    class Meta:
+        verbose_name = 'encrypted ballot'
+        verbose_name_plural = 'encrypted ballots'
+
+    def __str__(self):
+        return '<Encrypted Ballot #{} for \'{}\'>'.format(
+            self.id,
+            self.position.position_name
+        )
+
+
+class EncryptedTally(Base):
+    """
+    Model for the encrypted vote tally of a candidate. This is the
+    homomorphic sum of the candidate's encrypted votes, which is summed up
+    from the encrypted ballots when the tallies are finalized (see the
+    `finalizetally` management command), so that the decrypted tally can be
+    checked against it. The ciphertext is stored in decimal.
+    """
+    candidate = models.OneToOneField(
+        Candidate,
+        on_delete=models.CASCADE,
+        null=False,
+        blank=False,
+        default=None,
+        related_name='encrypted_tally'
+    )
+    ciphertext = models.TextField(
+        'ciphertext',
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+
+    class Meta:
+        verbose_name = 'encrypted tally'
+        verbose_name_plural = 'encrypted tallies'
+
+    def __str__(self):
+        return '<Encrypted Tally for \'{}\'>'.format(
+            self.candidate.user.username
+        )
@@ -0,0 +1,116 @@
+import os
+
+from django.conf import settings
+from django.db import models
+
+from .base_model import Base
+from .election_models import Election
+
+
+class ExportFormat(object):
+    # Like UserType, this is not an Enum so that we get back plain strings.
+    XLSX = 'xlsx'
+    CSV = 'csv'
+
+
+class ExportJobStatus(object):
+    PENDING = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+
+class ExportJob(Base):
+    """
+    Model for the jobs that export the results of an election, or of all
+    elections if there is no election. The jobs are run in the background by
+    the export job worker (see the `runexportjobs` management command).
+
+    The exported file of a job is stamped with the version of the results at
+    the time the job was requested, so that the file can be served again until
+    the results change. The time a worker claimed the job is recorded, so that
+    jobs whose workers got killed can be told apart from running jobs.
+    """
+    election = models.ForeignKey(
+        Election,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        default=None,
+        related_name='export_jobs'
+    )
+    file_format = models.CharField(
+        'file format',
+        max_length=4,
+        null=False,
+        blank=False,
+        default=ExportFormat.XLSX,
+        choices=[
+            (ExportFormat.XLSX, 'XLSX'),
+            (ExportFormat.CSV, 'CSV')
+        ],
+        unique=False
+    )
+    results_version = models.CharField(
+        'results version',
+        max_length=32,
+        null=False,
+        blank=False,
+        default=None,
+        unique=False
+    )
+    status = models.PositiveSmallIntegerField(
+        'status',
+        null=False,
+        blank=False,
+        default=ExportJobStatus.PENDING,
+        choices=[
+            (ExportJobStatus.PENDING, 'Pending'),
+            (ExportJobStatus.RUNNING, 'Running'),
+            (ExportJobStatus.DONE, 'Done'),
+            (ExportJobStatus.FAILED, 'Failed')
+        ],
+        unique=False
+    )
+    file_name = models.CharField(
+        'file name',
+        max_length=255,
+        null=False,
+        blank=True,
+        default='',
+        unique=False
+    )
+    error = models.TextField(
+        'error',
+        null=False,
+        blank=True,
+        default='',
+        unique=False
+    )
+    date_claimed = models.DateTimeField(
+        'date claimed',
+        null=True,
+        blank=True,
+        default=None
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=[ 'election', 'file_format', 'results_version' ]
+            ),
+            models.Index(fields=[ 'status' ])
+        ]
+        ordering = [ 'date_created' ]
+        verbose_name = 'export job'
+        verbose_name_plural = 'export jobs'
+
+    def __str__(self):
+        return '<Export Job #{} ({})>'.format(
+            self.id,
+            self.get_status_display()
+        )
+
+    @property
+    def file_path(self):
+        return os.path.join(settings.EXPORT_ROOT, self.file_name)
@@ -1,8 +1,16 @@
+from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
+from django.contrib.auth.hashers import (
+    acheck_password, check_password, make_password
+)
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.indexes import OpClass
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Q
+from django.db.models import (
+    Func, Q
+)
+from django.db.models.functions import Upper
 
 from .base_model import Base
 
@@ -57,6 +65,27 @@ class UserManager(BaseUserManager):
         return self._create_user(username, email, password, **extra_fields)
 
 
+def get_normalized_full_name():
+    """
+    Get the expression of the full names of users, as shown in the admin
+    (`<last name>, <first name>`), in upper case. Searches by the start of
+    this expression can use the index on it, since the text pattern operator
+    class lets the index be used with LIKE, regardless of the collation.
+    """
+    # Concat() is not used, since it uses CONCAT() in PostgreSQL, which
+    # cannot be used in indexes, unlike the concatenation operator.
+    return Upper(
+        Func(
+            'last_name',
+            models.Value(', '),
+            'first_name',
+            template='(%(expressions)s)',
+            arg_joiner=' || ',
+            output_field=models.CharField()
+        )
+    )
+
+
 class User(AbstractBaseUser, Base):
     """
     Custom model for users.
@@ -119,7 +148,20 @@ class User(AbstractBaseUser, Base):
     REQUIRED_FIELDS = ['email']
 
     class Meta:
-        indexes = [ models.Index(fields=[ 'username' ]) ]
+        # Voters are listed by username in the admin, which the second index
+        # covers. The third index covers searching for voters by the start
+        # of their full names (see `get_normalized_full_name()`).
+        indexes = [
+            models.Index(fields=[ 'username' ]),
+            models.Index(fields=[ 'type', 'username' ]),
+            models.Index(
+                OpClass(
+                    get_normalized_full_name(),
+                    name='text_pattern_ops'
+                ),
+                name='core_user_full_name_idx'
+            )
+        ]
         ordering = [ 'username' ]
         verbose_name = 'user'
         verbose_name_plural = 'users'
@@ -140,6 +182,56 @@ class User(AbstractBaseUser, Base):
         super().clean()
         self.email = self.__class__.objects.normalize_email(self.email)
 
+    @property
+    def password_hasher(self):
+        """
+        The algorithm of the password hasher that should be used for the
+        password of the user. Voters have their own hasher profile (see the
+        VOTER_PASSWORD_* settings).
+        """
+        if self.type == UserType.VOTER:
+            return settings.VOTER_PASSWORD_HASHER
+        else:
+            return 'default'
+
+    # We override the following password functions so that the passwords are
+    # hashed, and rehashed on login, with the hasher of the user instead of
+    # the first hasher in PASSWORD_HASHERS.
+    def set_password(self, raw_password):
+        self.password = make_password(
+            raw_password,
+            hasher=self.password_hasher
+        )
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=[ 'password' ])
+
+        return check_password(
+            raw_password,
+            self.password,
+            setter,
+            preferred=self.password_hasher
+        )
+
+    async def acheck_password(self, raw_password):
+        async def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            await self.asave(update_fields=[ 'password' ])
+
+        return await acheck_password(
+            raw_password,
+            self.password,
+            setter,
+            preferred=self.password_hasher
+        )
+
     # These functions are only here so that we can play nicely with Django.
     def has_perm(self, perm, obj=None):
         return self.type == UserType.ADMIN
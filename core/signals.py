@@ -0,0 +1,64 @@
+"""
+Signal receivers that invalidate cached data when the data it was built from
+changes.
+"""
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save
+)
+from django.dispatch import receiver
+
+from core.models import (
+    Batch, Candidate, CandidateParty, CandidatePosition, Election, Section,
+    User, VoterProfile
+)
+from core.utils import change_cache_version
+
+
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+@receiver(post_save, sender=CandidateParty)
+@receiver(post_delete, sender=CandidateParty)
+@receiver(post_save, sender=CandidatePosition)
+@receiver(post_delete, sender=CandidatePosition)
+@receiver(m2m_changed, sender=CandidatePosition.target_batches.through)
+def invalidate_ballots(sender, **kwargs):
+    change_cache_version('ballots')
+
+
+@receiver(post_save, sender=User)
+def invalidate_ballots_on_candidate_user_change(sender, instance, **kwargs):
+    # Users get saved every time they log in, since their last login date
+    # gets updated. We do not want to invalidate the ballots for every log in,
+    # especially when every voter is logging in at the same time. As such, we
+    # only invalidate the ballots when the name of a candidate might have
+    # changed.
+    update_fields = kwargs.get('update_fields', None)
+    if update_fields and set(update_fields) <= { 'last_login', 'password' }:
+        return
+
+    if Candidate.objects.filter(user__id=instance.id).exists():
+        change_cache_version('ballots')
+        change_cache_version('results')
+
+
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+@receiver(post_save, sender=CandidateParty)
+@receiver(post_delete, sender=CandidateParty)
+@receiver(post_save, sender=CandidatePosition)
+@receiver(post_delete, sender=CandidatePosition)
+@receiver(post_save, sender=Election)
+@receiver(post_delete, sender=Election)
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+@receiver(post_save, sender=VoterProfile)
+@receiver(post_delete, sender=VoterProfile)
+def invalidate_results(sender, **kwargs):
+    # Votes are cast and cleared in bulk, which does not send signals. So,
+    # the results version is also changed wherever votes are cast or
+    # cleared.
+    change_cache_version('results')
@@ -0,0 +1,33 @@
+"""
+Template backends of Botos.
+"""
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from core.metrics import add_template_time
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        start_time = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            add_template_time(time.perf_counter() - start_time)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The Django template backend, but with the time spent rendering templates
+    added to the metrics of the current request (see `core.metrics`).
+    """
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -10,14 +10,18 @@ from core.views.admin.admin import (
 from core.views.admin.admin_login_view import AdminLoginView
 from core.views.admin.election_settings import (
     CurrentTemplateView,
+    ElectionKeyView,
     ElectionSettingsIndexView,
     ElectionStateView
 )
 from core.views.auth import (
     LoginView, LogoutView
 )
+from core.views.bulletin_board import BulletinBoardView
 from core.views.index import IndexView
-from core.views.results import ResultsView
+from core.views.results import (
+    ResultsDataView, ResultsStreamView, ResultsView
+)
 from core.views.results_exporter import ResultsExporterView
 from core.views.vote import VoteProcessingView
 
@@ -25,9 +29,24 @@ from core.views.vote import VoteProcessingView
 urlpatterns = [
     path('', IndexView.as_view(), name='index'),
     path('vote/', VoteProcessingView.as_view(), name='vote-processing'),
+    path(
+        'bulletin-board/',
+        BulletinBoardView.as_view(),
+        name='bulletin-board'
+    ),
     path('auth/login/', LoginView.as_view(), name='auth-login'),
     path('auth/logout/', LogoutView.as_view(), name='auth-logout'),
     path('admin/results/', ResultsView.as_view(), name='results'),
+    path(
+        'admin/results/data/',
+        ResultsDataView.as_view(),
+        name='results-data'
+    ),
+    path(
+        'admin/results/stream/',
+        ResultsStreamView.as_view(),
+        name='results-stream'
+    ),
     path('admin/login/', AdminLoginView.as_view()),
     path(
         'admin/results/export/',
@@ -49,6 +68,11 @@ urlpatterns = [
         ElectionStateView.as_view(),
         name='admin-election-state'
     ),
+    path(
+        'admin/election/key/',
+        ElectionKeyView.as_view(),
+        name='admin-election-key'
+    ),
     path(
         'admin/autocomplete/candidate-user/',
         CandidateUserAutoCompleteView.as_view(),
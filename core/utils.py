@@ -1,6 +1,117 @@
+import concurrent.futures
+import functools
+import multiprocessing
+import uuid
+
+import django
 from django import db
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models import (
+    CandidateSectionTally, CandidateTally, EncryptedBallot, EncryptedTally,
+    Receipt, ReceiptLog, ReceiptLogNode, Setting, Vote, VoterProfile
+)
+
+
+def get_cache_version(name):
+    """
+    Get the current version of the cached data named `name`. The version is
+    stored in the cache shared by all the processes serving Botos, and should
+    be made part of the keys of the cached data, or be compared against the
+    version of data cached in a process. This way, changing the version
+    invalidates the cached data in every process.
+    """
+    key = 'botos:{}_version'.format(name)
+    version = cache.get(key)
+    if version is None:
+        # The version may have been evicted from the cache, or this may be
+        # the first time the version is needed. Another process may also be
+        # doing this at the same time, so we only add our own version if
+        # there is none yet, and use whatever version got stored.
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def change_cache_version(name):
+    """
+    Change the version of the cached data named `name`, invalidating the
+    data in every process. If called inside a transaction, the version is
+    only changed once the transaction is committed, so that the processes do
+    not reload the data before the changes are visible to them.
+    """
+    key = 'botos:{}_version'.format(name)
+    transaction.on_commit(
+        lambda: cache.set(key, uuid.uuid4().hex, timeout=None)
+    )
+
+
+def create_process_pool(num_processes):
+    """
+    Create a pool of `num_processes` processes for CPU-heavy work, like
+    hashing passwords with `hash_passwords()`. Returns None if `num_processes`
+    is 1 or less, in which case the work should be done in the current
+    process. The pool must be shut down once it is no longer needed.
+
+    The processes of the pool are spawned instead of forked, since forked
+    processes would share the database connections of the current process.
+    """
+    if num_processes <= 1:
+        return None
+
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup
+    )
+
+
+def hash_passwords(passwords, pool=None, hasher='default'):
+    """
+    Hash `passwords` with the password hasher whose algorithm is `hasher`,
+    using the processes of `pool` if there is one. Empty passwords are made
+    unusable. Returns a list of the hashes, in the same order as the
+    passwords.
+    """
+    passwords = [ password or None for password in passwords ]
+    hash_password = functools.partial(make_password, hasher=hasher)
+    if pool is None:
+        return [ hash_password(password) for password in passwords ]
+
+    return list(pool.map(hash_password, passwords, chunksize=16))
+
+
+def clear_election_votes(election):
+    """
+    Clear the votes of `election`, along with its encrypted ballots,
+    receipts, and tallies, and let its voters vote again. Everything is
+    cleared in a single transaction, so a failure cannot leave the votes of
+    the election partially cleared.
+    """
+    with transaction.atomic():
+        Vote.objects.filter(election=election).delete()
+        EncryptedBallot.objects.filter(election=election).delete()
+        Receipt.objects.filter(election=election).delete()
+        ReceiptLog.objects.filter(election=election).delete()
+        ReceiptLogNode.objects.filter(election=election).delete()
+        EncryptedTally.objects.filter(candidate__election=election).delete()
+
+        # The tallies of elections with encrypted ballots are written when
+        # the tallies are finalized, instead of being computed from votes, so
+        # clearing the votes does not reset them.
+        CandidateTally.objects.filter(candidate__election=election).delete()
+        CandidateSectionTally.objects \
+                             .filter(candidate__election=election) \
+                             .delete()
 
-from core.models import Setting
+        VoterProfile.objects \
+                    .filter(batch__election=election) \
+                    .update(has_voted=False)
+
+        change_cache_version('results')
 
 
 class AppSettings(object):
@@ -18,6 +129,18 @@ class AppSettings(object):
     relatively rare, with this utility. As such, no concurrency handling is
     needed.
 
+    Since the settings are read on almost every request (e.g. to get the
+    current template), all the settings are cached in each process. The
+    cached settings are stamped with a version that is stored in the cache
+    shared by all the processes (see the CACHES setting). Setting a value
+    changes the version, which lets every other process know that it must
+    reload the settings. As such, reading a setting only costs a cache hit
+    once the settings have been loaded.
+
+    Settings read inside a transaction are always read from the database,
+    since the transaction may have changed settings that are not yet visible
+    to the other processes, or may still be rolled back.
+
     The utility have the following public methods:
         - set(key, value)
             Create a setting item with the key `key` and a value of `value`.
@@ -34,6 +157,8 @@ class AppSettings(object):
     def __new__(cls):
         if not hasattr(cls, '_instance') or not cls._instance:
             cls._instance = super().__new__(cls)
+            cls._instance._settings = dict()
+            cls._instance._settings_version = None
 
         return cls._instance
 
@@ -69,7 +194,13 @@ class AppSettings(object):
             Setting.objects.create(key=key, value=value)
         else:
             setting.value = value
-            setting.save()          
+            setting.save()
+
+        # Make sure that this process will not use its cached settings, and
+        # let the other processes know that they should not use theirs once
+        # the change is visible to them.
+        self._settings_version = None
+        change_cache_version('app_settings')
 
     def get(self, key, default=None):
         """
@@ -79,6 +210,11 @@ class AppSettings(object):
         to allow for getting back a non-string value should the need arise.
         """
         key = str(key)
+        if not db.connection.in_atomic_block:
+            settings = self._get_cached_settings()
+            if settings is not None:
+                return settings.get(key, default)
+
         try:
             setting = Setting.objects.get(key=key)
             value = setting.value
@@ -110,3 +246,29 @@ class AppSettings(object):
             value = default
 
         return value
+
+    def clear_cache(self):
+        """
+        Make every process reload the settings from the database the next time
+        a setting is read.
+        """
+        self._settings_version = None
+        change_cache_version('app_settings')
+
+    def _get_cached_settings(self):
+        version = get_cache_version('app_settings')
+        if version is None or version != self._settings_version:
+            try:
+                settings = dict(Setting.objects.values_list('key', 'value'))
+            except db.utils.ProgrammingError:
+                # The settings table does not exist yet. See the comments in
+                # get() for more details.
+                return None
+
+            # Note that the settings may have been changed after we got the
+            # version. In that case, the version will have been changed as
+            # well, and we will just reload the settings on the next read.
+            self._settings = settings
+            self._settings_version = version
+
+        return self._settings
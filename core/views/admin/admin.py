@@ -1,11 +1,14 @@
+import hashlib
 from urllib.parse import urljoin
 
+from django import db
 from django.contrib import messages
+from django.core.cache import cache
 from django.db import models
-from django.db.models.functions import (
-    Cast, Concat
+from django.db.models.functions import Cast
+from django.http import (
+    HttpResponse, HttpResponseRedirect
 )
-from django.http import HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.views import View
 from django.views.decorators.csrf import csrf_protect
@@ -19,16 +22,69 @@ from core.decorators import (
 )
 
 from core.models import (
-    User, Batch, Election, CandidateParty, CandidatePosition,
-    UserType, Vote, VoterProfile
+    User, Batch, Election, CandidateParty, CandidatePosition, UserType
 )
+from core.models.user_models import get_normalized_full_name
+from core.utils import (
+    clear_election_votes, get_cache_version
+)
+
+
+# The number of seconds the results of candidate user searches are cached
+# for. Voters added in the meantime will only show up once the results
+# expire.
+CANDIDATE_USER_AUTOCOMPLETE_CACHE_TIMEOUT = 30
 
 
 class CandidateUserAutoCompleteView(autocomplete.Select2QuerySetView):
+    """
+    Autocomplete of the voters that can be made candidates in an election.
+    Voters are searched by the start of their full names, as shown in the
+    admin (`<last name>, <first name>`), regardless of case, which uses the
+    index on the normalized full names of users. Only a page of voters is
+    returned at a time.
+
+    Searches are typed a character at a time, so the results of each search
+    in an election are cached for a short while. The cache is invalidated
+    when the candidates change, and is not used inside transactions, since
+    the transaction may have changed the voters without them being committed
+    yet.
+    """
+    paginate_by = 20
+
+    def get(self, request, *args, **kwargs):
+        election = self.forwarded.get('election', None)
+        if (not self._is_user_admin() or not election
+                or db.connection.in_atomic_block):
+            return super().get(request, *args, **kwargs)
+
+        # The search is hashed, so that any search can be used in the cache
+        # key.
+        search_hash = hashlib.sha256(
+            self.q.upper().encode('utf-8')
+        ).hexdigest()
+        cache_key = 'botos:candidate_users:{}:{}:{}:{}'.format(
+            get_cache_version('ballots'),
+            election,
+            search_hash,
+            request.GET.get('page', 1)
+        )
+        content = cache.get(cache_key)
+        if content is not None:
+            return HttpResponse(content, content_type='application/json')
+
+        response = super().get(request, *args, **kwargs)
+        cache.set(
+            cache_key,
+            response.content,
+            CANDIDATE_USER_AUTOCOMPLETE_CACHE_TIMEOUT
+        )
+
+        return response
+
     def get_queryset(self):
         # Only admins should be able to access this view.
-        if (not self.request.user.is_authenticated
-                or self.request.user.type == UserType.VOTER):
+        if not self._is_user_admin():
             return []
 
         qs = User.objects.filter(candidate__isnull=True)
@@ -41,13 +97,18 @@ class CandidateUserAutoCompleteView(autocomplete.Select2QuerySetView):
                 type=UserType.VOTER
             )
 
+        qs = qs.annotate(name=get_normalized_full_name())
         if self.q:
-            qs = qs.annotate(
-                name=Concat('last_name', models.Value(', '), 'first_name')
-            )
-            qs = qs.filter(name__istartswith=self.q)
+            # The search is normalized the same way the full names are, so
+            # that a case-sensitive match on the normalized full names can
+            # use the index.
+            qs = qs.filter(name__startswith=self.q.upper())
 
-        return qs
+        return qs.order_by('name', 'id')
+
+    def _is_user_admin(self):
+        return (self.request.user.is_authenticated
+                and self.request.user.type != UserType.VOTER)
 
 
 class CandidatePartyAutoCompleteView(autocomplete.Select2QuerySetView):
@@ -179,11 +240,7 @@ class ClearElectionConfirmationView(View):
             )
 
         if 'clear_election' in request.POST:
-            Vote.objects.filter(election=election).delete()
-            voter_profiles = VoterProfile.objects.filter(
-                batch__election=election
-            )
-            voter_profiles.update(has_voted=False)
+            clear_election_votes(election)
 
             messages.success(
                 request,
@@ -1,6 +1,6 @@
 import json
-from phe import paillier
 
+from django.conf import settings
 from django.contrib import messages
 from django.utils.decorators import method_decorator
 from django.shortcuts import redirect
@@ -12,11 +12,14 @@ from django.views.generic.base import TemplateView
 from core.decorators import (
     login_required, user_passes_test
 )
+from core.encryption import check_election_key_can_be_generated
 from core.forms.admin import (
-    ElectionSettingsCurrentTemplateForm, ElectionSettingsElectionStateForm
+    ElectionSettingsCurrentTemplateForm, ElectionSettingsElectionKeyForm,
+    ElectionSettingsElectionStateForm
 )
+from core.metrics import get_request_metrics_summary
 from core.models import (
-    Vote, UserType
+    ElectionKeyJob, ExportJobStatus, Vote, UserType
 )
 from core.utils import AppSettings
 
@@ -64,6 +67,18 @@ class ElectionSettingsIndexView(TemplateView):
                        else ''
         )
 
+        election_key_form = ElectionSettingsElectionKeyForm()
+        context['election_key_form'] = election_key_form
+
+        # Only the most recent key jobs are shown.
+        election_key_jobs = ElectionKeyJob.objects \
+                                          .select_related('election') \
+                                          .order_by('-date_created')
+        context['election_key_jobs'] = election_key_jobs[:10]
+
+        if settings.REQUEST_METRICS:
+            context['request_metrics_summary'] = get_request_metrics_summary()
+
         return context
 
 
@@ -133,7 +148,8 @@ class CurrentTemplateView(View):
 class ElectionStateView(View):
     """
     This view changes the state of the election from closed to open and vice
-    versa. This will only accept POST requests. GET requests from superusers
+    versa. The elections cannot be opened while election keys are being
+    generated. This will only accept POST requests. GET requests from superusers
     will result in a redirection to `/admin/election`, while non-superusers
     and anonymoous users to `/`.
 
@@ -146,6 +162,25 @@ class ElectionStateView(View):
         # Let's validate the data we got first.
         form = ElectionSettingsElectionStateForm(request.POST)
         if form.is_valid():
+            # Elections whose keys are being generated must not get votes
+            # before the keys are stored, since the votes would be left
+            # unencrypted.
+            are_keys_being_generated = ElectionKeyJob.objects \
+                .filter(
+                    status__in=[
+                        ExportJobStatus.PENDING,
+                        ExportJobStatus.RUNNING
+                    ]
+                ) \
+                .exists()
+            if request.POST['state'] == 'open' and are_keys_being_generated:
+                messages.error(
+                    request,
+                    'The elections cannot be opened while election keys are '
+                    'being generated.'
+                )
+                return redirect('/admin/election')
+
             # Okay, good data. Now, process the data, then a success message.
             AppSettings().set('election_state', request.POST['state'])
             messages.success(request, 'Election state changed successfully.')
@@ -158,3 +193,61 @@ class ElectionStateView(View):
             )
 
         return redirect('/admin/election')
+
+
+@method_decorator(csrf_protect, name='dispatch')
+@method_decorator(
+    login_required(
+        login_url='/',
+        next='/admin/election'
+    ),
+    name='dispatch',
+)
+@method_decorator(
+    user_passes_test(
+        lambda u: u.type == UserType.ADMIN,
+        login_url='/',
+        next='',
+        redirect_field_name=None
+    ),
+    name='dispatch',
+)
+class ElectionKeyView(View):
+    """
+    This view requests the key pair of an election to be generated, which
+    makes the ballots of the election get encrypted. Generating a key pair
+    can take a while, so the key pair is generated in the background by the
+    job worker (see the `runexportjobs` management command). Key pairs can
+    only be generated while the elections are closed, and for elections that
+    have no votes yet. This will only accept POST requests. GET requests from
+    superusers will result in a redirection to `/admin/election`, while
+    non-superusers and anonymous users to `/`.
+
+    View URL: `/admin/election/key`
+    """
+    def get(self, request):
+        return redirect('/admin/election')
+
+    def post(self, request):
+        form = ElectionSettingsElectionKeyForm(request.POST)
+        if not form.is_valid():
+            messages.error(
+                request,
+                'You attempted to generate a key for an invalid election.'
+            )
+            return redirect('/admin/election')
+
+        election = form.cleaned_data['election']
+        try:
+            check_election_key_can_be_generated(election)
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            ElectionKeyJob.objects.create(election=election)
+            messages.success(
+                request,
+                'The key of \'{}\' is being generated. Refresh this page to '
+                'check on it.'.format(election.name)
+            )
+
+        return redirect('/admin/election')
@@ -0,0 +1,99 @@
+from django.http import JsonResponse
+from django.views import View
+
+from core.bulletin_board import (
+    get_inclusion_proof, get_root
+)
+from core.models import (
+    Election, Receipt, ReceiptLog
+)
+
+
+class BulletinBoardView(View):
+    """
+    The public bulletin board of vote receipts. This view can be accessed by
+    anyone, and returns JSON.
+
+    Passing an election ID in the `election` parameter returns the current
+    root of the receipt log of the election:
+        {
+            'election': <election ID>,
+            'size': <number of receipts in the log>,
+            'root': '<root hash>'
+        }
+
+    Passing a receipt in the `receipt` parameter also returns the position
+    of the receipt in the log of its election, and the inclusion proof of the
+    receipt for the current root:
+        {
+            'election': <election ID>,
+            'size': <number of receipts in the log>,
+            'root': '<root hash>',
+            'receipt': '<receipt>',
+            'index': <position of the receipt in the log>,
+            'proof': [ '<hash>', ... ]
+        }
+
+    The hashes are computed the same way as in Certificate Transparency logs
+    (see `core.bulletin_board`), so that voters can check the proofs
+    themselves. Only O(log n) hashes are sent for a log with n receipts.
+
+    View URL: `/bulletin-board`
+    """
+    def get(self, request):
+        receipt = request.GET.get('receipt', None)
+        if receipt:
+            return self._get_receipt_response(receipt)
+
+        election_id = request.GET.get('election', None)
+        try:
+            election_id = int(election_id)
+        except (TypeError, ValueError):
+            return JsonResponse(
+                { 'error': 'You must specify an election ID or a receipt.' },
+                status=400
+            )
+
+        if not Election.objects.filter(id=election_id).exists():
+            return JsonResponse(
+                { 'error': 'The election does not exist.' },
+                status=404
+            )
+
+        receipt_log = ReceiptLog.objects \
+                                .filter(election__id=election_id) \
+                                .first()
+        return self._create_response({
+            'election': election_id,
+            'size': receipt_log.size if receipt_log is not None else 0,
+            'root': get_root(receipt_log)
+        })
+
+    def _get_receipt_response(self, receipt):
+        try:
+            receipt = Receipt.objects.get(receipt=receipt.lower())
+        except Receipt.DoesNotExist:
+            return JsonResponse(
+                { 'error': 'The receipt is not in the bulletin board.' },
+                status=404
+            )
+
+        # The log is read after the receipt, so the log already has the
+        # receipt in it.
+        receipt_log = ReceiptLog.objects.get(election__id=receipt.election_id)
+        return self._create_response({
+            'election': receipt.election_id,
+            'size': receipt_log.size,
+            'root': get_root(receipt_log),
+            'receipt': receipt.receipt,
+            'index': receipt.index,
+            'proof': get_inclusion_proof(receipt, receipt_log)
+        })
+
+    def _create_response(self, data):
+        response = JsonResponse(data)
+
+        # The root changes with every cast ballot.
+        response['Cache-Control'] = 'no-cache'
+
+        return response
@@ -1,15 +1,21 @@
 from collections import OrderedDict
 
+from django import db
 from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Q
 from django.http import HttpResponseRedirect
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views.generic.base import TemplateView
 
 from core.models import (
-    Candidate, Vote, UserType
+    Candidate, CandidatePosition, Vote, UserType, VoterProfile
+)
+from core.utils import (
+    AppSettings, get_cache_version
 )
-from core.utils import AppSettings
 
 
 class IndexView(TemplateView):
@@ -32,7 +38,8 @@ class IndexView(TemplateView):
     Voted Sub-View
         This subview will only appear to logged-in users that have voted
         already. If they have not yet voted, they will be shown the voting
-        subview. Anonymous users will be shown the login subview.
+        subview. Anonymous users will be shown the login subview. The receipt
+        of the voter's ballot is shown until the voter logs out.
     """
     _template_name = AppSettings().get('template', default='default')
     template_name = '{}/index.html'.format(_template_name)
@@ -52,48 +59,43 @@ class IndexView(TemplateView):
         context = super().get_context_data(**kwargs)
 
         if user.is_authenticated:
+            voter_profile = VoterProfile.objects \
+                                        .select_related('batch') \
+                                        .get(user__id=user.id)
+
             # Show either the Voting or Voted sub-view.
-            has_user_voted = user.voter_profile.has_voted
+            has_user_voted = voter_profile.has_voted
             if has_user_voted:
                 context['subview'] = 'voted'
-                # Remember to show the voter's vote ID in later revisions. This
-                # is for the public bulletin board of vote IDs.
+                context['receipt'] = self.request.session.get(
+                    'vote_receipt',
+                    None
+                )
             else:
                 context['subview'] = 'voting'
 
-                election = user.voter_profile.batch.election
-                batch = user.voter_profile.batch
+                batch = voter_profile.batch
 
-                # Note: The desired ordering of candidates has already been
-                #       defined in the ordering option Candidate's Meta class.
-                #       So, no need to specify the ordering here.
-                candidates = Candidate.objects.filter(
-                    election__id=election.id
+                # The cached ballots are not used inside transactions, since
+                # the transaction may have changed the ballot without it being
+                # committed yet.
+                if db.connection.in_atomic_block:
+                    ballot_version = None
+                else:
+                    ballot_version = get_cache_version('ballots')
+
+                candidates = self._get_candidates_by_position(
+                    batch.election_id,
+                    batch.id,
+                    ballot_version
+                )
+                context['candidates'] = candidates
+                context['ballot'] = self._render_ballot(
+                    candidates,
+                    batch.election_id,
+                    batch.id,
+                    ballot_version
                 )
-                # TODO: Refactor this to use queries instead of looping through
-                #       the candidate list.
-                candidates_by_position = OrderedDict()
-                for candidate in candidates:
-                    position = candidate.position
-                    if (position.target_batches.exists()
-                            and batch not in position.target_batches.all()):
-                        # The voter cannot vote for candidates running for this
-                        # position.
-                        continue
-
-                    position_name = candidate.position.position_name
-                    if position_name in candidates_by_position:
-                        item = candidates_by_position[position_name]
-                        item["candidates"].append(candidate)
-                    else:
-                        candidates_by_position[position_name] = {
-                            "candidates": [ candidate ],
-                            "max_num_selected_candidates": (
-                                position.max_num_selected_candidates
-                            )
-                        }
-
-                context['candidates'] = candidates_by_position
         else:
             next_url = self.request.GET.get('next', None)
 
@@ -101,3 +103,95 @@ class IndexView(TemplateView):
             context['subview'] = 'login'
 
         return context
+
+    def _get_candidates_by_position(self, election_id, batch_id,
+                                    ballot_version):
+        """
+        Get the candidates that voters in the batch with an ID of `batch_id`
+        can vote for, grouped by position.
+
+        The ballot is the same for every voter in a batch. So, the ballot of
+        each batch is cached, and only gets rebuilt once the candidates,
+        parties, positions, or batches change (see `core/signals.py`). The
+        cache is not used if `ballot_version` is None.
+        """
+        use_cache = ballot_version is not None
+        if use_cache:
+            cache_key = 'botos:ballot:{}:{}:{}'.format(
+                ballot_version,
+                election_id,
+                batch_id
+            )
+            candidates_by_position = cache.get(cache_key)
+            if candidates_by_position is not None:
+                return candidates_by_position
+
+        # Only get the candidates whose positions either have no target
+        # batches, or have the voter's batch as one of their target batches.
+        #
+        # Note: The desired ordering of candidates has already been
+        #       defined in the ordering option Candidate's Meta class.
+        #       So, no need to specify the ordering here.
+        positions = CandidatePosition.objects.filter(
+            Q(target_batches__isnull=True) | Q(target_batches__id=batch_id),
+            election__id=election_id
+        )
+        candidates = Candidate.objects \
+                              .filter(
+                                  election__id=election_id,
+                                  position__in=positions.values('id')
+                              ) \
+                              .select_related('user', 'party', 'position')
+
+        candidates_by_position = OrderedDict()
+        for candidate in candidates:
+            position = candidate.position
+            position_name = position.position_name
+            if position_name in candidates_by_position:
+                item = candidates_by_position[position_name]
+                item["candidates"].append(candidate)
+            else:
+                candidates_by_position[position_name] = {
+                    "candidates": [ candidate ],
+                    "max_num_selected_candidates": (
+                        position.max_num_selected_candidates
+                    )
+                }
+
+        if use_cache:
+            cache.set(cache_key, candidates_by_position)
+
+        return candidates_by_position
+
+    def _render_ballot(self, candidates, election_id, batch_id,
+                       ballot_version):
+        """
+        Render the candidates of the ballot.
+
+        The rendered ballot is cached the same way the ballot itself is, so
+        voters in the same batch do not have to render it again. Only the
+        candidates are cached. The CSRF token, messages, and the rest of the
+        user-specific parts of the voting subview are rendered separately on
+        every request.
+        """
+        use_cache = ballot_version is not None
+        if use_cache:
+            cache_key = 'botos:ballot_html:{}:{}:{}:{}'.format(
+                self._template_name,
+                ballot_version,
+                election_id,
+                batch_id
+            )
+            ballot = cache.get(cache_key)
+            if ballot is not None:
+                return ballot
+
+        ballot = render_to_string(
+            '{}/index_subviews/ballot.html'.format(self._template_name),
+            { 'candidates': candidates }
+        )
+
+        if use_cache:
+            cache.set(cache_key, ballot)
+
+        return ballot
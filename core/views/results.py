@@ -1,23 +1,80 @@
+import asyncio
 from collections import (
     namedtuple, OrderedDict
 )
+import contextvars
 import datetime
+import hashlib
+import json
 import random
+import secrets
 
+from asgiref.sync import sync_to_async
+
+from django import db
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models.functions import Coalesce
+from django.http import (
+    JsonResponse, StreamingHttpResponse
+)
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic.base import TemplateView
 
 from core.decorators import (
     login_required
 )
 from core.models import (
-    User, Candidate, Vote, UserType, Election
+    User, Candidate, UserType, Election
+)
+from core.utils import (
+    AppSettings, get_cache_version
+)
+
+
+CandidateResult = namedtuple(
+    'CandidateResult',
+    'id name party_name avatar_url total_votes'
+)
+
+# The names given to the candidates and parties while the elections are open.
+RANDOM_CANDIDATE_NAMES = (
+    'Sven',
+    'Joergen #1',
+    'Joergen #2',
+    'Bernie',
+    'IKEA BIRD #1',
+    'IKEA BIRD #2',
+    'Pee pee poo poo',
+    'Water Cow',
+    'Mushroom Cow',
+    'Water Sheep',
+    'Virgin Turtle',
+    'Big Brain',
+    'Dinnerbone',
+    'Pig Army General',
+    'Pee Pee 2 Poo',
+    'Brad 1',
+    'Brad 2',
+    'Aloona :3',
+    'Boris',
+    'Stephano',
+    'Rolph',
+    'Black Joergen'
+)
+RANDOM_PARTY_NAMES = (
+    'Bro Army',
+    '9 Year Old Army',
+    'Gamers',
+    'Church of Water Sheep',
+    'Tower of Llama'
 )
-from core.utils import AppSettings
 
 
 @method_decorator(
@@ -41,13 +98,14 @@ class ResultsView(TemplateView):
         }
 
     <candidate> is a named tuple with the following properties:
+        - id
         - name
         - party name
         - avatar URL
         - total votes
 
     The candidates and parties will be given a random name if the elections are
-    open.
+    open, and the candidate IDs will be None.
 
     View URL: `/results
     """
@@ -88,59 +146,97 @@ class ResultsView(TemplateView):
         return context
 
     def _get_vote_results(self, election_id=None):
+        results = self._get_unmasked_vote_results(election_id)
+
         election_state = AppSettings().get('election_state', 'closed')
-        CandidateResult = namedtuple(
-            'CandidateResult',
-            'name party_name avatar_url total_votes'
-        )
+        if election_state == 'open':
+            results = self._mask_vote_results(results)
+
+        return results
+
+    def _get_unmasked_vote_results(self, election_id=None):
+        """
+        Get the results, with the actual names of the candidates and parties.
+
+        The results are the same for every admin, whether the elections are
+        open or not. So, they are cached, and only get retrieved again once
+        the results change. The cached results are not used inside
+        transactions, since the transaction may have changed the results
+        without it being committed yet.
+        """
+        use_cache = not db.connection.in_atomic_block
+        if use_cache:
+            cache_key = 'botos:results:{}:{}'.format(
+                get_cache_version('results'),
+                election_id or 'all'
+            )
+            results = cache.get(cache_key)
+            if results is not None:
+                return results
 
         results = OrderedDict()
 
+        # All the results are obtained in a single query. The vote totals are
+        # read from the candidate tallies, instead of counting the votes of
+        # each candidate, and the related objects that we need are joined in.
+        candidates = Candidate.objects \
+                              .select_related('user', 'party', 'position') \
+                              .annotate(
+                                  total_votes=Coalesce('tally__total_votes', 0)
+                              )
         if election_id:
-            candidates = Candidate.objects.filter(election__id=election_id)
-        else:
-            candidates = Candidate.objects.all()
+            candidates = candidates.filter(election__id=election_id)
 
         for candidate in candidates:
-            total_num_votes = Vote.objects.filter(candidate=candidate).count()
-
             position = str(candidate.position.position_name)
-            if election_state == 'open':
-                candidate_name = self._get_random_candidate_name()
-                party_name = self._get_random_party_name()
-                avatar_url = '{}{}'.format(
-                    settings.MEDIA_URL,  # Assumes the URL is prefixed and
-                    # suffixed with a forward slash.
-                    'avatars/default.png'
-                )
-            else:
-                candidate_name = '{}, {}'.format(
-                    candidate.user.last_name,
-                    candidate.user.first_name
-                )
-                party_name = candidate.party.party_name
-                avatar_url = candidate.avatar.url
-            try:
-                results[position]
-            except KeyError:
-                results[position] = list()
-
-            results[position].append(
+            results.setdefault(position, list()).append(
                 CandidateResult(
-                    candidate_name,
-                    party_name,
-                    avatar_url,
-                    total_num_votes
+                    candidate.id,
+                    '{}, {}'.format(
+                        candidate.user.last_name,
+                        candidate.user.first_name
+                    ),
+                    candidate.party.party_name,
+                    candidate.avatar.url,
+                    candidate.total_votes
                 )
             )
 
-            # To ensure that it is hard to figure out who the actual candidate
-            # is.
-            if election_state == 'open':
-                random.shuffle(results[position])
+        if use_cache:
+            cache.set(cache_key, results)
 
         return results
 
+    def _mask_vote_results(self, results, mask_id=lambda candidate_id: None):
+        """
+        Give the candidates and parties in `results` random names, so that it
+        is hard to figure out who the actual candidates are while the
+        elections are open. The IDs of the candidates are replaced with the
+        value returned by `mask_id`.
+        """
+        avatar_url = '{}{}'.format(
+            settings.MEDIA_URL,  # Assumes the URL is prefixed and suffixed
+                                 # with a forward slash.
+            'avatars/default.png'
+        )
+
+        masked_results = OrderedDict()
+        for position, candidates in results.items():
+            masked_candidates = [
+                CandidateResult(
+                    mask_id(candidate.id),
+                    random.choice(RANDOM_CANDIDATE_NAMES),
+                    random.choice(RANDOM_PARTY_NAMES),
+                    avatar_url,
+                    candidate.total_votes
+                ) for candidate in candidates
+            ]
+            random.shuffle(masked_candidates)
+
+            masked_results[position] = masked_candidates
+
+        return masked_results
+
     def _get_election_tab_links(self):
         ElectionTabLink = namedtuple(
             'ElectionTabLink',
@@ -162,39 +258,380 @@ class ResultsView(TemplateView):
 
         return tab_links
 
-    def _get_random_candidate_name(self):
-        random_names = [
-            'Sven',
-            'Joergen #1',
-            'Joergen #2',
-            'Bernie',
-            'IKEA BIRD #1',
-            'IKEA BIRD #2',
-            'Pee pee poo poo',
-            'Water Cow',
-            'Mushroom Cow',
-            'Water Sheep',
-            'Virgin Turtle',
-            'Big Brain',
-            'Dinnerbone',
-            'Pig Army General',
-            'Pee Pee 2 Poo',
-            'Brad 1',
-            'Brad 2',
-            'Aloona :3',
-            'Boris',
-            'Stephano',
-            'Rolph',
-            'Black Joergen'
-        ]
-        return random_names[random.randint(0, len(random_names) - 1)]
-
-    def _get_random_party_name(self):
-        random_names = [
-            'Bro Army',
-            '9 Year Old Army',
-            'Gamers',
-            'Church of Water Sheep',
-            'Tower of Llama'
-        ]
-        return random_names[random.randint(0, len(random_names) - 1)]
+
+def _get_results_etag(request, *args, **kwargs):
+    # The results version changes whenever the results change. The results
+    # shown also depend on whether the elections are open or not.
+    return '{}-{}'.format(
+        get_cache_version('results'),
+        AppSettings().get('election_state', 'closed')
+    )
+
+
+def _get_results_last_modified(request, *args, **kwargs):
+    # We do not keep track of when the results last changed. So, we use the
+    # time the current version of the results was first requested instead.
+    key = 'botos:results_last_modified:{}'.format(_get_results_etag(request))
+    cache.add(key, timezone.now(), timeout=None)
+
+    return cache.get(key)
+
+
+# The results feeds of this process, by election ID.
+_results_feeds = dict()
+
+
+class _ResultsFeed(object):
+    """
+    A results feed polls the results of an election for every results stream
+    in the process that shows them, and passes the results on to the streams.
+    This way, the results are retrieved once whenever they change, no matter
+    how many streams are open, and only a single task holds a database
+    connection, and only while it is polling.
+
+    The feed stops polling once its last stream closes.
+    """
+    def __init__(self, election_id, poll_interval, get_results):
+        self.election_id = election_id
+        self.poll_interval = poll_interval
+        self._get_results = get_results
+
+        self._queues = set()
+        self._latest_results = None
+
+        # The task must not keep the context of the request that started it,
+        # since it outlives the request.
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(
+            self._poll(),
+            context=contextvars.Context()
+        )
+
+    @classmethod
+    def subscribe(cls, election_id, poll_interval, get_results):
+        """
+        Get the feed of the results of the election with the specified ID,
+        starting it if needed, and a queue that receives `(election state,
+        unmasked results)` whenever the results change.
+        """
+        feed = _results_feeds.get(election_id)
+        if feed is None or feed._loop is not asyncio.get_running_loop():
+            feed = cls(election_id, poll_interval, get_results)
+            _results_feeds[election_id] = feed
+
+        queue = asyncio.Queue(maxsize=1)
+        if feed._latest_results is not None:
+            queue.put_nowait(feed._latest_results)
+
+        feed._queues.add(queue)
+
+        return feed, queue
+
+    def unsubscribe(self, queue):
+        self._queues.discard(queue)
+        if not self._queues:
+            self._stop()
+
+    def _stop(self):
+        self._remove()
+        self._task.cancel()
+
+    def _remove(self):
+        if _results_feeds.get(self.election_id) is self:
+            del _results_feeds[self.election_id]
+
+    def _publish(self, results):
+        for queue in self._queues:
+            # Streams only need the latest results.
+            if queue.full():
+                queue.get_nowait()
+
+            queue.put_nowait(results)
+
+    async def _poll(self):
+        results_etag = None
+        while True:
+            try:
+                results_etag, results = await sync_to_async(
+                    self._get_changed_results,
+                    thread_sensitive=False
+                )(results_etag)
+            except Exception as e:
+                # Let the streams end, so that clients reconnect and start a
+                # new feed.
+                self._remove()
+                self._publish(e)
+                return
+
+            if results is not None:
+                self._latest_results = results
+                self._publish(results)
+
+            await asyncio.sleep(self.poll_interval)
+
+    def _get_changed_results(self, results_etag):
+        try:
+            # The results are only retrieved when the results version
+            # changes, which only costs a cache hit.
+            current_results_etag = _get_results_etag(None)
+            if current_results_etag == results_etag:
+                return results_etag, None
+
+            return current_results_etag, (
+                AppSettings().get('election_state', 'closed'),
+                self._get_results(self.election_id)
+            )
+        finally:
+            # Release the connection right away, instead of keeping it open
+            # in the thread until the streams close.
+            db.connection.close()
+
+
+@method_decorator(
+    condition(
+        etag_func=_get_results_etag,
+        last_modified_func=_get_results_last_modified
+    ),
+    name='get'
+)
+class ResultsDataView(ResultsView):
+    """
+    The results data view returns the same results as the results view, but
+    as JSON, so that dashboards can poll the results.
+
+    The format of the results is this way:
+        {
+            'election_state': '<election state>',
+            'results': {
+                '<position>': [ <candidate>, ... ],
+            }
+        }
+
+    <candidate> is an object with the following properties:
+        - name
+        - party_name
+        - avatar_url
+        - total_votes
+
+    Responses have an ETag and a Last-Modified header. Conditional requests
+    get a 304 Not Modified response if the results have not changed, without
+    the results being retrieved.
+
+    View URL: `/admin/results/data`
+    """
+    def get(self, request, *args, **kwargs):
+        election_id = request.GET.get('election', None)
+        if election_id:
+            try:
+                election_id = int(election_id)
+            except ValueError:
+                return JsonResponse(
+                    { 'error': 'You specified a non-integer election ID.' },
+                    status=400
+                )
+
+        results = OrderedDict()
+        vote_results = self._get_vote_results(election_id)
+        for position, candidates in vote_results.items():
+            results[position] = [
+                {
+                    'name': candidate.name,
+                    'party_name': candidate.party_name,
+                    'avatar_url': candidate.avatar_url,
+                    'total_votes': candidate.total_votes
+                } for candidate in candidates
+            ]
+
+        response = JsonResponse({
+            'election_state': AppSettings().get('election_state', 'closed'),
+            'results': results
+        })
+
+        # Make clients revalidate the results every time they need them.
+        response['Cache-Control'] = 'private, no-cache'
+
+        return response
+
+
+class ResultsStreamView(ResultsView):
+    """
+    The results stream view pushes the results to the client as server-sent
+    events, so that projection screens get the new vote counts as the votes
+    arrive, without re-fetching the results.
+
+    The following events are sent:
+        - results
+            Sent when the client connects, and whenever the candidates or the
+            election state change. Its data has the same format as the data
+            returned by the results data view, except that every candidate
+            also has an `id`.
+        - tally
+            Sent when the number of votes of candidates change. Its data is a
+            list of `{ 'id': <candidate id>, 'total_votes': <count> }`.
+
+    The candidates and parties are given random names if the elections are
+    open, and the candidate IDs are replaced with IDs that are only valid for
+    the current connection.
+
+    The stream must be served through the ASGI application (see
+    `botos/asgi.py`), so that idle connections do not pin worker processes.
+    When served through WSGI, only the current results are sent, and the
+    client reconnects after a while to get new results.
+
+    The streams of a process do not poll the results themselves. A single
+    feed per election polls them for all the streams (see `_ResultsFeed`).
+
+    View URL: `/admin/results/stream`
+    """
+    # The number of seconds between checks for changes in the results.
+    poll_interval = 1.0
+
+    # The number of seconds between comments sent to keep idle connections
+    # from being closed by proxies.
+    keep_alive_interval = 15.0
+
+    # The number of milliseconds clients wait before reconnecting.
+    reconnection_delay = 3000
+
+    def get(self, request, *args, **kwargs):
+        election_id = request.GET.get('election', None)
+        if election_id:
+            try:
+                election_id = int(election_id)
+            except ValueError:
+                return JsonResponse(
+                    { 'error': 'You specified a non-integer election ID.' },
+                    status=400
+                )
+
+        key_secret = secrets.token_hex(16)
+        if isinstance(request, ASGIRequest):
+            events = self._stream_results(election_id, key_secret)
+        else:
+            election_state, results = self._get_stream_results(
+                election_id,
+                key_secret
+            )
+            events = [
+                self._format_retry(),
+                self._format_event(
+                    'results',
+                    {
+                        'election_state': election_state,
+                        'results': results
+                    }
+                )
+            ]
+
+        response = StreamingHttpResponse(
+            events,
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+
+        # Prevent proxies like nginx from buffering the events.
+        response['X-Accel-Buffering'] = 'no'
+
+        return response
+
+    async def _stream_results(self, election_id, key_secret):
+        loop = asyncio.get_running_loop()
+
+        yield self._format_retry()
+        last_event_time = loop.time()
+
+        # The results are polled by a feed that is shared with the other
+        # streams in this process, so that the results are not retrieved
+        # separately for every client.
+        feed, queue = _ResultsFeed.subscribe(
+            election_id,
+            self.poll_interval,
+            self._get_unmasked_vote_results
+        )
+        try:
+            election_state = None
+            total_votes = dict()
+            while True:
+                try:
+                    feed_results = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=max(
+                            self.keep_alive_interval
+                                - (loop.time() - last_event_time),
+                            0
+                        )
+                    )
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    last_event_time = loop.time()
+                    continue
+
+                if isinstance(feed_results, Exception):
+                    raise feed_results
+
+                current_election_state, results = self._prepare_results(
+                    *feed_results,
+                    key_secret
+                )
+                current_total_votes = {
+                    candidate['id']: candidate['total_votes']
+                    for candidates in results.values()
+                    for candidate in candidates
+                }
+
+                if (current_election_state != election_state
+                        or current_total_votes.keys() != total_votes.keys()):
+                    yield self._format_event(
+                        'results',
+                        {
+                            'election_state': current_election_state,
+                            'results': results
+                        }
+                    )
+                    last_event_time = loop.time()
+                else:
+                    deltas = [
+                        { 'id': candidate_id, 'total_votes': num_votes }
+                        for candidate_id, num_votes
+                        in current_total_votes.items()
+                        if total_votes[candidate_id] != num_votes
+                    ]
+                    if deltas:
+                        yield self._format_event('tally', deltas)
+                        last_event_time = loop.time()
+
+                election_state = current_election_state
+                total_votes = current_total_votes
+        finally:
+            feed.unsubscribe(queue)
+
+    def _get_stream_results(self, election_id, key_secret):
+        return self._prepare_results(
+            AppSettings().get('election_state', 'closed'),
+            self._get_unmasked_vote_results(election_id),
+            key_secret
+        )
+
+    def _prepare_results(self, election_state, results, key_secret):
+        if election_state == 'open':
+            # The candidate IDs would give away who the candidates are.
+            results = self._mask_vote_results(
+                results,
+                mask_id=lambda candidate_id: hashlib.sha256(
+                    '{}:{}'.format(key_secret, candidate_id).encode('utf-8')
+                ).hexdigest()[:16]
+            )
+
+        stream_results = OrderedDict()
+        for position, candidates in results.items():
+            stream_results[position] = [
+                candidate._asdict() for candidate in candidates
+            ]
+
+        return election_state, stream_results
+
+    def _format_retry(self):
+        return 'retry: {}\n\n'.format(self.reconnection_delay)
+
+    def _format_event(self, event, data):
+        return 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data))
@@ -1,17 +1,8 @@
-from openpyxl import Workbook
-from openpyxl.styles import (
-    Alignment, Font
-)
-from openpyxl.utils import get_column_letter
-from openpyxl.writer.excel import save_virtual_workbook
-
 from django.contrib import messages
-from django.db.models import (
-    Count, Q
-)
-from django.http import HttpResponse
+from django.http import FileResponse
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views import View
 
@@ -19,9 +10,9 @@ from core.decorators import (
     login_required, user_passes_test
 )
 from core.models import (
-    Batch, Candidate, CandidateParty, CandidatePosition,
-    Election, Section, UserType, Vote, VoterProfile
+    Election, ExportFormat, ExportJob, ExportJobStatus, UserType
 )
+from core.utils import get_cache_version
 
 
 @method_decorator(
@@ -42,14 +33,24 @@ from core.models import (
 )
 class ResultsExporterView(View):
     """
-    View that exports results. Currently, it only exports to an XLSX file.
+    View that exports results to an XLSX file or a CSV file.
 
     This subview may only process requests from admin users. Other users will
     be redirected to '/'.
 
     The view may accept a URL parameter, election, to return the results of a
     specific election. Invalid values for the election parameter will result in
-    the view returning an error message.
+    the view returning an error message. The view may also accept a URL
+    parameter, format, which must either be 'xlsx' (the default) or 'csv'.
+
+    The results are exported in the background by the export job worker (see
+    the `runexportjobs` management command), so that the export does not tie
+    up the process serving the request. If the results have not been exported
+    yet since they last changed, an export job is created. In the meantime,
+    the latest exported file is served, with the time it was exported in its
+    name, or, if the results have never been exported, the admin is asked to
+    download the results again in a moment. Otherwise, the exported file is
+    served right away.
 
     View URL: 'admin/results/export'
     """
@@ -76,249 +77,95 @@ class ResultsExporterView(View):
                     )
                     return redirect(request.META.get('HTTP_REFERER', '/'))
                 else:
-                    filename = '{} Results.xlsx'.format(election_name)
+                    filename = '{} Results'.format(election_name)
         else:
-            filename = 'Election Results.xlsx'
-
-        wb = self._generate_xlsx_file(election_id)
-        content_type = (
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        content_disposition = 'attachment; filename="{}"'.format(filename)
-        response = HttpResponse(
-            content=save_virtual_workbook(wb),
-            content_type=content_type
-        )
-        response['Content-Disposition'] = content_disposition
-
-        return response
-
-    def _generate_xlsx_file(self, election_id):
-        elections = Election.objects.all()
-        if election_id:
-            elections = [ elections.get(id=election_id) ]
-
-        num_worksheets = len(elections)
-        wb = Workbook()
-
-        # Create the necessary worksheets.
-        for i in range(num_worksheets - 1):
-            # We subtract by one since we have at least one worksheet in a
-            # workbook upon creation.
-            wb.create_sheet("")
-
-        for sheet_idx, election in enumerate(elections):
-            ws = wb.worksheets[sheet_idx]
-
-            ws.title = election.name
-
-            # Set up the sheet header title.
-            num_columns = VoterProfile.objects                          \
-                                      .filter(batch__election=election) \
-                                      .order_by()                       \
-                                      .distinct('section')              \
-                                      .count()
-
-            # +2 since we have a column for the candidates and another column
-            # for the total votes.
-            num_columns += 2
-
-            ws.merge_cells(
-                start_row=1,
-                start_column=1,
-                end_row=1,
-                end_column=num_columns
-            )
-            ws.cell(1, 1).value = '{} Results'.format(election.name)
-            ws.cell(1, 1).alignment = Alignment(
-                horizontal='center',
-                vertical='center'
-            )
-
-            ws.merge_cells(
-                start_row=2,
-                start_column=2,
-                end_row=2,
-                end_column=num_columns
-            )
-            ws.cell(2, 2).value = 'Number of Votes'
-            ws.cell(2, 2).alignment = Alignment(horizontal='center')
-
-            # Set up the candidate block and total votes block.
-            ws.merge_cells('A2:A4')
-            ws.cell(2, 1).value = 'Candidates'
-            ws.cell(2, 1).alignment = Alignment(
-                horizontal='center',
-                vertical='center'
+            election_id = None
+            filename = 'Election Results'
+
+        file_format = request.GET.get('format', ExportFormat.XLSX)
+        if file_format not in [ ExportFormat.XLSX, ExportFormat.CSV ]:
+            messages.error(
+                request,
+                'You specified an unsupported export format.'
             )
+            return redirect(request.META.get('HTTP_REFERER', '/'))
 
-            ws.merge_cells(
-                start_row=3, 
-                start_column=num_columns,
-                end_row=4,
-                end_column=num_columns
-            )
-            ws.cell(3, num_columns).value = 'Total Votes'
-            ws.cell(3, num_columns).alignment = Alignment(
-                horizontal='center',
-                vertical='center'
-            )
-            ws.column_dimensions[get_column_letter(num_columns)].width = 14
-
-            # Set up batches and sections.
-            batches = Batch.objects.filter(
-                election=election,
-                voter_profiles__isnull=False
-            ).distinct()
-
-            curr_batch_col = 2
-            for batch in batches:
-                sections = Section.objects                             \
-                                  .filter(voter_profiles__batch=batch) \
-                                  .distinct()
-
-                if len(sections) > 0:
-                    ws.merge_cells(
-                        start_row=3,
-                        start_column=curr_batch_col,
-                        end_row=3,
-                        # We need a -1 here, because, otherwise, we'll invade
-                        # one cell of an adjacent batch cell.
-                        end_column=curr_batch_col + (len(sections) - 1)
-                    )
-
-                ws.cell(3, curr_batch_col).value = str(batch)
-                ws.cell(3, curr_batch_col).alignment = Alignment(
-                    horizontal='center'
-                )
-
-                for section_idx, section in enumerate(sections):
-                    section_col = curr_batch_col + section_idx
-                    ws.cell(4, section_col).value = str(section)
-                    ws.cell(4, section_col).alignment = Alignment(
-                        horizontal='center'
-                    )
-                    col_letter = get_column_letter(section_col)
-                    col_width = len(str(section)) + 4
-                    ws.column_dimensions[col_letter].width = col_width
-
-                curr_batch_col += len(sections)
-
-            # Set up the candidate column.
-            len_longest_cand_name = 0
-            positions = CandidatePosition.objects.filter(election=election)
-            position_start_row = 5
-            for position_idx, position in enumerate(positions):
-                ws.cell(position_start_row, 1).value = str(position)
-                ws.cell(position_start_row, 1).font = Font(bold=True)
-
-                parties = CandidateParty.objects.filter(election=election)
-
-                # Distance of the current empty cell to the current position
-                # cell.
-                dist_to_curr_pos_cell = 0
-                for party in parties:
-                    dist_to_curr_pos_cell += 1
-                    party_pos = position_start_row + dist_to_curr_pos_cell
-                    ws.cell(party_pos, 1).value = str(party)
-                    ws.cell(party_pos, 1).font = Font(italic=True)
+        results_version = get_cache_version('results')
+        jobs = ExportJob.objects.filter(
+            election__id=election_id,
+            file_format=file_format
+        )
+        job = jobs.filter(status=ExportJobStatus.DONE).last()
+        if job is None or job.results_version != results_version:
+            self._request_export(jobs, election_id, file_format,
+                                 results_version)
 
-                    candidates = Candidate.objects.filter(
-                        party=party,
-                        position=position,
-                        election=election
-                    )
-                    candidates = candidates.annotate(
-                        total_votes=Count('votes')
+        if job is not None:
+            try:
+                export_file = open(job.file_path, 'rb')
+            except FileNotFoundError:
+                # The exported file got deleted. Let's export it again.
+                job.status = ExportJobStatus.FAILED
+                job.error = 'The exported file no longer exists.'
+                job.save()
+
+                self._request_export(jobs, election_id, file_format,
+                                     results_version)
+            else:
+                if file_format == ExportFormat.XLSX:
+                    content_type = (
+                        'application/vnd.openxmlformats-officedocument.'
+                        'spreadsheetml.sheet'
                     )
-                    if len(candidates) > 0:
-                        candidates_enum = enumerate(candidates, 1)
-                        for candidate_idx, candidate in candidates_enum:
-                            self._write_candidate_votes(
-                                ws, election, candidate,
-                                candidate_idx, party_pos, num_columns
-                            )
-
-                            if len(str(candidate)) > len_longest_cand_name:
-                                len_longest_cand_name = len(str(candidate))
-
-                        dist_to_curr_pos_cell += len(candidates)
-                    else:
-                        candidate_row = party_pos + 1
-                        
-                        self._write_no_candidate_cells(
-                            ws,
-                            election,
-                            candidate_row,
-                            num_columns
+                else:
+                    content_type = 'text/csv'
+
+                if job.results_version != results_version:
+                    # The newer results are still being exported, so the
+                    # older ones are served in the meantime. The time they
+                    # were exported is added to the name of the file, so that
+                    # the admin knows that the results are not the latest.
+                    filename = '{} (as of {})'.format(
+                        filename,
+                        timezone.localtime(job.date_updated).strftime(
+                            '%Y-%m-%d %H-%M-%S'
                         )
+                    )
 
-                        dist_to_curr_pos_cell += 1
-
-                position_start_row += dist_to_curr_pos_cell + 1
-
-            # +12 for spacing.
-            ws.column_dimensions['A'].width = len_longest_cand_name + 12
-
-            sheet_idx += 1
-
-        return wb
-
-    def _write_candidate_votes(self,
-                               ws,
-                               election,
-                               candidate,
-                               candidate_idx,
-                               party_pos,
-                               num_columns):
-        candidate_row = party_pos + candidate_idx
-        ws.cell(candidate_row, 1).value = str(candidate)
-
-        batches = Batch.objects.filter(election=election)
-        curr_section_col = 2
-        for batch in batches:
-            sections = Section.objects                             \
-                              .filter(voter_profiles__batch=batch) \
-                              .distinct()
-            for section in sections:
-                num_votes = Vote.objects.filter(
-                    candidate=candidate,
-                    election=election,
-                    user__voter_profile__section=section,
-                    # Temporary fix while a section can be used by different
-                    # students in different batches. :-(
-                    user__voter_profile__batch=batch
-                ).count()
-
-                ws.cell(candidate_row, curr_section_col).value = num_votes
-
-                curr_section_col += 1
-
-        total_votes_cell = ws.cell(candidate_row, num_columns)
-        total_votes_cell.value = candidate.total_votes
-        total_votes_cell.alignment = Alignment(horizontal='right')
-
-    def _write_no_candidate_cells(self,
-                                  ws,
-                                  election,
-                                  candidate_row,
-                                  num_columns):
-        total_votes_cell = ws.cell(candidate_row, num_columns)
+                filename = '{}.{}'.format(filename, file_format)
 
-        batches = Batch.objects.filter(election=election)
-        curr_section_col = 2
-        for batch in batches:
-            sections = Section.objects                             \
-                              .filter(voter_profiles__batch=batch) \
-                              .distinct()
-            for section in sections:
-                ws.cell(candidate_row, curr_section_col).value = 'N/A'
-                ws.cell(candidate_row, curr_section_col).alignment = Alignment(
-                    horizontal='right'
+                return FileResponse(
+                    export_file,
+                    as_attachment=True,
+                    filename=filename,
+                    content_type=content_type
                 )
 
-                curr_section_col += 1
-
-        ws.cell(candidate_row, 1).value = 'None'
-        total_votes_cell.value = 'N/A'
-        total_votes_cell.alignment = Alignment(horizontal='right')
+        messages.info(
+            request,
+            'The results are being exported. Please download them again in '
+            'a moment.'
+        )
+        return redirect(request.META.get('HTTP_REFERER', '/'))
+
+    def _request_export(self, jobs, election_id, file_format,
+                        results_version):
+        # There is only ever one pending job for each election and format, so
+        # that the jobs do not pile up while the results keep changing (e.g.
+        # while the elections are open). A job that has not been claimed yet
+        # just gets the newer version of the results. The worker only claims
+        # pending jobs, so this does not change a job that is already running.
+        if jobs.filter(
+                    status=ExportJobStatus.RUNNING,
+                    results_version=results_version
+                ).exists():
+            return
+
+        num_updated_jobs = jobs.filter(status=ExportJobStatus.PENDING) \
+                               .update(results_version=results_version)
+        if num_updated_jobs == 0:
+            ExportJob.objects.create(
+                election_id=election_id,
+                file_format=file_format,
+                results_version=results_version
+            )
@@ -1,20 +1,35 @@
 from functools import reduce
 import json
 
-from phe import paillier
-
 from django.contrib import messages
-from django.db.models import Q
+from django.db import (
+    connection, transaction
+)
+from django.db.models import (
+    Exists, Q
+)
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_protect
 
+from core.bulletin_board import (
+    append_receipt, create_receipt
+)
 from core.decorators import login_required
+from core.encryption import (
+    encrypt_votes, get_public_key
+)
 from core.models import (
-    User, Candidate, Vote, VoterProfile
+    User, Candidate, Election, EncryptedBallot, Vote, VoterProfile
 )
+from core.utils import change_cache_version
+
+
+class UserAlreadyVotedException(Exception):
+    pass
 
 
 @method_decorator(csrf_protect, name='dispatch')
@@ -48,20 +63,21 @@ class VoteProcessingView(View):
     from a user who has voted already, a message will be returned saying that
     the user has voted already.
 
+    Every cast ballot gets a receipt, which is appended to the public
+    bulletin board of the election (see `core.bulletin_board`).
+
     View URL: `/vote`
     """
     def get(self, request):
         return redirect(reverse('index'))
 
     def post(self, request):
-        # Improve this.
         user = self.request.user
-        has_user_voted = Vote.objects.filter(user__id=user.id).exists()
         try:
             # `candidates_voted` is expected to be a JSON-stringified array.
             candidates_voted = json.loads(request.POST['candidates_voted'])
         except KeyError:
-            if has_user_voted:
+            if self._has_user_voted(user):
                 messages.error(
                     request,
                     'You are no longer allowed to vote since you have voted '
@@ -74,96 +90,267 @@ class VoteProcessingView(View):
                     ' and/or contact the system administrator.'
                 )
         else:
-            if has_user_voted:
+            if type(candidates_voted) is list:
+                try:
+                    receipt = self._cast_votes(user, candidates_voted)
+                except UserAlreadyVotedException:
+                    messages.error(
+                        request,
+                        'You are no longer allowed to vote since you have '
+                        'voted already.'
+                    )
+                except ValueError:
+                    messages.error(
+                        request,
+                        'The votes you sent were invalid. Please try '
+                        'voting again, and/or contact the system '
+                        'administrator.'
+                    )
+                else:
+                    # The receipt is only kept in the session, so that it is
+                    # not linked to the voter. It is shown in the voted
+                    # subview until the voter logs out.
+                    request.session['vote_receipt'] = receipt
+            elif self._has_user_voted(user):
                 messages.error(
                     request,
                     'You are no longer allowed to vote since you have voted '
                     'already.'
                 )
             else:
-                if type(candidates_voted) is list:
-                    try:
-                        self._cast_votes(user, candidates_voted)
-                    except ValueError:
-                        messages.error(
-                            request,
-                            'The votes you sent were invalid. Please try '
-                            'voting again, and/or contact the system '
-                            'administrator.'
-                        )
-                else:
-                    messages.error(
-                        request,
-                        'The votes you sent were invalid. Please try voting '
-                        'again, and/or contact the system administrator.'
-                    )
+                messages.error(
+                    request,
+                    'The votes you sent were invalid. Please try voting '
+                    'again, and/or contact the system administrator.'
+                )
 
         return redirect(reverse('index'))
 
+    def _has_user_voted(self, user):
+        # Older data may have votes for voters whose profiles were never
+        # marked as voted, so we have to check for both.
+        return VoterProfile.objects.filter(
+            Q(has_voted=True) | Exists(Vote.objects.filter(user=user)),
+            user__id=user.id
+        ).exists()
+
     def _cast_votes(self, user, candidates_voted):
-        # Ensure that there are no duplicate candidates.
-        election = user.voter_profile.batch.election
-        encountered_candidate_ids = set()
-        voted_candidates = list()
-        num_selected_candidates_per_position = dict()
+        # Everything here happens in a single transaction. Should the ballot
+        # be invalid, the transaction gets rolled back, and no partial ballot
+        # will be left behind.
+        with transaction.atomic():
+            # Claim the ballot first. The conditional update locks the voter's
+            # profile row until the transaction ends. Should there be another
+            # request casting a ballot for the same voter (e.g. the voter
+            # double-clicked the cast button or voted in two tabs), that
+            # request will wait for this one to finish, and will then match no
+            # rows, since `has_voted` has already been set by then. As such,
+            # duplicate ballots are turned away in one round trip without
+            # doing any wasted work.
+            num_claimed_ballots = VoterProfile.objects \
+                .filter(
+                    ~Exists(Vote.objects.filter(user=user)),
+                    user__id=user.id,
+                    has_voted=False
+                ) \
+                .update(has_voted=True, date_updated=timezone.now())
+            if num_claimed_ballots == 0:
+                raise UserAlreadyVotedException
+
+            # The election must not get a key while the ballot is being cast,
+            # since the ballot would be left unencrypted. So, the row of the
+            # election is locked before we check whether it has a key.
+            self._lock_election(user)
+
+            # The whole ballot is validated in memory against a constant
+            # number of queries, no matter how many candidates were voted.
+            # The key of the election is joined in, since it tells us
+            # whether the ballot must be encrypted.
+            voter_profile = VoterProfile.objects \
+                                        .select_related(
+                                            'batch__election__key'
+                                        ) \
+                                        .get(user__id=user.id)
+            voted_candidates = self._get_valid_voted_candidates(
+                voter_profile,
+                candidates_voted
+            )
+
+            election = voter_profile.batch.election
+            if hasattr(election, 'key'):
+                ballot = self._cast_encrypted_votes(
+                    election.key,
+                    voter_profile.batch,
+                    voted_candidates
+                )
+            else:
+                # Alright, things have gone well. Note that the candidate
+                # tallies are updated by a trigger in the database as the
+                # votes get inserted. We insert the votes in the order of the
+                # candidate IDs, so that concurrent ballots lock the tallies
+                # of the candidates in the same order, preventing deadlocks.
+                voted_candidates.sort(key=lambda candidate: candidate.id)
+                Vote.objects.bulk_create([
+                    Vote(
+                        user=user,
+                        candidate=candidate,
+                        election_id=election.id
+                    ) for candidate in voted_candidates
+                ])
+
+                change_cache_version('results')
+
+                ballot = [ candidate.id for candidate in voted_candidates ]
+
+            # The receipt is appended last, since the receipt log of the
+            # election stays locked until the transaction ends.
+            receipt = create_receipt(election.id, ballot)
+            append_receipt(election.id, receipt)
+
+            return receipt
+
+    def _lock_election(self, user):
+        """
+        Lock the row of the election of `user` until the transaction ends.
+        The lock is the weakest row lock, which is also taken when votes are
+        inserted. Ballots do not wait on each other's locks, but generating
+        the key of the election waits for the ballots being cast (see the
+        `runexportjobs` management command).
+        """
+        elections = Election.objects \
+                            .filter(batches__voter_profiles__user=user) \
+                            .order_by() \
+                            .values('id')
+        sql, params = elections.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                '{} FOR KEY SHARE OF {}'.format(
+                    sql,
+                    Election._meta.db_table
+                ),
+                params
+            )
+
+    def _cast_encrypted_votes(self, election_key, batch, voted_candidates):
+        """
+        Cast the votes of a ballot in an election whose ballots are
+        encrypted. Must be called inside the transaction of the ballot.
+        Returns the encrypted votes of the ballot in each position.
+
+        The ballots are only inserted. The tallies of the candidates are
+        summed up from the ballots once the tallies are finalized, so that
+        concurrent ballots do not wait on each other's locks.
+        """
+        public_key = get_public_key(election_key)
+
+        # Every position the voter can vote in gets an encrypted ballot, so
+        # that the ballots do not reveal the positions the voter skipped.
+        candidates = Candidate.objects \
+                              .filter(
+                                  Q(position__target_batches=None)
+                                      | Q(position__target_batches=batch),
+                                  election__id=batch.election_id,
+                                  position__isnull=False
+                              ) \
+                              .order_by('id') \
+                              .values_list('id', 'position_id') \
+                              .distinct()
+        position_candidate_ids = dict()
+        for candidate_id, position_id in candidates:
+            position_candidate_ids.setdefault(position_id, list()).append(
+                candidate_id
+            )
+
+        voted_candidate_ids = {
+            candidate.id for candidate in voted_candidates
+        }
+        ballots = EncryptedBallot.objects.bulk_create([
+            EncryptedBallot(
+                election_id=batch.election_id,
+                position_id=position_id,
+                votes=encrypt_votes(
+                    public_key,
+                    candidate_ids,
+                    voted_candidate_ids
+                )
+            )
+            for position_id, candidate_ids in position_candidate_ids.items()
+        ])
+
+        return [ ballot.votes for ballot in ballots ]
+
+    def _get_valid_voted_candidates(self, voter_profile, candidates_voted):
+        """
+        Get the candidates in `candidates_voted`, a list of candidate IDs,
+        in the order they were voted. A ValueError is raised if the ballot is
+        invalid.
+        """
+        candidate_ids = list()
         for candidate_id in candidates_voted:
             try:
-                candidate = Candidate.objects.get(id=candidate_id)
-            except Candidate.DoesNotExist:
+                candidate_ids.append(int(candidate_id))
+            except (TypeError, ValueError):
                 raise ValueError('Voted candidate does not exist.')
 
+        # Check that there are no duplicate votes.
+        if len(candidate_ids) != len(set(candidate_ids)):
+            raise ValueError('Duplicate candidates IDs submitted.')
+
+        if not candidate_ids:
+            return list()
+
+        # Note: We remove the default ordering, since it would only add joins
+        #       to the query that we do not need.
+        candidates = Candidate.objects \
+                              .filter(id__in=candidate_ids) \
+                              .select_related('position') \
+                              .prefetch_related('position__target_batches') \
+                              .order_by()
+        candidates = { candidate.id: candidate for candidate in candidates }
+
+        # Check that the candidate IDs passed exist.
+        if len(candidates) != len(candidate_ids):
+            raise ValueError('Voted candidate does not exist.')
+
+        batch = voter_profile.batch
+        num_selected_candidates_per_position = dict()
+        voted_candidates = list()
+        for candidate_id in candidate_ids:
+            candidate = candidates[candidate_id]
+            if candidate.election_id != batch.election_id:
+                raise ValueError('Voted for candidate in another election.')
+
             position = candidate.position
+            if position is None:
+                raise ValueError(
+                    'Voted for candidate that is not running for a position.'
+                )
 
-            # Check that there are no duplicate votes and that the candidate
-            # IDs passed exist.
-            if candidate_id not in encountered_candidate_ids:
-                encountered_candidate_ids.add(candidate_id)
-                
-                candidate_election = candidate.election
-                if election == candidate_election:
-                    pos_name = position.position_name
-                    if pos_name in num_selected_candidates_per_position:
-                        num_selected_candidates_per_position[pos_name] += 1
-
-                        pos_max_selected = position.max_num_selected_candidates
-                        pos_num_selected = (
-                            num_selected_candidates_per_position[pos_name]
-                        )
-                        if pos_num_selected > pos_max_selected: 
-                            raise ValueError(
-                                'Selected more candidates in the same '
-                                'position than allowed.'
-                            )
-                    else:
-                        # No need to check if the number of selected candidates
-                        # in a position has already exceeded the set maximum
-                        # number, since the maximum number cannot be 0.
-                        num_selected_candidates_per_position[pos_name] = 1
-                    
-                    # Check if the voted candidated can be voted by the voter.
-                    batch = user.voter_profile.batch
-                    if (position.target_batches.exists()
-                            and batch not in position.target_batches.all()):
-                        raise ValueError(
-                            'Voted for candidate whose position cannot be '
-                            'voted by the voter.'
-                        )
-
-                    voted_candidates.append(candidate)                       
-                else:
-                    raise ValueError(
-                        'Voted for candidate in another election.'
-                    )
-            else:
-                raise ValueError('Duplicate candidates IDs submitted.')
-
-        # Alright, things have gone well.
-        for candidate in voted_candidates:
-            Vote.objects.create(
-                user=user,
-                candidate=candidate,
-                election=election
+            num_selected_candidates_per_position[position.id] = (
+                num_selected_candidates_per_position.get(position.id, 0) + 1
             )
+            pos_num_selected = num_selected_candidates_per_position[
+                position.id
+            ]
+            if pos_num_selected > position.max_num_selected_candidates:
+                raise ValueError(
+                    'Selected more candidates in the same position than '
+                    'allowed.'
+                )
+
+            # Check if the voted candidated can be voted by the voter. The
+            # target batches have already been prefetched, so no queries
+            # are made here.
+            target_batch_ids = {
+                target_batch.id
+                    for target_batch in position.target_batches.all()
+            }
+            if target_batch_ids and batch.id not in target_batch_ids:
+                raise ValueError(
+                    'Voted for candidate whose position cannot be voted by '
+                    'the voter.'
+                )
+
+            voted_candidates.append(candidate)
 
-        user.voter_profile.has_voted = True
-        user.voter_profile.save()
+        return voted_candidates
@@ -8,18 +8,25 @@ from bs4 import BeautifulSoup
 from django import forms
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.admin.sites import AdminSite
+from django.db import connection
 from django.test import (
-    RequestFactory, TestCase
+    RequestFactory, TestCase, override_settings
 )
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from unittest import mock
 
 from core.admin import (
-    AdminUserAdmin, ElectionAdmin, VoterAdmin,
+    AdminUserAdmin, ElectionAdmin, EstimatedCountPaginator, VoterAdmin,
     VoterProfileInline, AdminUser, Voter
 )
+from core.encryption import (
+    encrypt_votes, generate_election_key, get_public_key
+)
 from core.models import (
     User, Batch, Section, VoterProfile, UserType, Candidate, CandidateParty,
-    CandidatePosition, Election, Vote
+    CandidatePosition, CandidateTally, CandidateSectionTally, Election,
+    EncryptedBallot, EncryptedTally, Vote
 )
 
 
@@ -670,6 +677,178 @@ class VoterAdminTest(TestCase):
         self.assertEqual(admin.election(user), 'Election')
 
 
+class VoterAdminChangelistTest(TestCase):
+    """
+    Tests the changelist of the Voter admin. The changelist must take the
+    same number of queries no matter how many voters are shown, and must be
+    sortable by every column.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        election0 = Election.objects.create(name='Election 0')
+        election1 = Election.objects.create(name='Election 1')
+        batches = [
+            Batch.objects.create(year=1, election=election0),
+            Batch.objects.create(year=0, election=election1)
+        ]
+        sections = [
+            Section.objects.create(section_name='Section 1'),
+            Section.objects.create(section_name='Section 0')
+        ]
+
+        for index in range(4):
+            user = User.objects.create(
+                username='voter{}'.format(index),
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=batches[index % 2],
+                section=sections[index % 2]
+            )
+
+        admin = User.objects.create(
+            username='admin',
+            type=UserType.ADMIN
+        )
+        admin.set_password('root')
+        admin.save()
+
+    def setUp(self):
+        self.client.login(username='admin', password='root')
+
+    def _get_changelist(self, data={}):
+        return self.client.get(reverse('admin:core_voter_changelist'), data)
+
+    def _get_usernames(self, response):
+        return [
+            voter.username
+            for voter in response.context['cl'].result_list
+        ]
+
+    def test_num_queries_independent_of_num_voters(self):
+        with CaptureQueriesContext(connection) as few_voters_queries:
+            self._get_changelist()
+
+        election = Election.objects.get(name='Election 0')
+        batch = Batch.objects.create(year=2, election=election)
+        section = Section.objects.create(section_name='Section 2')
+        for index in range(4, 10):
+            user = User.objects.create(
+                username='voter{}'.format(index),
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=batch,
+                section=section
+            )
+
+        with CaptureQueriesContext(connection) as many_voters_queries:
+            response = self._get_changelist()
+
+        self.assertEqual(len(self._get_usernames(response)), 10)
+        self.assertEqual(
+            len(few_voters_queries),
+            len(many_voters_queries)
+        )
+
+    def test_sorting_by_batch(self):
+        # The first column is for the action checkboxes.
+        response = self._get_changelist({ 'o': '4.1' })
+        self.assertEqual(
+            self._get_usernames(response),
+            [ 'voter1', 'voter3', 'voter0', 'voter2' ]
+        )
+
+    def test_sorting_by_section(self):
+        response = self._get_changelist({ 'o': '5.1' })
+        self.assertEqual(
+            self._get_usernames(response),
+            [ 'voter1', 'voter3', 'voter0', 'voter2' ]
+        )
+
+    def test_sorting_by_election(self):
+        response = self._get_changelist({ 'o': '-6.1' })
+        self.assertEqual(
+            self._get_usernames(response),
+            [ 'voter1', 'voter3', 'voter0', 'voter2' ]
+        )
+
+    def test_filtering_by_election(self):
+        election = Election.objects.get(name='Election 1')
+        response = self._get_changelist({
+            'voter_profile__batch__election__id__exact': election.id
+        })
+        self.assertEqual(
+            self._get_usernames(response),
+            [ 'voter1', 'voter3' ]
+        )
+
+    def test_only_unfiltered_voter_counts_are_estimated(self):
+        with mock.patch('core.admin.ESTIMATED_COUNT_THRESHOLD', 0):
+            response = self._get_changelist()
+            self.assertTrue(response.context['cl'].paginator.estimate_count)
+
+            election = Election.objects.get(name='Election 1')
+            response = self._get_changelist({
+                'voter_profile__batch__election__id__exact': election.id
+            })
+            self.assertFalse(response.context['cl'].paginator.estimate_count)
+            self.assertEqual(response.context['cl'].result_count, 2)
+
+            response = self._get_changelist({ 'q': 'voter1' })
+            self.assertFalse(response.context['cl'].paginator.estimate_count)
+            self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    """
+    Tests the paginator that estimates the counts of large querysets.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(3):
+            User.objects.create(
+                username='voter{}'.format(index),
+                type=UserType.VOTER
+            )
+
+    def test_small_querysets_are_counted(self):
+        paginator = EstimatedCountPaginator(User.objects.all(), 2)
+        self.assertEqual(paginator.count, 3)
+
+    def test_large_querysets_are_estimated(self):
+        with mock.patch('core.admin.ESTIMATED_COUNT_THRESHOLD', 0):
+            paginator = EstimatedCountPaginator(
+                User.objects.all(),
+                2,
+                estimate_count=True
+            )
+            with CaptureQueriesContext(connection) as context:
+                count = paginator.count
+
+        # The estimate comes from the query plan, not from counting.
+        self.assertIsInstance(count, int)
+        self.assertTrue(
+            context.captured_queries[0]['sql'].startswith('EXPLAIN')
+        )
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_counts_are_not_estimated_unless_asked_to(self):
+        with mock.patch('core.admin.ESTIMATED_COUNT_THRESHOLD', 0):
+            paginator = EstimatedCountPaginator(User.objects.all(), 2)
+            self.assertEqual(paginator.count, 3)
+
+    def test_lists_are_counted(self):
+        paginator = EstimatedCountPaginator(
+            [ 1, 2, 3 ],
+            2,
+            estimate_count=True
+        )
+        self.assertEqual(paginator.count, 3)
+
+
 class VoterAdminChangeBatchTest(TestCase):
     """
     Tests changing the batch of a voter. This test is separated from the
@@ -2201,6 +2380,115 @@ class ElectionAdminTest(TestCase):
             'Votes in 1 election were cleared successfully.'
         )
 
+    # Small keys are insecure, but make the tests fast.
+    @override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+    def _create_finalized_encrypted_election(self):
+        election = Election.objects.create(name='Encrypted Election')
+        public_key = get_public_key(generate_election_key(election))
+
+        batch = Batch.objects.create(year=0, election=election)
+        section = Section.objects.create(section_name='Section 0')
+        user = User.objects.create(username='pedro', type=UserType.VOTER)
+        VoterProfile.objects.create(
+            user=user,
+            has_voted=True,
+            batch=batch,
+            section=section
+        )
+        position = CandidatePosition.objects.create(
+            position_name='Amazing Position',
+            election=election
+        )
+        candidate = Candidate.objects.create(
+            user=user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=election
+            ),
+            position=position,
+            election=election
+        )
+
+        votes = encrypt_votes(public_key, [ candidate.id ], { candidate.id })
+        EncryptedBallot.objects.create(
+            election=election,
+            position=position,
+            votes=votes
+        )
+        EncryptedTally.objects.create(
+            candidate=candidate,
+            ciphertext=votes[str(candidate.id)]
+        )
+
+        # The tallies written by the finalizetally command.
+        CandidateTally.objects.create(candidate=candidate, total_votes=1)
+        CandidateSectionTally.objects.create(
+            candidate=candidate,
+            batch=batch,
+            section=section,
+            total_votes=1
+        )
+
+        return election
+
+    def test_clear_election_action_clears_finalized_encrypted_tallies(self):
+        election = self._create_finalized_encrypted_election()
+
+        self.client.post(
+            reverse('admin:core_election_changelist'),
+            {
+                'action': 'clear_election',
+                'clear_elections': 'yes',
+                ACTION_CHECKBOX_NAME: [ election.pk ]
+            },
+            follow=True
+        )
+
+        self.assertFalse(EncryptedBallot.objects.exists())
+        self.assertFalse(EncryptedTally.objects.exists())
+        self.assertFalse(CandidateTally.objects.exists())
+        self.assertFalse(CandidateSectionTally.objects.exists())
+
+    def test_clear_election_clears_tallies_of_moved_voters(self):
+        election = Election.objects.create(name='Election 0')
+        batch = Batch.objects.create(year=0, election=election)
+        section0 = Section.objects.create(section_name='Section 0')
+        section1 = Section.objects.create(section_name='Section 1')
+
+        user = User.objects.create(username='pedro', type=UserType.VOTER)
+        VoterProfile.objects.create(
+            user=user,
+            has_voted=True,
+            batch=batch,
+            section=section0
+        )
+        candidate = Candidate.objects.create(
+            user=user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=election
+            ),
+            election=election
+        )
+        Vote.objects.create(user=user, candidate=candidate, election=election)
+
+        # The trigger decrements the tally of the voter's current section
+        # when the vote is deleted, which is not the section of the vote.
+        VoterProfile.objects.filter(user=user).update(section=section1)
+
+        self.client.post(
+            reverse('admin:core_election_clear_votes', args=(election.id,)),
+            { 'clear_election': 'yes' },
+            follow=True
+        )
+
+        self.assertFalse(CandidateTally.objects.exists())
+        self.assertFalse(CandidateSectionTally.objects.exists())
+
     def test_clear_election_action_multiple_elections(self):
         _election0 = Election.objects.create(name='Election 0')
 
@@ -2463,6 +2751,21 @@ class ElectionAdminTest(TestCase):
         )
         self.assertRedirects(response, index_url)      
 
+    def test_clear_election_confirmation_clears_finalized_encrypted_tallies(
+            self):
+        election = self._create_finalized_encrypted_election()
+
+        self.client.post(
+            reverse('admin:core_election_clear_votes', args=(election.id,)),
+            { 'clear_election': 'yes' },
+            follow=True
+        )
+
+        self.assertFalse(EncryptedBallot.objects.exists())
+        self.assertFalse(EncryptedTally.objects.exists())
+        self.assertFalse(CandidateTally.objects.exists())
+        self.assertFalse(CandidateSectionTally.objects.exists())
+
     def test_election_clear_election_confirmation_view_post_valid_id(self):
         _election0 = Election.objects.create(name='Election 0')
 
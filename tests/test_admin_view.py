@@ -2,17 +2,23 @@ from abc import (
     ABC, abstractmethod
 )
 from distutils.dir_util import copy_tree
+from io import StringIO
 import json
 import os
 import shutil
 
 from django.conf import settings
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (
+    TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 
 from core.models import (
-    User, Batch, Section, Election, Candidate, CandidateParty,
-    CandidatePosition, Vote, VoterProfile, UserType
+    User, Batch, Section, Election, ElectionKey, ElectionKeyJob, Candidate,
+    CandidateParty, CandidatePosition, ExportJobStatus, Vote, VoterProfile,
+    UserType
 )
 from core.utils import AppSettings
 
@@ -281,6 +287,136 @@ class ElectionSettingsElectionsStateViewTest(
         )
         self.assertEqual(AppSettings().get('election_state'), 'closed')
 
+    def test_view_with_key_jobs_being_run(self):
+        AppSettings().set('election_state', 'closed')
+        ElectionKeyJob.objects.create(
+            election=self._election,
+            status=ExportJobStatus.RUNNING
+        )
+
+        # Elections must not get votes before their keys are stored.
+        self.client.login(username='admin', password='root')
+        response = self.client.post(
+            self._view_url,
+            { 'state': 'open' },
+            follow=True
+        )
+        response_messages = list(response.context['messages'])
+
+        self.assertEqual(
+            str(response_messages[0]),
+            'The elections cannot be opened while election keys are being '
+            'generated.'
+        )
+        self.assertEqual(AppSettings().get('election_state'), 'closed')
+
+
+# Small keys are insecure, but make the tests fast.
+@override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+class ElectionSettingsElectionKeyViewTest(
+        BaseElectionSettingsViewTest,
+        TestCase):
+    """
+    Tests the election settings election key view.
+
+    This view requests the key pair of an election to be generated, which
+    makes the ballots of the election get encrypted. The key pair is generated
+    in the background by the job worker. Key pairs can only be generated while
+    the elections are closed, and for elections that have no votes yet. This
+    will only accept POST requests. GET requests from superusers will result
+    in a redirection to `/admin/election`, while non-superusers and anonymoous
+    users to `/`.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        cls._view_url = reverse('admin-election-key')
+
+    def _post(self, data):
+        self.client.login(username='admin', password='root')
+        response = self.client.post(self._view_url, data, follow=True)
+        return str(list(response.context['messages'])[0])
+
+    def test_view_accepts_superusers(self):
+        self.client.login(username='admin', password='root')
+        response = self.client.get(self._view_url, follow=True)
+        self.assertRedirects(response, reverse('admin-election-index'))
+
+    def test_view_with_invalid_post_requests(self):
+        self.assertEqual(
+            self._post({}),
+            'You attempted to generate a key for an invalid election.'
+        )
+        self.assertFalse(ElectionKeyJob.objects.exists())
+
+    def test_view_with_valid_post_requests(self):
+        self.assertEqual(
+            self._post({ 'election': self._election.id }),
+            'The key of \'Election\' is being generated. Refresh this page '
+            'to check on it.'
+        )
+
+        job = ElectionKeyJob.objects.get(election=self._election)
+        self.assertEqual(job.status, ExportJobStatus.PENDING)
+        self.assertFalse(ElectionKey.objects.exists())
+
+        call_command('runexportjobs', once=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.DONE)
+        self.assertIsNotNone(job.duration)
+        self.assertTrue(
+            ElectionKey.objects.filter(election=self._election).exists()
+        )
+
+    def test_view_with_election_with_pending_key_job(self):
+        self._post({ 'election': self._election.id })
+
+        # Elections whose keys are being generated cannot be chosen.
+        self.assertEqual(
+            self._post({ 'election': self._election.id }),
+            'You attempted to generate a key for an invalid election.'
+        )
+        self.assertEqual(ElectionKeyJob.objects.count(), 1)
+
+    def test_view_with_election_with_key(self):
+        self._post({ 'election': self._election.id })
+        call_command('runexportjobs', once=True, stdout=StringIO())
+
+        # Only elections without keys can be chosen.
+        self.assertEqual(
+            self._post({ 'election': self._election.id }),
+            'You attempted to generate a key for an invalid election.'
+        )
+        self.assertEqual(ElectionKeyJob.objects.count(), 1)
+        self.assertEqual(ElectionKey.objects.count(), 1)
+
+    def test_view_with_open_elections(self):
+        AppSettings().set('election_state', 'open')
+
+        self.assertEqual(
+            self._post({ 'election': self._election.id }),
+            'Keys cannot be generated while the elections are open.'
+        )
+        self.assertFalse(ElectionKeyJob.objects.exists())
+
+    def test_view_with_election_with_votes(self):
+        user = User.objects.create(username='juan', type=UserType.VOTER)
+        VoterProfile.objects.create(
+            user=user,
+            batch=self._batch,
+            section=self._section,
+            has_voted=True
+        )
+
+        self.assertEqual(
+            self._post({ 'election': self._election.id }),
+            'Keys cannot be generated for elections that have votes '
+            'already.'
+        )
+        self.assertFalse(ElectionKeyJob.objects.exists())
+
 
 class CandidateUserAutoCompleteViewTest(TestCase):
     @classmethod
@@ -443,6 +579,150 @@ class CandidateUserAutoCompleteViewTest(TestCase):
         self.assertEqual(int(results[0]['id']), self.voter0.id)
 
 
+    def test_admin_election_with_lowercase_query(self):
+        self.client.login(username='admin', password='admin(root)')
+
+        response = self.client.get(
+            reverse('admin-candidate-user-autocomplete'),
+            {
+                'forward': '{{ "election": "{}" }}'.format(self.election0.id),
+                'q': 'voter, z'
+            },
+            follow=True
+        )
+        results = json.loads(response.content.decode('utf-8'))['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(int(results[0]['id']), self.voter0.id)
+
+    def test_admin_election_results_are_limited(self):
+        for index in range(25):
+            user = User.objects.create(
+                username='extra{}'.format(index),
+                first_name='Extra {:02}'.format(index),
+                last_name='Voter',
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=self.batch0,
+                section=self.section0
+            )
+
+        self.client.login(username='admin', password='admin(root)')
+        response = self.client.get(
+            reverse('admin-candidate-user-autocomplete'),
+            {
+                'forward': '{{ "election": "{}" }}'.format(self.election0.id),
+                'q': 'Voter, E'
+            },
+            follow=True
+        )
+        json_response = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(len(json_response['results']), 20)
+        self.assertEqual(
+            json_response['results'][0]['text'],
+            'Voter, Extra 00'
+        )
+        self.assertTrue(json_response['pagination']['more'])
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class CandidateUserAutoCompleteViewCacheTest(TransactionTestCase):
+    """
+    Tests the caching of the results of the candidate user autocomplete view.
+    This test case is a TransactionTestCase, since the cached results are
+    not used inside transactions.
+    """
+    def setUp(self):
+        cache.clear()
+
+        self._election = Election.objects.create(name='Election')
+        batch = Batch.objects.create(year=0, election=self._election)
+        section = Section.objects.create(section_name='Section')
+
+        self._voters = list()
+        for username in [ 'juan', 'pedro' ]:
+            user = User.objects.create(
+                username=username,
+                first_name=username.capitalize(),
+                last_name='Sample',
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=batch,
+                section=section
+            )
+            self._voters.append(user)
+
+        admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        admin.set_password('root')
+        admin.save()
+
+        self.client.login(username='admin', password='root')
+
+    def _search(self, query):
+        response = self.client.get(
+            reverse('admin-candidate-user-autocomplete'),
+            {
+                'forward': '{{ "election": "{}" }}'.format(self._election.id),
+                'q': query
+            }
+        )
+        return [
+            result['text']
+            for result in json.loads(response.content.decode('utf-8'))[
+                'results'
+            ]
+        ]
+
+    def test_results_are_cached(self):
+        self.assertEqual(self._search('Sample, J'), [ 'Sample, Juan' ])
+
+        # Updates through querysets do not invalidate the cached results.
+        User.objects.filter(username='juan').update(last_name='Changed')
+        self.assertEqual(self._search('Sample, J'), [ 'Sample, Juan' ])
+
+    def test_results_are_cached_per_search(self):
+        self.assertEqual(
+            self._search('Sample'),
+            [ 'Sample, Juan', 'Sample, Pedro' ]
+        )
+        self.assertEqual(self._search('Sample, P'), [ 'Sample, Pedro' ])
+
+    def test_cached_results_are_invalidated_when_candidates_change(self):
+        self.assertEqual(
+            self._search('Sample'),
+            [ 'Sample, Juan', 'Sample, Pedro' ]
+        )
+
+        Candidate.objects.create(
+            user=self._voters[0],
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=self._election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=self._election
+            ),
+            election=self._election
+        )
+        self.assertEqual(self._search('Sample'), [ 'Sample, Pedro' ])
+
+    def test_results_are_not_cached_for_anonymous_users(self):
+        self._search('Sample')
+
+        self.client.logout()
+        self.assertEqual(self._search('Sample'), [])
+
+
 class CandidatePartyAutoCompleteViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -0,0 +1,197 @@
+import hashlib
+
+from django.db import (
+    connection, transaction
+)
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.bulletin_board import (
+    EMPTY_ROOT, append_receipt, create_receipt, get_inclusion_proof,
+    get_root, hash_children, hash_receipt, verify_inclusion_proof
+)
+from core.models import (
+    Election, Receipt, ReceiptLog
+)
+
+
+def _get_merkle_tree_hash(receipts):
+    # The definition of the Merkle tree hash in RFC 6962, which computes the
+    # hash of the whole tree.
+    if len(receipts) == 1:
+        return hash_receipt(receipts[0])
+
+    split = 2 ** ((len(receipts) - 1).bit_length() - 1)
+    return hash_children(
+        _get_merkle_tree_hash(receipts[:split]),
+        _get_merkle_tree_hash(receipts[split:])
+    )
+
+
+class BulletinBoardTest(TestCase):
+    """ Tests the receipt logs of the bulletin board. """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+
+    def _append_receipts(self, num_receipts):
+        receipts = [
+            hashlib.sha256(str(index).encode('utf-8')).hexdigest()
+            for index in range(num_receipts)
+        ]
+        with transaction.atomic():
+            for receipt in receipts:
+                append_receipt(self._election.id, receipt)
+
+        return receipts
+
+    def test_receipts_do_not_repeat(self):
+        receipt0 = create_receipt(self._election.id, [ 1, 2 ])
+        receipt1 = create_receipt(self._election.id, [ 1, 2 ])
+
+        self.assertNotEqual(receipt0, receipt1)
+        self.assertEqual(len(receipt0), 64)
+
+    def test_empty_log_root(self):
+        self.assertEqual(get_root(None), EMPTY_ROOT)
+
+    def test_root_matches_merkle_tree_hash(self):
+        receipts = self._append_receipts(13)
+
+        receipt_log = ReceiptLog.objects.get(election=self._election)
+        self.assertEqual(receipt_log.size, 13)
+        self.assertEqual(
+            get_root(receipt_log),
+            _get_merkle_tree_hash(receipts)
+        )
+
+    def test_inclusion_proofs_are_valid(self):
+        receipts = self._append_receipts(13)
+
+        receipt_log = ReceiptLog.objects.get(election=self._election)
+        root = get_root(receipt_log)
+        for receipt in Receipt.objects.filter(election=self._election):
+            proof = get_inclusion_proof(receipt, receipt_log)
+            self.assertTrue(
+                verify_inclusion_proof(
+                    receipts[receipt.index],
+                    receipt.index,
+                    receipt_log.size,
+                    proof,
+                    root
+                )
+            )
+            self.assertLessEqual(len(proof), 4)
+
+    def test_inclusion_proofs_of_other_receipts_are_invalid(self):
+        receipts = self._append_receipts(5)
+
+        receipt_log = ReceiptLog.objects.get(election=self._election)
+        receipt = Receipt.objects.get(election=self._election, index=1)
+        self.assertFalse(
+            verify_inclusion_proof(
+                receipts[2],
+                1,
+                receipt_log.size,
+                get_inclusion_proof(receipt, receipt_log),
+                get_root(receipt_log)
+            )
+        )
+
+    def test_inclusion_proofs_take_one_query(self):
+        self._append_receipts(13)
+
+        receipt_log = ReceiptLog.objects.get(election=self._election)
+        receipt = Receipt.objects.get(election=self._election, index=4)
+        with CaptureQueriesContext(connection) as context:
+            get_inclusion_proof(receipt, receipt_log)
+
+        self.assertEqual(len(context.captured_queries), 1)
+
+
+class BulletinBoardViewTest(TestCase):
+    """
+    Tests the public bulletin board view.
+
+    This view can be accessed by anyone, and returns the root of the receipt
+    log of an election, and the inclusion proofs of receipts.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        cls._receipts = [
+            create_receipt(cls._election.id, [ index ])
+            for index in range(6)
+        ]
+        with transaction.atomic():
+            for receipt in cls._receipts:
+                append_receipt(cls._election.id, receipt)
+
+    def test_election_root(self):
+        response = self.client.get(
+            reverse('bulletin-board'),
+            { 'election': self._election.id }
+        )
+
+        self.assertEqual(
+            response.json(),
+            {
+                'election': self._election.id,
+                'size': 6,
+                'root': _get_merkle_tree_hash(self._receipts)
+            }
+        )
+
+    def test_election_without_receipts(self):
+        election = Election.objects.create(name='Empty Election')
+        response = self.client.get(
+            reverse('bulletin-board'),
+            { 'election': election.id }
+        )
+
+        self.assertEqual(response.json()['size'], 0)
+        self.assertEqual(response.json()['root'], EMPTY_ROOT)
+
+    def test_receipt_inclusion_proof(self):
+        response = self.client.get(
+            reverse('bulletin-board'),
+            { 'receipt': self._receipts[3] }
+        )
+        data = response.json()
+
+        self.assertEqual(data['election'], self._election.id)
+        self.assertEqual(data['index'], 3)
+        self.assertTrue(
+            verify_inclusion_proof(
+                self._receipts[3],
+                data['index'],
+                data['size'],
+                data['proof'],
+                data['root']
+            )
+        )
+
+    def test_unknown_receipt(self):
+        response = self.client.get(
+            reverse('bulletin-board'),
+            { 'receipt': '0' * 64 }
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_non_existent_election(self):
+        response = self.client.get(
+            reverse('bulletin-board'),
+            { 'election': 1000 }
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_parameters(self):
+        response = self.client.get(reverse('bulletin-board'))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            reverse('bulletin-board'),
+            { 'election': 'one' }
+        )
+        self.assertEqual(response.status_code, 400)
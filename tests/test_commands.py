@@ -1,17 +1,37 @@
 from io import StringIO
+import csv
+import datetime
+import json
+import os
+import tempfile
 
 from django.core import exceptions
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.db import (
+    connection, transaction
+)
 from django.test import (
-    TestCase, override_settings
+    TestCase, TransactionTestCase, override_settings
 )
+from django.utils import timezone
 from unittest import mock
 
+import openpyxl
+
+from core import encryption
+from core.encryption import (
+    encrypt_votes, generate_election_key, get_private_key, get_public_key
+)
+from core.forms.admin import ElectionSettingsElectionKeyForm
 from core.management.commands import createsuperuser
 from core.models import (
-    User, UserType
+    Batch, Candidate, CandidateParty, CandidatePosition, CandidateSectionTally,
+    CandidateTally, Election, ElectionKey, ElectionKeyJob, EncryptedBallot,
+    EncryptedTally, ExportJob, ExportJobStatus, Section, User, UserType, Vote,
+    VoterProfile
 )
+from core.utils import AppSettings
 from tests.models import (
     AnotherTestUser, TestUser, TestConnectedModel
 )
@@ -637,3 +657,933 @@ class CreateSuperUserTest(TestCase):
                 command.get_input_data(test_field, '', default='valid_str'),
                 'valid_str'
             )
+
+
+class RebuildTalliesTest(TestCase):
+    """ Tests the rebuildtallies command. """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        cls._batch = Batch.objects.create(year=0, election=cls._election)
+        cls._section0 = Section.objects.create(section_name='Section 0')
+        cls._section1 = Section.objects.create(section_name='Section 1')
+
+        cls._user0 = User.objects.create(username='juan', type=UserType.VOTER)
+        cls._user1 = User.objects.create(username='pedro', type=UserType.VOTER)
+        VoterProfile.objects.create(
+            user=cls._user0,
+            batch=cls._batch,
+            section=cls._section0
+        )
+        cls._voter_profile1 = VoterProfile.objects.create(
+            user=cls._user1,
+            batch=cls._batch,
+            section=cls._section0
+        )
+
+        cls._candidate = Candidate.objects.create(
+            user=cls._user0,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=cls._election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=cls._election
+            ),
+            election=cls._election
+        )
+
+        for user in [ cls._user0, cls._user1 ]:
+            Vote.objects.create(
+                user=user,
+                candidate=cls._candidate,
+                election=cls._election
+            )
+
+    def test_tallies_get_rebuilt(self):
+        CandidateTally.objects.update(total_votes=69)
+        CandidateSectionTally.objects.update(total_votes=69)
+
+        call_command('rebuildtallies', stdout=StringIO())
+
+        self.assertEqual(
+            CandidateTally.objects.get(candidate=self._candidate).total_votes,
+            2
+        )
+        self.assertEqual(
+            CandidateSectionTally.objects.get(
+                candidate=self._candidate
+            ).total_votes,
+            2
+        )
+
+    def test_section_tallies_follow_current_voter_sections(self):
+        self._voter_profile1.section = self._section1
+        self._voter_profile1.save()
+
+        call_command(
+            'rebuildtallies',
+            '--election={}'.format(self._election.id),
+            stdout=StringIO()
+        )
+
+        for section in [ self._section0, self._section1 ]:
+            self.assertEqual(
+                CandidateSectionTally.objects.get(
+                    candidate=self._candidate,
+                    section=section
+                ).total_votes,
+                1
+            )
+
+    @override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+    def test_tallies_of_encrypted_elections_are_kept(self):
+        election = Election.objects.create(name='Encrypted Election')
+        generate_election_key(election)
+        user = User.objects.create(username='maria', type=UserType.VOTER)
+        VoterProfile.objects.create(
+            user=user,
+            batch=Batch.objects.create(year=1, election=election),
+            section=Section.objects.create(section_name='Section 2')
+        )
+        candidate = Candidate.objects.create(
+            user=user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=election
+            ),
+            election=election
+        )
+        CandidateTally.objects.create(candidate=candidate, total_votes=69)
+
+        call_command('rebuildtallies', stdout=StringIO())
+
+        self.assertEqual(
+            CandidateTally.objects.get(candidate=candidate).total_votes,
+            69
+        )
+
+    def test_non_existent_election(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuildtallies', '--election=1000', stdout=StringIO())
+
+
+class RunExportJobsTest(TestCase):
+    """ Tests the runexportjobs command. """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+
+        settings_override = override_settings(EXPORT_ROOT=export_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_pending_jobs_are_run(self):
+        job = ExportJob.objects.create(
+            election=self._election,
+            file_format='csv',
+            results_version='version'
+        )
+
+        out = StringIO()
+        call_command('runexportjobs', once=True, stdout=out)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.DONE)
+        self.assertTrue(os.path.exists(job.file_path))
+        self.assertEqual(
+            out.getvalue().strip(),
+            'Export job #{} finished successfully.'.format(job.id)
+        )
+
+    def test_failed_jobs_are_marked_as_failed(self):
+        job = ExportJob.objects.create(
+            election=self._election,
+            file_format='pdf',
+            results_version='version'
+        )
+
+        call_command('runexportjobs', once=True, stderr=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.FAILED)
+        self.assertNotEqual(job.error, '')
+        self.assertEqual(os.listdir(os.path.dirname(job.file_path)), [])
+
+    def test_exports_of_older_results_are_deleted(self):
+        old_job = ExportJob.objects.create(
+            election=self._election,
+            file_format='csv',
+            results_version='old'
+        )
+        call_command('runexportjobs', once=True, stdout=StringIO())
+        old_job.refresh_from_db()
+        old_file_path = old_job.file_path
+
+        ExportJob.objects.create(
+            election=self._election,
+            file_format='csv',
+            results_version='new'
+        )
+        call_command('runexportjobs', once=True, stdout=StringIO())
+
+        self.assertFalse(ExportJob.objects.filter(id=old_job.id).exists())
+        self.assertFalse(os.path.exists(old_file_path))
+
+    def test_stale_running_jobs_are_failed(self):
+        stale_job = ExportJob.objects.create(
+            election=self._election,
+            file_format='csv',
+            results_version='old',
+            status=ExportJobStatus.RUNNING,
+            date_claimed=timezone.now() - datetime.timedelta(hours=2)
+        )
+        running_job = ExportJob.objects.create(
+            election=self._election,
+            file_format='xlsx',
+            results_version='old',
+            status=ExportJobStatus.RUNNING,
+            date_claimed=timezone.now()
+        )
+
+        call_command('runexportjobs', once=True, stdout=StringIO())
+
+        stale_job.refresh_from_db()
+        self.assertEqual(stale_job.status, ExportJobStatus.FAILED)
+        self.assertNotEqual(stale_job.error, '')
+
+        running_job.refresh_from_db()
+        self.assertEqual(running_job.status, ExportJobStatus.RUNNING)
+
+    def test_claimed_jobs_get_claim_times(self):
+        job = ExportJob.objects.create(
+            election=self._election,
+            file_format='csv',
+            results_version='version'
+        )
+
+        call_command('runexportjobs', once=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertIsNotNone(job.date_claimed)
+
+    @override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+    def test_pending_key_jobs_are_run(self):
+        job = ElectionKeyJob.objects.create(election=self._election)
+
+        out = StringIO()
+        call_command('runexportjobs', once=True, stdout=out)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.DONE)
+        self.assertIsNotNone(job.duration)
+        self.assertTrue(
+            ElectionKey.objects.filter(election=self._election).exists()
+        )
+        self.assertIn(
+            'Election key job #{} finished in'.format(job.id),
+            out.getvalue()
+        )
+
+    @override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+    def test_key_jobs_of_elections_with_keys_fail(self):
+        generate_election_key(self._election)
+        job = ElectionKeyJob.objects.create(election=self._election)
+
+        call_command('runexportjobs', once=True, stderr=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.FAILED)
+        self.assertEqual(job.error, 'The election has a key already.')
+        self.assertEqual(ElectionKey.objects.count(), 1)
+
+    @override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+    def test_key_jobs_of_elections_voted_during_generation_fail(self):
+        batch = Batch.objects.create(year=0, election=self._election)
+        section = Section.objects.create(section_name='Section')
+        job = ElectionKeyJob.objects.create(election=self._election)
+
+        generate_key_pair = encryption.generate_key_pair
+
+        def vote_during_generation():
+            VoterProfile.objects.create(
+                user=User.objects.create(
+                    username='juan',
+                    type=UserType.VOTER
+                ),
+                batch=batch,
+                section=section,
+                has_voted=True
+            )
+            return generate_key_pair()
+
+        with mock.patch(
+                'core.management.commands.runexportjobs.generate_key_pair',
+                side_effect=vote_during_generation):
+            call_command('runexportjobs', once=True, stderr=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.FAILED)
+        self.assertEqual(
+            job.error,
+            'Keys cannot be generated for elections that have votes '
+            'already.'
+        )
+        self.assertFalse(ElectionKey.objects.exists())
+
+    def test_stale_running_key_jobs_are_failed(self):
+        job = ElectionKeyJob.objects.create(
+            election=self._election,
+            status=ExportJobStatus.RUNNING,
+            date_claimed=timezone.now() - datetime.timedelta(hours=2)
+        )
+
+        call_command('runexportjobs', once=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.FAILED)
+
+        # The election can get a key again.
+        form = ElectionSettingsElectionKeyForm()
+        self.assertIn(self._election, form.fields['election'].queryset)
+
+
+# Small keys are insecure, but make the tests fast.
+@override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+class FinalizeTallyTest(TestCase):
+    """ Tests the finalizetally command. """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        cls._election_key = generate_election_key(cls._election)
+
+        party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=cls._election
+        )
+        position = CandidatePosition.objects.create(
+            position_name='Amazing Position',
+            election=cls._election
+        )
+        batch = Batch.objects.create(year=0, election=cls._election)
+        section = Section.objects.create(section_name='Section')
+        cls._candidates = list()
+        for index in range(3):
+            user = User.objects.create(
+                username='candidate{}'.format(index),
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=batch,
+                section=section
+            )
+            cls._candidates.append(
+                Candidate.objects.create(
+                    user=user,
+                    party=party,
+                    position=position,
+                    election=cls._election
+                )
+            )
+
+        # Candidate 0 gets three votes, candidate 1 gets one, and candidate 2
+        # gets none.
+        public_key = get_public_key(cls._election_key)
+        candidate_ids = [ candidate.id for candidate in cls._candidates ]
+        ballots = [
+            EncryptedBallot(
+                election=cls._election,
+                position=position,
+                votes=encrypt_votes(
+                    public_key,
+                    candidate_ids,
+                    { candidate_ids[voted_index] }
+                )
+            )
+            for voted_index in [ 0, 1, 0, 0 ]
+        ]
+        EncryptedBallot.objects.bulk_create(ballots)
+
+    def _get_tallies(self):
+        return [
+            CandidateTally.objects.get(candidate=candidate).total_votes
+            for candidate in self._candidates
+        ]
+
+    def test_tallies_get_finalized(self):
+        out = StringIO()
+        call_command(
+            'finalizetally',
+            self._election.id,
+            chunk_size=3,
+            processes=1,
+            stdout=out
+        )
+
+        self.assertEqual(self._get_tallies(), [ 3, 1, 0 ])
+        self.assertIn(
+            'Finalized the tallies of 3 candidate(s) successfully.',
+            out.getvalue()
+        )
+
+    def test_tallies_get_finalized_with_multiple_processes(self):
+        call_command(
+            'finalizetally',
+            self._election.id,
+            chunk_size=2,
+            processes=2,
+            stdout=StringIO()
+        )
+
+        self.assertEqual(self._get_tallies(), [ 3, 1, 0 ])
+
+    def test_encrypted_tallies_get_saved(self):
+        call_command(
+            'finalizetally',
+            self._election.id,
+            processes=1,
+            stdout=StringIO()
+        )
+
+        private_key = get_private_key(self._election_key)
+        self.assertEqual(
+            [
+                private_key.raw_decrypt(
+                    int(
+                        EncryptedTally.objects.get(
+                            candidate=candidate
+                        ).ciphertext
+                    )
+                )
+                for candidate in self._candidates
+            ],
+            [ 3, 1, 0 ]
+        )
+
+    def test_election_without_key(self):
+        election = Election.objects.create(name='Unencrypted Election')
+        with self.assertRaises(CommandError):
+            call_command('finalizetally', election.id, stdout=StringIO())
+
+    def test_open_elections(self):
+        AppSettings().set('election_state', 'open')
+        with self.assertRaises(CommandError):
+            call_command(
+                'finalizetally',
+                self._election.id,
+                stdout=StringIO()
+            )
+
+        self.assertFalse(CandidateTally.objects.exists())
+
+    def test_non_existent_election(self):
+        with self.assertRaises(CommandError):
+            call_command('finalizetally', 1000, stdout=StringIO())
+
+
+class ImportVotersTest(TestCase):
+    """ Tests the importvoters command. """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        cls._batch0 = Batch.objects.create(year=0, election=cls._election)
+        cls._batch1 = Batch.objects.create(year=1, election=cls._election)
+        cls._section = Section.objects.create(section_name='Section 0')
+
+    def setUp(self):
+        csv_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(csv_dir.cleanup)
+        self._csv_path = os.path.join(csv_dir.name, 'voters.csv')
+
+    def _write_csv(self, rows):
+        with open(self._csv_path, 'w', newline='') as csv_file:
+            csv_file.write(
+                'username,first_name,last_name,batch,section,password\n'
+            )
+            for row in rows:
+                csv_file.write('{}\n'.format(','.join(row)))
+
+    def _import_voters(self, *args, **kwargs):
+        out = StringIO()
+        call_command(
+            'importvoters',
+            self._csv_path,
+            *args,
+            processes=1,
+            stdout=out,
+            **kwargs
+        )
+        return out.getvalue().strip()
+
+    def test_voters_get_imported(self):
+        self._write_csv([
+            ( 'juan', 'Juan', 'dela Cruz', '0', 'Section 0', 'pass1' ),
+            ( 'pedro', 'Pedro', 'Penduko', '0', 'Section 0', 'pass2' ),
+            ( 'maria', 'Maria', 'Clara', '1', 'Section 1', 'pass3' ),
+            ( 'jose', 'Jose', 'Rizal', '1', 'Section 1', '' )
+        ])
+
+        # Use a chunk size that does not evenly divide the rows.
+        out = self._import_voters('--chunk-size=3')
+
+        self.assertEqual(out, 'Imported 4 voter(s) successfully.')
+
+        juan = User.objects.get(username='juan')
+        self.assertEqual(juan.first_name, 'Juan')
+        self.assertEqual(juan.last_name, 'dela Cruz')
+        self.assertEqual(juan.type, UserType.VOTER)
+        self.assertFalse(juan.is_staff)
+        self.assertTrue(juan.check_password('pass1'))
+        self.assertEqual(juan.voter_profile.batch, self._batch0)
+        self.assertEqual(juan.voter_profile.section, self._section)
+
+        maria = User.objects.get(username='maria')
+        self.assertTrue(maria.check_password('pass3'))
+        self.assertEqual(maria.voter_profile.batch, self._batch1)
+        self.assertEqual(
+            maria.voter_profile.section,
+            Section.objects.get(section_name='Section 1')
+        )
+
+        self.assertFalse(
+            User.objects.get(username='jose').has_usable_password()
+        )
+
+    def test_passwords_get_hashed_in_multiple_processes(self):
+        self._write_csv([
+            ( 'juan', 'Juan', 'dela Cruz', '0', 'Section 0', 'pass1' ),
+            ( 'pedro', 'Pedro', 'Penduko', '0', 'Section 0', 'pass2' )
+        ])
+
+        call_command(
+            'importvoters',
+            self._csv_path,
+            processes=2,
+            stdout=StringIO()
+        )
+
+        self.assertTrue(
+            User.objects.get(username='juan').check_password('pass1')
+        )
+        self.assertTrue(
+            User.objects.get(username='pedro').check_password('pass2')
+        )
+
+    def test_nothing_gets_imported_on_error(self):
+        self._write_csv([
+            ( 'juan', 'Juan', 'dela Cruz', '0', 'Section 0', 'pass1' ),
+            ( 'pedro', 'Pedro', 'Penduko', '2', 'Section 0', 'pass2' )
+        ])
+
+        with self.assertRaises(CommandError):
+            self._import_voters('--chunk-size=1')
+
+        self.assertFalse(User.objects.filter(username='juan').exists())
+
+    def test_existing_username(self):
+        User.objects.create(username='juan', type=UserType.VOTER)
+        self._write_csv([
+            ( 'juan', 'Juan', 'dela Cruz', '0', 'Section 0', 'pass1' )
+        ])
+
+        with self.assertRaises(CommandError):
+            self._import_voters()
+
+    def test_duplicate_username(self):
+        self._write_csv([
+            ( 'juan', 'Juan', 'dela Cruz', '0', 'Section 0', 'pass1' ),
+            ( 'juan', 'Juan', 'Luna', '0', 'Section 0', 'pass2' )
+        ])
+
+        with self.assertRaises(CommandError):
+            self._import_voters()
+
+    def test_section_used_by_another_batch(self):
+        self._write_csv([
+            ( 'juan', 'Juan', 'dela Cruz', '0', 'Section 0', 'pass1' ),
+            ( 'pedro', 'Pedro', 'Penduko', '1', 'Section 0', 'pass2' )
+        ])
+
+        with self.assertRaises(CommandError):
+            self._import_voters()
+
+    def test_missing_columns(self):
+        with open(self._csv_path, 'w', newline='') as csv_file:
+            csv_file.write('username,batch\njuan,0\n')
+
+        with self.assertRaises(CommandError):
+            self._import_voters()
+
+
+class GenerateCredentialsTest(TestCase):
+    """ Tests the generatecredentials command. """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election0 = Election.objects.create(name='Election 0')
+        cls._election1 = Election.objects.create(name='Election 1')
+        batch0 = Batch.objects.create(year=0, election=cls._election0)
+        batch1 = Batch.objects.create(year=1, election=cls._election1)
+        section0 = Section.objects.create(section_name='Section 0')
+        section1 = Section.objects.create(section_name='Section 1')
+
+        cls._voters = list()
+        for username, batch, section in [
+                    ( 'pedro', batch0, section0 ),
+                    ( 'juan', batch0, section0 ),
+                    ( 'maria', batch1, section1 )
+                ]:
+            user = User.objects.create(
+                username=username,
+                first_name=username.capitalize(),
+                last_name='Cruz',
+                type=UserType.VOTER
+            )
+            user.set_password('old password')
+            user.save()
+            VoterProfile.objects.create(
+                user=user,
+                batch=batch,
+                section=section
+            )
+            cls._voters.append(user)
+
+        admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        admin.set_password('admin password')
+        admin.save()
+
+    def setUp(self):
+        output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(output_dir.cleanup)
+        self._output_path = os.path.join(output_dir.name, 'credentials')
+
+    def _generate_credentials(self, *args, **kwargs):
+        out = StringIO()
+        call_command(
+            'generatecredentials',
+            self._output_path,
+            *args,
+            processes=1,
+            stdout=out,
+            **kwargs
+        )
+        return out.getvalue().strip()
+
+    def _read_csv_sheet(self):
+        with open(self._output_path, newline='') as sheet_file:
+            return list(csv.reader(sheet_file))
+
+    def test_passwords_get_generated(self):
+        # Use a chunk size that does not evenly divide the voters.
+        out = self._generate_credentials('--chunk-size=2')
+
+        self.assertEqual(
+            out,
+            'Generated the passwords of 3 voter(s) successfully.'
+        )
+
+        rows = self._read_csv_sheet()
+        self.assertEqual(
+            rows[0],
+            [ 'Username', 'Name', 'Batch', 'Section', 'Password' ]
+        )
+        self.assertEqual(
+            [ row[:4] for row in rows[1:] ],
+            [
+                [ 'juan', 'Cruz, Juan', '0', 'Section 0' ],
+                [ 'pedro', 'Cruz, Pedro', '0', 'Section 0' ],
+                [ 'maria', 'Cruz, Maria', '1', 'Section 1' ]
+            ]
+        )
+        for username, _, _, _, password in rows[1:]:
+            self.assertEqual(len(password), 10)
+            self.assertTrue(
+                User.objects.get(username=username).check_password(password)
+            )
+
+        self.assertTrue(
+            User.objects.get(username='admin').check_password(
+                'admin password'
+            )
+        )
+
+    def test_passwords_get_hashed_in_multiple_processes(self):
+        call_command(
+            'generatecredentials',
+            self._output_path,
+            processes=2,
+            stdout=StringIO()
+        )
+
+        for username, _, _, _, password in self._read_csv_sheet()[1:]:
+            self.assertTrue(
+                User.objects.get(username=username).check_password(password)
+            )
+
+    def test_passwords_of_election_voters_get_generated(self):
+        self._generate_credentials(
+            '--election={}'.format(self._election1.id)
+        )
+
+        self.assertEqual(
+            [ row[0] for row in self._read_csv_sheet()[1:] ],
+            [ 'maria' ]
+        )
+        self.assertTrue(
+            User.objects.get(username='juan').check_password('old password')
+        )
+
+    def test_passwords_of_voters_without_passwords_get_generated(self):
+        juan = User.objects.get(username='juan')
+        juan.set_unusable_password()
+        juan.save()
+
+        self._generate_credentials('--unusable-only')
+
+        self.assertEqual(
+            [ row[0] for row in self._read_csv_sheet()[1:] ],
+            [ 'juan' ]
+        )
+
+    def test_xlsx_credential_sheet(self):
+        # openpyxl only loads files with the right extension.
+        self._output_path += '.xlsx'
+        self._generate_credentials('--format=xlsx')
+
+        workbook = openpyxl.load_workbook(self._output_path)
+        worksheet = workbook.worksheets[0]
+        rows = list(worksheet.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][:4], ( 'juan', 'Cruz, Juan', 0, 'Section 0' ))
+        self.assertTrue(
+            User.objects.get(username='juan').check_password(rows[1][4])
+        )
+
+    def test_non_existent_election(self):
+        with self.assertRaises(CommandError):
+            self._generate_credentials('--election=1000')
+
+        self.assertFalse(os.path.exists(self._output_path))
+
+    def test_passwords_are_kept_if_the_sheet_cannot_be_saved(self):
+        with mock.patch(
+                    'core.management.commands.generatecredentials.os.replace',
+                    side_effect=OSError('Disk full.')
+                ):
+            with self.assertRaises(OSError):
+                self._generate_credentials()
+
+        for voter in User.objects.filter(type=UserType.VOTER):
+            self.assertTrue(voter.check_password('old password'))
+
+        self.assertFalse(os.path.exists(self._output_path))
+        self.assertFalse(os.path.exists(self._output_path + '.part'))
+
+
+class BenchmarkLoginsTest(TestCase):
+    """ Tests the benchmarklogins command. """
+    @override_settings(VOTER_PASSWORD_ITERATIONS=1000)
+    def test_logins_per_second_get_reported(self):
+        out = StringIO()
+        call_command('benchmarklogins', logins=2, voters=1000, stdout=out)
+
+        lines = out.getvalue().strip().split('\n')
+        self.assertEqual(lines[0], 'Hasher: voter_pbkdf2_sha256')
+        self.assertTrue(lines[1].startswith('Time per login: '))
+        self.assertTrue(lines[2].startswith('Logins per second per core: '))
+        self.assertTrue(
+            lines[3].startswith(
+                'Cores needed for 1000 voters to log in within 10 minutes: '
+            )
+        )
+
+    def test_unknown_hasher(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'benchmarklogins',
+                hasher='unknown',
+                stdout=StringIO()
+            )
+
+
+@override_settings(VOTER_PASSWORD_ITERATIONS=1000)
+class LoadTestTest(TransactionTestCase):
+    """
+    Tests the loadtest command.
+
+    The simulated voters vote from other threads, which use their own
+    database connections, so the synthetic data must be committed.
+    """
+    def _load_test(self, *args):
+        out = StringIO()
+        call_command(
+            'loadtest',
+            '--elections=2',
+            '--batches=2',
+            '--sections=2',
+            '--positions=2',
+            '--candidates=2',
+            '--voters=12',
+            '--concurrency=3',
+            *args,
+            stdout=out,
+            stderr=StringIO()
+        )
+        return out.getvalue()
+
+    def test_voters_get_simulated(self):
+        out = self._load_test()
+
+        self.assertIn('Ballots cast: 12 of 12', out)
+        self.assertIn('Failed steps: 0', out)
+        for step in [ 'login', 'index', 'vote' ]:
+            self.assertRegex(out, r'\n{} +12 '.format(step))
+
+        # The synthetic data gets deleted afterwards.
+        self.assertFalse(Election.objects.exists())
+        self.assertFalse(Batch.objects.exists())
+        self.assertFalse(Section.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(CandidateParty.objects.exists())
+
+    def test_synthetic_data_is_kept(self):
+        self._load_test('--keep')
+
+        self.assertEqual(Election.objects.count(), 2)
+        self.assertEqual(
+            VoterProfile.objects.filter(has_voted=True).count(),
+            12
+        )
+
+        # Every voter votes for a candidate in each position.
+        self.assertEqual(Vote.objects.count(), 12 * 2)
+
+        # Every candidate has a party, which the results need.
+        self.assertFalse(Candidate.objects.filter(party=None).exists())
+
+    def test_not_enough_voters_for_the_candidates(self):
+        with self.assertRaises(CommandError):
+            self._load_test('--voters=2')
+
+
+class BenchmarkResultsTest(TestCase):
+    """ Tests the benchmarkresults command. """
+    def setUp(self):
+        output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(output_dir.cleanup)
+        self._output_path = os.path.join(output_dir.name, 'benchmark.json')
+
+    def _benchmark_results(self, *args):
+        out = StringIO()
+        call_command(
+            'benchmarkresults',
+            '--votes=20,50',
+            '--sections=2',
+            '--repeat=1',
+            '--output={}'.format(self._output_path),
+            *args,
+            stdout=out
+        )
+        return out.getvalue()
+
+    def _read_cases(self):
+        with open(self._output_path) as output_file:
+            return json.load(output_file)['cases']
+
+    def test_measurements_get_written(self):
+        self._benchmark_results()
+
+        cases = self._read_cases()
+        self.assertEqual(
+            [ (case['target'], case['votes']) for case in cases ],
+            [
+                ( 'results', 20 ),
+                ( 'export_xlsx', 20 ),
+                ( 'export_csv', 20 ),
+                ( 'results', 50 ),
+                ( 'export_xlsx', 50 ),
+                ( 'export_csv', 50 )
+            ]
+        )
+        for case in cases:
+            self.assertEqual(case['sections'], 2)
+            self.assertTrue(case['queries'] > 0)
+            self.assertTrue(case['wall_time_ms'] > 0)
+            self.assertTrue(case['peak_memory_kb'] > 0)
+
+        # The synthetic elections get rolled back.
+        self.assertFalse(Election.objects.exists())
+        self.assertFalse(Vote.objects.exists())
+
+    def test_measurements_get_compared(self):
+        self._benchmark_results()
+        previous_path = '{}.previous'.format(self._output_path)
+        os.replace(self._output_path, previous_path)
+
+        out = self._benchmark_results('--compare={}'.format(previous_path))
+
+        self.assertIn('Change', out)
+        self.assertIn('queries', out)
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(CommandError):
+            self._benchmark_results('--votes=a,b')
+
+    def test_invalid_comparison_file(self):
+        with self.assertRaises(CommandError):
+            self._benchmark_results('--compare=/non/existent/file.json')
+
+
+class BenchmarkConnectionsTest(TransactionTestCase):
+    """
+    Tests the benchmarkconnections command.
+
+    The command closes the database connection, which cannot be done inside
+    a transaction.
+    """
+    def test_request_times_get_reported(self):
+        out = StringIO()
+        call_command('benchmarkconnections', requests=3, stdout=out)
+
+        lines = out.getvalue().strip().split('\n')
+        self.assertTrue(lines[1].startswith('New connection per request '))
+        self.assertTrue(lines[2].startswith('Persistent connection '))
+        self.assertTrue(
+            lines[3].startswith('Persistent connection with health checks ')
+        )
+        self.assertTrue(
+            lines[4].startswith(
+                'Time saved per request by persistent connections: '
+            )
+        )
+
+    def test_connection_settings_get_restored(self):
+        settings_dict = connection.settings_dict
+        conn_max_age = settings_dict['CONN_MAX_AGE']
+        conn_health_checks = settings_dict['CONN_HEALTH_CHECKS']
+
+        call_command('benchmarkconnections', requests=1, stdout=StringIO())
+
+        self.assertEqual(settings_dict['CONN_MAX_AGE'], conn_max_age)
+        self.assertEqual(
+            settings_dict['CONN_HEALTH_CHECKS'],
+            conn_health_checks
+        )
+
+    def test_inside_a_transaction(self):
+        with transaction.atomic():
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmarkconnections',
+                    requests=1,
+                    stdout=StringIO()
+                )
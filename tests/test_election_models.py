@@ -8,7 +8,8 @@ from django.test import TestCase
 
 from core.models import (
     Vote, Candidate, CandidateParty, CandidatePosition, Election,
-    User, Batch, Section, UserType, VoterProfile
+    User, Batch, Section, UserType, VoterProfile, CandidateTally,
+    CandidateSectionTally
 )
 
 
@@ -1423,3 +1424,151 @@ class ElectionTest(TestCase):
 
     def test_str(self):
         self.assertEqual(str(self._election), 'Election')
+
+
+class CandidateTallyTest(TestCase):
+    """
+    Tests the CandidateTally and CandidateSectionTally models.
+
+    The tallies must be kept current by the database whenever votes are
+    inserted or deleted, regardless of how the votes were inserted or deleted.
+
+    The CandidateSectionTally model must have the candidate, batch, and
+    section unique together. The __str__() methods of the models should
+    return "<Tally for '{candidate username}': {total votes}>" and
+    "<Tally for '{candidate username}' in '{section}' ({batch}): {total votes}>",
+    respectively.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        cls._batch = Batch.objects.create(year=0, election=cls._election)
+        cls._section0 = Section.objects.create(section_name='Section 0')
+        cls._section1 = Section.objects.create(section_name='Section 1')
+        cls._users = list()
+        for i in range(3):
+            user = User.objects.create(
+                username='juan{}'.format(i),
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=cls._batch,
+                section=cls._section0 if i < 2 else cls._section1
+            )
+            cls._users.append(user)
+
+        cls._party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=cls._election
+        )
+        cls._position = CandidatePosition.objects.create(
+            position_name='Amazing Position',
+            position_level=0,
+            election=cls._election
+        )
+        cls._candidate = Candidate.objects.create(
+            user=cls._users[0],
+            party=cls._party,
+            position=cls._position,
+            election=cls._election
+        )
+
+    def test_candidate_without_votes_has_no_tally(self):
+        self.assertFalse(
+            CandidateTally.objects.filter(candidate=self._candidate).exists()
+        )
+
+    def test_tallies_incremented_when_votes_are_created(self):
+        for user in self._users:
+            Vote.objects.create(
+                user=user,
+                candidate=self._candidate,
+                election=self._election
+            )
+
+        self.assertEqual(self._candidate.tally.total_votes, 3)
+        self.assertEqual(
+            CandidateSectionTally.objects.get(
+                candidate=self._candidate,
+                batch=self._batch,
+                section=self._section0
+            ).total_votes,
+            2
+        )
+        self.assertEqual(
+            CandidateSectionTally.objects.get(
+                candidate=self._candidate,
+                batch=self._batch,
+                section=self._section1
+            ).total_votes,
+            1
+        )
+
+    def test_tallies_incremented_when_votes_are_bulk_created(self):
+        Vote.objects.bulk_create([
+            Vote(
+                user=user,
+                candidate=self._candidate,
+                election=self._election
+            ) for user in self._users
+        ])
+
+        self.assertEqual(self._candidate.tally.total_votes, 3)
+
+    def test_tallies_decremented_when_votes_are_deleted(self):
+        for user in self._users:
+            Vote.objects.create(
+                user=user,
+                candidate=self._candidate,
+                election=self._election
+            )
+
+        Vote.objects.filter(user=self._users[2]).delete()
+
+        self.assertEqual(
+            CandidateTally.objects.get(candidate=self._candidate).total_votes,
+            2
+        )
+        self.assertEqual(
+            CandidateSectionTally.objects.get(
+                candidate=self._candidate,
+                batch=self._batch,
+                section=self._section1
+            ).total_votes,
+            0
+        )
+
+    def test_deleting_candidate_with_votes(self):
+        Vote.objects.create(
+            user=self._users[1],
+            candidate=self._candidate,
+            election=self._election
+        )
+
+        self._candidate.delete()
+
+        self.assertFalse(CandidateTally.objects.exists())
+        self.assertFalse(CandidateSectionTally.objects.exists())
+
+    def test_meta_unique_together(self):
+        self.assertEqual(
+            CandidateSectionTally._meta.unique_together,
+            ( ( 'candidate', 'batch', 'section', ), )
+        )
+
+    def test_str(self):
+        Vote.objects.create(
+            user=self._users[0],
+            candidate=self._candidate,
+            election=self._election
+        )
+
+        self.assertEqual(
+            str(self._candidate.tally),
+            '<Tally for \'juan0\': 1>'
+        )
+        self.assertEqual(
+            str(self._candidate.section_tallies.get()),
+            '<Tally for \'juan0\' in \'Section 0\' (0): 1>'
+        )
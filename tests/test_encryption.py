@@ -0,0 +1,132 @@
+from django.test import (
+    TestCase, override_settings
+)
+from phe.util import powmod
+from unittest import mock
+
+from core.encryption import (
+    ObfuscatorPool, add_ciphertexts, decrypt_ciphertexts, encrypt_votes,
+    generate_election_key, get_private_key, get_public_key, sum_ciphertexts
+)
+from core.models import (
+    Election, ElectionKey
+)
+
+
+# Small keys are insecure, but make the tests fast.
+@override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+class EncryptionTest(TestCase):
+    """ Tests the encryption of ballots. """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        cls._election_key = generate_election_key(cls._election)
+
+    def setUp(self):
+        self._public_key = get_public_key(self._election_key)
+        self._private_key = get_private_key(self._election_key)
+
+    def _decrypt(self, ciphertext):
+        return self._private_key.raw_decrypt(int(ciphertext))
+
+    def test_generated_key_is_saved(self):
+        election_key = ElectionKey.objects.get(election=self._election)
+        self.assertEqual(
+            get_public_key(election_key).n,
+            self._public_key.n
+        )
+        self.assertEqual(
+            self._private_key.p * self._private_key.q,
+            self._public_key.n
+        )
+
+    def test_encrypt_votes(self):
+        votes = encrypt_votes(self._public_key, [ 1, 2, 3 ], { 2 })
+
+        self.assertEqual(
+            { candidate_id: self._decrypt(ciphertext)
+                for candidate_id, ciphertext in votes.items() },
+            { '1': 0, '2': 1, '3': 0 }
+        )
+
+    def test_votes_get_different_ciphertexts(self):
+        votes = encrypt_votes(self._public_key, [ 1, 2 ], set())
+        self.assertNotEqual(votes['1'], votes['2'])
+
+    def test_add_ciphertexts(self):
+        ciphertexts = [
+            encrypt_votes(self._public_key, [ 1 ], { 1 })['1']
+            for _ in range(3)
+        ]
+        ciphertexts.append(encrypt_votes(self._public_key, [ 1 ], set())['1'])
+
+        self.assertEqual(
+            self._decrypt(add_ciphertexts(self._public_key, ciphertexts)),
+            3
+        )
+
+    def test_add_no_ciphertexts(self):
+        self.assertEqual(
+            self._decrypt(add_ciphertexts(self._public_key, list())),
+            0
+        )
+
+    def test_sum_ciphertexts(self):
+        ciphertexts = [
+            encrypt_votes(self._public_key, [ 1 ], { 1 })['1']
+            for _ in range(7)
+        ]
+
+        # A fan-in of 2 makes the ciphertexts get summed in a few levels.
+        self.assertEqual(
+            sum_ciphertexts(self._public_key, ciphertexts, fan_in=2),
+            add_ciphertexts(self._public_key, ciphertexts)
+        )
+
+    def test_decrypt_ciphertexts(self):
+        votes = encrypt_votes(self._public_key, [ 1, 2, 3 ], { 1, 3 })
+
+        self.assertEqual(
+            decrypt_ciphertexts(
+                self._private_key,
+                [ votes['1'], votes['2'], votes['3'] ]
+            ),
+            [ 1, 0, 1 ]
+        )
+
+
+@override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+class ObfuscatorPoolTest(TestCase):
+    """ Tests the pool of precomputed obfuscators. """
+    def setUp(self):
+        election = Election.objects.create(name='Election')
+        election_key = generate_election_key(election)
+        self._public_key = get_public_key(election_key)
+        self._private_key = get_private_key(election_key)
+
+    def test_pool_gets_filled(self):
+        pool = ObfuscatorPool(self._public_key, size=4)
+        pool.refill().result()
+
+        self.assertEqual(len(pool), 4)
+
+    def test_obfuscators_are_not_reused(self):
+        pool = ObfuscatorPool(self._public_key, size=4)
+        pool.refill().result()
+
+        obfuscators = [ pool.get() for _ in range(4) ]
+        self.assertEqual(len(set(obfuscators)), 4)
+
+    def test_empty_pool_computes_obfuscators(self):
+        pool = ObfuscatorPool(self._public_key, size=4)
+        obfuscator = pool.get()
+
+        # An obfuscator is an encryption of 0.
+        self.assertEqual(self._private_key.raw_decrypt(obfuscator), 0)
+
+    def test_obfuscators_are_computed_with_gmpy2_if_installed(self):
+        # The Paillier library uses gmpy2 in powmod() when it is installed.
+        with mock.patch('core.encryption.powmod', wraps=powmod) as mock_powmod:
+            ObfuscatorPool(self._public_key, size=4).get()
+
+        self.assertTrue(mock_powmod.called)
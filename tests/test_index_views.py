@@ -4,12 +4,17 @@ import os
 
 from bs4 import BeautifulSoup
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from core.models import (
     User, Batch, Section, Candidate, CandidateParty, CandidatePosition, Vote,
-    UserType, Election, VoterProfile
+    Receipt, UserType, Election, VoterProfile
 )
 from core.utils import AppSettings
 
@@ -612,6 +617,153 @@ class VotingSubviewTargetBatchesTest(TestCase):
         )
 
 
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class VotingSubviewBallotCacheTest(TransactionTestCase):
+    """
+    Tests the caching of the ballots shown in the voting subview.
+
+    Ballots are the same for every voter in a batch, so they are cached per
+    batch, and only get rebuilt once the candidates, parties, positions, or
+    batches change. This test case is a TransactionTestCase, since cached
+    ballots are not used inside transactions.
+    """
+    def setUp(self):
+        cache.clear()
+
+        _election = Election.objects.create(name='Election')
+        self._batch0 = Batch.objects.create(year=0, election=_election)
+        self._batch1 = Batch.objects.create(year=1, election=_election)
+        _section0 = Section.objects.create(section_name='Section 0')
+        _section1 = Section.objects.create(section_name='Section 1')
+
+        users = list()
+        for username, batch, section in [ ('juan', self._batch0, _section0),
+                                          ('pedro', self._batch0, _section0),
+                                          ('pasta', self._batch1, _section1) ]:
+            user = User.objects.create(
+                username=username,
+                first_name=username.capitalize(),
+                last_name='Sample',
+                type=UserType.VOTER
+            )
+            user.set_password('sample')
+            user.save()
+
+            VoterProfile.objects.create(
+                user=user,
+                batch=batch,
+                section=section
+            )
+            users.append(user)
+
+        self._party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=_election
+        )
+        self._position = CandidatePosition.objects.create(
+            position_name='Amazing Position',
+            position_level=0,
+            election=_election
+        )
+        self._candidate = Candidate.objects.create(
+            user=users[2],
+            party=self._party,
+            position=self._position,
+            election=_election
+        )
+
+    def test_ballot_is_reused_by_voters_in_the_same_batch(self):
+        self.client.login(username='juan', password='sample')
+        self.client.get('/')
+
+        self.client.login(username='pedro', password='sample')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+
+        self.assertEqual(
+            response.context['candidates']['Amazing Position']['candidates'],
+            [ self._candidate ]
+        )
+        self.assertFalse(
+            any('"core_candidate"' in query['sql'] for query in queries)
+        )
+
+    def test_ballot_is_rebuilt_when_a_party_changes(self):
+        self.client.login(username='juan', password='sample')
+        self.client.get('/')
+
+        self._party.party_name = 'Amazing Party'
+        self._party.save()
+
+        response = self.client.get('/')
+        candidates = response.context['candidates']
+        self.assertEqual(
+            candidates['Amazing Position']['candidates'][0].party.party_name,
+            'Amazing Party'
+        )
+
+    def test_ballot_is_rebuilt_when_target_batches_change(self):
+        self.client.login(username='juan', password='sample')
+        self.client.get('/')
+
+        self._position.target_batches.add(self._batch1)
+
+        response = self.client.get('/')
+        self.assertEqual(response.context['candidates'], OrderedDict())
+
+    def test_ballot_is_not_rebuilt_when_voters_log_in(self):
+        self.client.login(username='juan', password='sample')
+        self.client.get('/')
+
+        self.client.login(username='pasta', password='sample')
+        self.client.login(username='pedro', password='sample')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/')
+
+        self.assertFalse(
+            any('"core_candidate"' in query['sql'] for query in queries)
+        )
+
+    def test_rendered_ballot_is_reused_without_the_csrf_token(self):
+        self.client.login(username='juan', password='sample')
+        response = self.client.get('/')
+        juan_csrf_token = response.context['csrf_token']
+
+        self.client.login(username='pedro', password='sample')
+        with self.assertTemplateNotUsed('default/index_subviews/ballot.html'):
+            response = self.client.get('/')
+
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertEqual(
+            [ button['value'] for button in soup.select('.vote-btn') ],
+            [ str(self._candidate.id) ]
+        )
+        self.assertNotEqual(
+            soup.find('input', { 'name': 'csrfmiddlewaretoken' })['value'],
+            str(juan_csrf_token)
+        )
+
+    def test_rendered_ballot_is_rebuilt_when_a_party_changes(self):
+        self.client.login(username='juan', password='sample')
+        self.client.get('/')
+
+        self._party.party_name = 'Amazing Party'
+        self._party.save()
+
+        response = self.client.get('/')
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertEqual(
+            soup.select_one('.candidate h4').get_text(),
+            'Amazing Party'
+        )
+
+
 class VotedSubviewTest(TestCase):
     """
     Tests the voted sub-view in the index view (accessed via `/`).
@@ -683,6 +835,23 @@ class VotedSubviewTest(TestCase):
         response = self.client.get('/')
         self.assertTemplateUsed(response, 'default/index.html')
 
+    def test_voted_subview_shows_receipt(self):
+        self.client.login(username='juan', password='sample')
+        response = self.client.post(
+            reverse('vote-processing'),
+            { 'candidates_voted': json.dumps([ self._candidate1.id ]) },
+            follow=True
+        )
+
+        receipt = Receipt.objects.get()
+        self.assertEqual(response.context['receipt'], receipt.receipt)
+        self.assertIn(receipt.receipt, response.content.decode('utf-8'))
+
+    def test_voted_subview_without_receipt(self):
+        # Voters who logged in again after voting have no receipt to show.
+        response = self.client.get('/')
+        self.assertIsNone(response.context['receipt'])
+
     def _get_logout_button(self, view_html):
         view_html_soup = BeautifulSoup(view_html, 'html.parser')
         button = view_html_soup.find('button', class_='logout-btn')
@@ -0,0 +1,103 @@
+from django.core.cache import cache
+from django.test import (
+    TestCase, override_settings
+)
+from django.urls import reverse
+
+from core.metrics import get_request_metrics_summary
+from core.models import (
+    User, UserType
+)
+
+
+@override_settings(
+    REQUEST_METRICS=True,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class RequestMetricsMiddlewareTest(TestCase):
+    """
+    Tests the request metrics middleware.
+
+    The middleware records the number of SQL queries, and the time spent on
+    the database, on rendering templates, and on the whole request, of each
+    request to a view. The metrics are logged, and kept for a rolling summary
+    of the most recent requests to each view.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls._admin = User(username='admin', type=UserType.ADMIN)
+        cls._admin.set_password('root')
+        cls._admin.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_request_metrics_get_logged(self):
+        with self.assertLogs('botos.requests', level='INFO') as logs:
+            self.client.get(reverse('index'))
+
+        self.assertEqual(len(logs.records), 1)
+
+        record = logs.records[0]
+        self.assertEqual(record.view, 'IndexView')
+        self.assertEqual(record.method, 'GET')
+        self.assertEqual(record.status, 200)
+        self.assertTrue(record.queries > 0)
+        self.assertTrue(record.template_ms > 0)
+        # Queries may be run while rendering templates, so the database and
+        # template times may overlap.
+        self.assertTrue(record.wall_ms >= record.db_ms)
+        self.assertTrue(record.wall_ms >= record.template_ms)
+        self.assertIn('view=IndexView method=GET', record.getMessage())
+
+    def test_request_metrics_get_summarized(self):
+        with self.assertLogs('botos.requests', level='INFO'):
+            for _ in range(3):
+                self.client.get(reverse('index'))
+
+            self.client.login(username='admin', password='root')
+            self.client.get(reverse('results'))
+
+        summary = get_request_metrics_summary()
+        self.assertEqual(
+            [ view_metrics['view'] for view_metrics in summary ],
+            [ 'IndexView', 'ResultsView' ]
+        )
+        self.assertEqual(summary[0]['num_requests'], 3)
+        self.assertEqual(summary[1]['num_requests'], 1)
+        self.assertTrue(summary[1]['max_queries'] > 0)
+
+    def test_requests_without_views_do_not_get_recorded(self):
+        with self.assertLogs('botos.requests', level='INFO') as logs:
+            self.client.get('/non-existent-page/')
+
+            # assertLogs() fails if nothing gets logged at all.
+            self.client.get(reverse('index'))
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].view, 'IndexView')
+
+    def test_summary_is_shown_in_election_settings(self):
+        self.client.login(username='admin', password='root')
+        with self.assertLogs('botos.requests', level='INFO'):
+            self.client.get(reverse('index'))
+            response = self.client.get(reverse('admin-election-index'))
+
+        self.assertEqual(
+            response.context['request_metrics_summary'][0]['view'],
+            'IndexView'
+        )
+        self.assertContains(response, 'Request Metrics')
+
+
+class RequestMetricsMiddlewareDisabledTest(TestCase):
+    """ Tests that the request metrics are not collected by default. """
+    def test_request_metrics_do_not_get_recorded(self):
+        with self.assertNoLogs('botos.requests', level='INFO'):
+            response = self.client.get(reverse('index'))
+
+        self.assertEqual(response.status_code, 200)
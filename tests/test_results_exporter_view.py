@@ -1,19 +1,51 @@
+import csv
 import io
+import tempfile
 
 import openpyxl
 
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import (
-    Client, TestCase
+    Client, TestCase, TransactionTestCase, override_settings
 )
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.exporters import XLSXResultsExporter
 from core.models import (
     User, Batch, Section, Election, Candidate, CandidateParty,
-    CandidatePosition, Vote, VoterProfile, Setting, UserType
+    CandidatePosition, Vote, VoterProfile, Setting, UserType, ExportJob,
+    ExportJobStatus
 )
+from core.utils import get_cache_version
 
 
-class ResultsExporter(TestCase):
+class ExportRootTestMixin(object):
+    """
+    Makes the exported results get stored in a temporary directory.
+    """
+    def setUp(self):
+        super().setUp()
+
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+
+        settings_override = override_settings(EXPORT_ROOT=export_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _export(self, data=None):
+        # The first request only creates the export job, which is then run
+        # by the worker. The second request gets the exported file.
+        self.client.get(reverse('results-export'), data)
+        call_command('runexportjobs', once=True, verbosity=0)
+
+        return self.client.get(reverse('results-export'), data)
+
+
+class ResultsExporter(ExportRootTestMixin, TestCase):
     """
     Tests the results xlsx exporter view.
 
@@ -25,7 +57,12 @@ class ResultsExporter(TestCase):
     results of all elections to be exported, with each election having its
     own worksheet. Other URL parameters will be ignored. Invalid election
     parameter values, e.g. non-existent election IDs and non-integer parameters,
-    will return an error message.
+    will return an error message. GET requests may also have a format
+    parameter, which must either be 'xlsx' or 'csv'.
+
+    The results are exported in the background by the export job worker. So,
+    the first request only creates an export job. Once the job is done, the
+    exported file is served until the results change.
 
     View URL: '/results/export'
     """
@@ -130,6 +167,7 @@ class ResultsExporter(TestCase):
         _admin.save()
 
     def setUp(self):
+        super().setUp()
         self.client.login(username='admin', password='root')
 
     def test_anonymous_get_requests_redirected_to_index(self):
@@ -146,7 +184,7 @@ class ResultsExporter(TestCase):
         self.assertRedirects(response, reverse('index'))
 
     def test_get_all_elections_xlsx(self):
-        response = self.client.get(reverse('results-export'))
+        response = self._export()
 
         self.assertEqual(response.status_code, 200)
 
@@ -155,7 +193,9 @@ class ResultsExporter(TestCase):
             'attachment; filename="Election Results.xlsx"'
         )
 
-        wb = openpyxl.load_workbook(io.BytesIO(response.content))
+        wb = openpyxl.load_workbook(
+            io.BytesIO(b''.join(response.streaming_content))
+        )
 
         self.assertEqual(len(wb.worksheets), 2)
 
@@ -348,8 +388,7 @@ class ResultsExporter(TestCase):
         self.assertEqual(str(ws.cell(25, 2).value), 'N/A')
 
     def test_get_election0_xlsx(self):
-        response = self.client.get(
-            reverse('results-export'),
+        response = self._export(
             { 'election': str(Election.objects.get(name='Election 0').id) }
         )
 
@@ -360,7 +399,9 @@ class ResultsExporter(TestCase):
             'attachment; filename="Election 0 Results.xlsx"'
         )
 
-        wb = openpyxl.load_workbook(io.BytesIO(response.content))
+        wb = openpyxl.load_workbook(
+            io.BytesIO(b''.join(response.streaming_content))
+        )
 
         self.assertEqual(len(wb.worksheets), 1)
 
@@ -457,6 +498,164 @@ class ResultsExporter(TestCase):
         self.assertEqual(str(ws.cell(23, 5).value), '1')
         self.assertEqual(str(ws.cell(25, 2).value), 'N/A')
 
+    def test_get_xlsx_is_streamed_with_merged_header_cells(self):
+        response = self._export()
+
+        self.assertTrue(response.streaming)
+
+        wb = openpyxl.load_workbook(
+            io.BytesIO(b''.join(response.streaming_content))
+        )
+        ws = wb.worksheets[0]
+
+        self.assertEqual(
+            sorted(str(cell_range) for cell_range in ws.merged_cells.ranges),
+            sorted([ 'A1:E1', 'B2:E2', 'A2:A4', 'E3:E4', 'B3:C3' ])
+        )
+
+    def test_xlsx_export_num_queries_independent_of_num_sections(self):
+        election = Election.objects.get(name='Election 0')
+        with CaptureQueriesContext(connection) as queries:
+            XLSXResultsExporter().write(election.id, io.BytesIO())
+        num_queries = len(queries)
+
+        batch = Batch.objects.get(year=0)
+        position = CandidatePosition.objects.get(position_name='Position 0')
+        party = CandidateParty.objects.get(party_name='Party 2')
+        for i in range(3):
+            section = Section.objects.create(section_name='Extra {}'.format(i))
+            voter = User.objects.create(
+                username='extra{}'.format(i),
+                first_name='Extra',
+                last_name=str(i),
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=voter,
+                batch=batch,
+                section=section
+            )
+            candidate = Candidate.objects.create(
+                user=voter,
+                party=party,
+                position=position,
+                election=election
+            )
+            Vote.objects.create(
+                user=voter,
+                candidate=candidate,
+                election=election
+            )
+
+        xlsx_file = io.BytesIO()
+        with CaptureQueriesContext(connection) as queries:
+            XLSXResultsExporter().write(election.id, xlsx_file)
+
+        self.assertEqual(len(queries), num_queries)
+
+        wb = openpyxl.load_workbook(xlsx_file)
+        ws = wb.worksheets[0]
+
+        self.assertEqual(ws.max_column, 8)
+        self.assertEqual(str(ws.cell(4, 4).value), 'Extra 0')
+
+        # The new candidates are in rows 11 to 13, in no particular order.
+        rows = {
+            str(ws.cell(row, 1).value): [
+                ws.cell(row, col).value for col in range(2, 9)
+            ] for row in range(11, 14)
+        }
+        self.assertEqual(rows['0, Extra'], [ 0, 0, 1, 0, 0, 0, 1 ])
+        self.assertEqual(rows['1, Extra'], [ 0, 0, 0, 1, 0, 0, 1 ])
+
+    def test_get_election0_csv(self):
+        response = self._export({
+            'election': str(Election.objects.get(name='Election 0').id),
+            'format': 'csv'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="Election 0 Results.csv"'
+        )
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(
+            rows[0],
+            [
+                'Election', 'Position', 'Party', 'Candidate', 'Batch',
+                'Section', 'Number of Votes', 'Total Votes'
+            ]
+        )
+        # 6 candidates with votes from 3 sections each.
+        self.assertEqual(len(rows), 19)
+        self.assertIn(
+            [ 'Election 0', 'Position 1', 'Party 0', '1, 1', '0', '0', '2',
+              '2' ],
+            rows
+        )
+        self.assertIn(
+            [ 'Election 0', 'Position 1', 'Party 0', '1, 1', '0', '1', '0',
+              '2' ],
+            rows
+        )
+
+    def test_first_get_creates_export_job(self):
+        response = self.client.get(
+            reverse('results-export'),
+            HTTP_REFERER=reverse('results'),
+            follow=True
+        )
+
+        messages = list(response.context['messages'])
+        self.assertEqual(
+            messages[0].message,
+            'The results are being exported. Please download them again in '
+            'a moment.'
+        )
+        self.assertRedirects(response, reverse('results'))
+
+        job = ExportJob.objects.get()
+        self.assertIsNone(job.election)
+        self.assertEqual(job.file_format, 'xlsx')
+        self.assertEqual(job.status, ExportJobStatus.PENDING)
+
+    def test_get_does_not_create_export_job_if_one_is_pending(self):
+        self.client.get(reverse('results-export'))
+        self.client.get(reverse('results-export'))
+
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_exported_file_is_served_again_if_results_unchanged(self):
+        self._export()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('results-export'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.assertFalse(
+            any('"core_vote"' in query['sql'] for query in queries)
+        )
+
+    def test_get_with_invalid_format(self):
+        response = self.client.get(
+            reverse('results-export'),
+            { 'format': 'pdf' },
+            HTTP_REFERER=reverse('results'),
+            follow=True
+        )
+
+        messages = list(response.context['messages'])
+        self.assertEqual(
+            messages[0].message,
+            'You specified an unsupported export format.'
+        )
+        self.assertRedirects(response, reverse('results'))
+        self.assertFalse(ExportJob.objects.exists())
+
     def test_get_with_invalid_election_id_non_existent_election_id(self):
         response = self.client.get(
             reverse('results-export'),
@@ -516,3 +715,83 @@ class ResultsExporter(TestCase):
             'You specified a non-integer election ID.'
         )
         self.assertRedirects(response, reverse('results'))
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class ResultsExportVersionTest(ExportRootTestMixin, TransactionTestCase):
+    """
+    Tests that the exported results are only served again until the results
+    change. This test case is a TransactionTestCase, since the version of the
+    results only changes once the changes to the results are committed.
+    """
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        _election = Election.objects.create(name='Election')
+        self._party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=_election
+        )
+
+        _admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        _admin.set_password('root')
+        _admin.save()
+
+        self.client.login(username='admin', password='root')
+
+    def test_results_are_exported_again_after_results_change(self):
+        response = self._export()
+        self.assertEqual(response.status_code, 200)
+
+        self._party.party_name = 'Amazing Party'
+        self._party.save()
+
+        # The older results are served, with the time they were exported,
+        # until the newer results are exported.
+        response = self.client.get(reverse('results-export'))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response['Content-Disposition'],
+            r'^attachment; filename="Election Results \(as of '
+            r'\d{4}-\d{2}-\d{2} \d{2}-\d{2}-\d{2}\)\.xlsx"$'
+        )
+        self.assertEqual(
+            ExportJob.objects.filter(status=ExportJobStatus.PENDING).count(),
+            1
+        )
+
+        call_command('runexportjobs', once=True, verbosity=0)
+
+        # Exports of the older results get deleted.
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+        response = self.client.get(reverse('results-export'))
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="Election Results.xlsx"'
+        )
+
+    def test_pending_export_job_is_reused_while_results_change(self):
+        self._export()
+
+        for party_name in [ 'Amazing Party', 'Awesome Party' ]:
+            self._party.party_name = party_name
+            self._party.save()
+
+            self.client.get(reverse('results-export'))
+
+        pending_jobs = ExportJob.objects.filter(
+            status=ExportJobStatus.PENDING
+        )
+        self.assertEqual(pending_jobs.count(), 1)
+        self.assertEqual(
+            pending_jobs.get().results_version,
+            get_cache_version('results')
+        )
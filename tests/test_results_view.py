@@ -1,6 +1,17 @@
+import asyncio
+import gc
+import json
+from unittest import mock
+import uuid
+
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import (
-    Client, TestCase
+    Client, TestCase, TransactionTestCase, override_settings
 )
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from core.models import (
@@ -8,6 +19,9 @@ from core.models import (
     CandidatePosition, Vote, Setting, UserType, VoterProfile
 )
 from core.utils import AppSettings
+from core.views.results import (
+    ResultsStreamView, _results_feeds
+)
 
 
 class ResultsViewTest(TestCase):
@@ -446,3 +460,537 @@ class ResultsViewTest(TestCase):
         active_election = response.context['active_election']
 
         self.assertEqual(active_election, self._election0.id)
+
+    def test_results_view_num_queries_independent_of_num_candidates(self):
+        # Make sure that the session has been set up already, so that it
+        # won't affect the number of queries.
+        self.client.get(reverse('results'))
+
+        with CaptureQueriesContext(connection) as queries_before:
+            self.client.get(reverse('results'))
+
+        batch = Batch.objects.get(year=0)
+        section = Section.objects.get(section_name='Section 0')
+        party = CandidateParty.objects.get(party_name='Awesome Party 0')
+        position = CandidatePosition.objects.create(
+            position_name='Amazing Position 2',
+            position_level=1,
+            election=self._election0
+        )
+        for i in range(5):
+            user = User.objects.create(
+                username='extra{}'.format(i),
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=batch,
+                section=section
+            )
+            Candidate.objects.create(
+                user=user,
+                party=party,
+                position=position,
+                election=self._election0
+            )
+
+        with CaptureQueriesContext(connection) as queries_after:
+            response = self.client.get(reverse('results'))
+
+        self.assertEqual(len(response.context['results']), 3)
+        self.assertEqual(len(queries_before), len(queries_after))
+
+
+class ResultsDataViewTest(TestCase):
+    """
+    Tests the results data view.
+
+    The results data view returns the same results as the results view, but
+    as JSON. Responses have an ETag and a Last-Modified header, and
+    conditional requests get a 304 Not Modified response if the results have
+    not changed.
+
+    View URL: `/admin/results/data`
+    """
+    @classmethod
+    def setUpTestData(cls):
+        _election = Election.objects.create(name='Election')
+        _batch = Batch.objects.create(year=0, election=_election)
+        _section = Section.objects.create(section_name='Section')
+
+        _admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        _admin.set_password('root')
+        _admin.save()
+
+        _user = User.objects.create(
+            username='juan',
+            first_name='Juan',
+            last_name='Pepito',
+            type=UserType.VOTER
+        )
+        _user.set_password('pepito')
+        _user.save()
+        VoterProfile.objects.create(
+            user=_user,
+            batch=_batch,
+            section=_section
+        )
+
+        _candidate = Candidate.objects.create(
+            user=_user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=_election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=_election
+            ),
+            election=_election
+        )
+        Vote.objects.create(
+            user=_user,
+            candidate=_candidate,
+            election=_election
+        )
+
+    def setUp(self):
+        self.client.login(username='admin', password='root')
+
+    def test_non_admin_redirected_to_index(self):
+        self.client.login(username='juan', password='pepito')
+        response = self.client.get(reverse('results-data'), follow=True)
+        self.assertRedirects(response, '/')
+
+    def test_results_data(self):
+        AppSettings().set('election_state', 'closed')
+        response = self.client.get(reverse('results-data'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                'election_state': 'closed',
+                'results': {
+                    'Amazing Position': [
+                        {
+                            'name': 'Pepito, Juan',
+                            'party_name': 'Awesome Party',
+                            'avatar_url': '/media/avatars/default.png',
+                            'total_votes': 1
+                        }
+                    ]
+                }
+            }
+        )
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_results_data_with_non_integer_election_id(self):
+        response = self.client.get(
+            reverse('results-data'),
+            { 'election': 'hey' }
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_results_data_not_modified_with_same_etag(self):
+        response = self.client.get(reverse('results-data'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('results-data'),
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(
+            any('"core_candidate"' in query['sql'] for query in queries)
+        )
+
+    def test_results_data_not_modified_since_last_modified(self):
+        response = self.client.get(reverse('results-data'))
+        response = self.client.get(
+            reverse('results-data'),
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class ResultsDataViewVersionTest(TransactionTestCase):
+    """
+    Tests that the results data view responds with new results once the
+    results change. This test case is a TransactionTestCase, since the
+    version of the results only changes once the changes to the results are
+    committed.
+    """
+    def setUp(self):
+        cache.clear()
+
+        _election = Election.objects.create(name='Election')
+        self._party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=_election
+        )
+
+        _admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        _admin.set_password('root')
+        _admin.save()
+
+        self.client.login(username='admin', password='root')
+
+    def test_results_data_modified_after_results_change(self):
+        response = self.client.get(reverse('results-data'))
+        etag = response['ETag']
+
+        self._party.party_name = 'Amazing Party'
+        self._party.save()
+
+        response = self.client.get(
+            reverse('results-data'),
+            HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_results_data_modified_after_election_state_change(self):
+        AppSettings().set('election_state', 'closed')
+        response = self.client.get(reverse('results-data'))
+        etag = response['ETag']
+
+        AppSettings().set('election_state', 'open')
+
+        response = self.client.get(
+            reverse('results-data'),
+            HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['election_state'], 'open')
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class ResultsViewCacheTest(TransactionTestCase):
+    """
+    Tests the caching of the results shown in the results view.
+
+    The results are cached, and only get retrieved again once the results
+    change. The masked results shown while the elections are open are made
+    from the same cached results. This test case is a TransactionTestCase,
+    since cached results are not used inside transactions.
+    """
+    def setUp(self):
+        cache.clear()
+
+        _election = Election.objects.create(name='Election')
+        _party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=_election
+        )
+        _position = CandidatePosition.objects.create(
+            position_name='Amazing Position',
+            election=_election
+        )
+        _batch = Batch.objects.create(year=0, election=_election)
+        _section = Section.objects.create(section_name='Section')
+        for i in range(3):
+            user = User.objects.create(
+                username='juan{}'.format(i),
+                first_name='Juan',
+                last_name=str(i),
+                type=UserType.VOTER
+            )
+            VoterProfile.objects.create(
+                user=user,
+                batch=_batch,
+                section=_section
+            )
+            Candidate.objects.create(
+                user=user,
+                party=_party,
+                position=_position,
+                election=_election
+            )
+
+        _admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        _admin.set_password('root')
+        _admin.save()
+
+        self.client.login(username='admin', password='root')
+
+    def test_masked_results_use_cached_results(self):
+        AppSettings().set('election_state', 'closed')
+        self.client.get(reverse('results'))
+
+        AppSettings().set('election_state', 'open')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('results'))
+
+        self.assertFalse(
+            any('"core_candidate"' in query['sql'] for query in queries)
+        )
+
+        candidates = response.context['results']['Amazing Position']
+        self.assertEqual(len(candidates), 3)
+        for candidate in candidates:
+            self.assertIsNone(candidate.id)
+            self.assertNotIn(candidate.name, [ '0, Juan', '1, Juan', '2, Juan' ])
+            self.assertNotEqual(candidate.party_name, 'Awesome Party')
+
+    def test_results_are_retrieved_again_after_results_change(self):
+        AppSettings().set('election_state', 'closed')
+        self.client.get(reverse('results'))
+
+        candidate = Candidate.objects.get(user__username='juan0')
+        candidate.user.first_name = 'Pedro'
+        candidate.user.save()
+
+        response = self.client.get(reverse('results'))
+        names = [
+            candidate.name
+            for candidate in response.context['results']['Amazing Position']
+        ]
+        self.assertIn('0, Pedro', names)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class ResultsStreamViewTest(TestCase):
+    """
+    Tests the results stream view.
+
+    The results stream view pushes the results to the client as server-sent
+    events. A results event with all the results is sent first. Afterwards,
+    tally events with the new number of votes of candidates are sent as the
+    votes arrive. When served through WSGI, only the results event is sent.
+
+    View URL: `/admin/results/stream`
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        _batch = Batch.objects.create(year=0, election=cls._election)
+        _section = Section.objects.create(section_name='Section')
+
+        _admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        _admin.set_password('root')
+        _admin.save()
+
+        cls._user = User.objects.create(
+            username='juan',
+            first_name='Juan',
+            last_name='Pepito',
+            type=UserType.VOTER
+        )
+        cls._user.set_password('pepito')
+        cls._user.save()
+        VoterProfile.objects.create(
+            user=cls._user,
+            batch=_batch,
+            section=_section
+        )
+
+        cls._candidate = Candidate.objects.create(
+            user=cls._user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=cls._election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=cls._election
+            ),
+            election=cls._election
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='admin', password='root')
+
+    def test_non_admin_redirected_to_index(self):
+        self.client.login(username='juan', password='pepito')
+        response = self.client.get(reverse('results-stream'), follow=True)
+        self.assertRedirects(response, '/')
+
+    def test_wsgi_stream_sends_current_results(self):
+        AppSettings().set('election_state', 'closed')
+        response = self.client.get(reverse('results-stream'))
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = b''.join(response.streaming_content).decode('utf-8')
+        retry, results = events.strip().split('\n\n')
+        self.assertEqual(retry, 'retry: 3000')
+
+        event, data = results.split('\n')
+        self.assertEqual(event, 'event: results')
+        self.assertEqual(
+            json.loads(data[len('data: '):]),
+            {
+                'election_state': 'closed',
+                'results': {
+                    'Amazing Position': [
+                        {
+                            'id': self._candidate.id,
+                            'name': 'Pepito, Juan',
+                            'party_name': 'Awesome Party',
+                            'avatar_url': '/media/avatars/default.png',
+                            'total_votes': 0
+                        }
+                    ]
+                }
+            }
+        )
+
+    def test_stream_masks_candidates_when_elections_are_open(self):
+        AppSettings().set('election_state', 'open')
+        response = self.client.get(reverse('results-stream'))
+
+        events = b''.join(response.streaming_content).decode('utf-8')
+        data = events.strip().split('\n')[-1][len('data: '):]
+        candidate = json.loads(data)['results']['Amazing Position'][0]
+
+        self.assertNotEqual(candidate['id'], self._candidate.id)
+        self.assertNotEqual(candidate['name'], 'Pepito, Juan')
+        self.assertNotEqual(candidate['party_name'], 'Awesome Party')
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class ResultsStreamFeedTest(TransactionTestCase):
+    """
+    Tests the results streams served through ASGI. The streams of a process
+    share a single feed that polls the results for them. This test case is a
+    TransactionTestCase, since the feed polls the results in another thread.
+
+    View URL: `/admin/results/stream`
+    """
+    def setUp(self):
+        cache.clear()
+
+        self._election = Election.objects.create(name='Election')
+        batch = Batch.objects.create(year=0, election=self._election)
+        section = Section.objects.create(section_name='Section')
+
+        admin = User.objects.create(username='admin', type=UserType.ADMIN)
+        admin.set_password('root')
+        admin.save()
+
+        self._user = User.objects.create(
+            username='juan',
+            first_name='Juan',
+            last_name='Pepito',
+            type=UserType.VOTER
+        )
+        VoterProfile.objects.create(
+            user=self._user,
+            batch=batch,
+            section=section
+        )
+
+        self._candidate = Candidate.objects.create(
+            user=self._user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=self._election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=self._election
+            ),
+            election=self._election
+        )
+
+        AppSettings().set('election_state', 'closed')
+
+    async def _open_stream(self):
+        await self.async_client.alogin(username='admin', password='root')
+        return await self.async_client.get(reverse('results-stream'))
+
+    @mock.patch.object(ResultsStreamView, 'poll_interval', 0.01)
+    async def test_asgi_stream_sends_tally_when_votes_arrive(self):
+        response = await self._open_stream()
+
+        events = aiter(response.streaming_content)
+        try:
+            retry = await asyncio.wait_for(anext(events), timeout=5)
+            self.assertEqual(retry, b'retry: 3000\n\n')
+
+            results = await asyncio.wait_for(anext(events), timeout=5)
+            self.assertTrue(results.startswith(b'event: results\n'))
+
+            await sync_to_async(Vote.objects.create)(
+                user=self._user,
+                candidate=self._candidate,
+                election=self._election
+            )
+            # Votes change the results version once they are committed.
+            await sync_to_async(cache.set)(
+                'botos:results_version',
+                uuid.uuid4().hex,
+                timeout=None
+            )
+
+            tally = await asyncio.wait_for(anext(events), timeout=5)
+            self.assertEqual(
+                tally.decode('utf-8'),
+                'event: tally\ndata: {}\n\n'.format(
+                    json.dumps([
+                        { 'id': self._candidate.id, 'total_votes': 1 }
+                    ])
+                )
+            )
+        finally:
+            await events.aclose()
+
+    @mock.patch.object(ResultsStreamView, 'poll_interval', 0.01)
+    async def test_streams_share_a_feed(self):
+        streams = [
+            aiter((await self._open_stream()).streaming_content)
+            for _ in range(2)
+        ]
+        try:
+            for events in streams:
+                retry = await asyncio.wait_for(anext(events), timeout=5)
+                self.assertEqual(retry, b'retry: 3000\n\n')
+
+                results = await asyncio.wait_for(anext(events), timeout=5)
+                self.assertTrue(results.startswith(b'event: results\n'))
+
+            self.assertEqual(list(_results_feeds.keys()), [ None ])
+            self.assertEqual(len(_results_feeds[None]._queues), 2)
+        finally:
+            for events in streams:
+                await events.aclose()
+
+        # Closed streams unsubscribe from the feed once they are finalized.
+        del streams
+        gc.collect()
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(_results_feeds, dict())
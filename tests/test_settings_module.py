@@ -83,6 +83,34 @@ class SettingsModuleTest(TestCase):
             'botos_db'
         )
 
+    def test_get_env_var_func_with_default_value_unavailable(self):
+        fake_env = dict()
+        self.assertEqual(
+            settings.get_env_var(
+                'BOTOS_VOTER_PASSWORD_ITERATIONS',
+                env_source=fake_env,
+                default='100000'
+            ),
+            '100000'
+        )
+
+    def test_get_env_var_func_with_default_value_available(self):
+        fake_env = {
+            "BOTOS_VOTER_PASSWORD_HASHER": 'scrypt'
+        }
+        self.assertEqual(
+            settings.get_env_var(
+                'BOTOS_VOTER_PASSWORD_HASHER',
+                env_source=fake_env,
+                value_meanings={
+                    "pbkdf2": 'voter_pbkdf2_sha256',
+                    "scrypt": 'voter_scrypt'
+                },
+                default='voter_pbkdf2_sha256'
+            ),
+            'voter_scrypt'
+        )
+
     def test_get_env_var_func_error_msg_no_value_meanings(self):
         with self.assertRaises(SystemExit) as e:
             fake_env = dict()
@@ -1,7 +1,10 @@
+from django.contrib.auth.hashers import identify_hasher, make_password
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from django.db import models
-from django.test import TestCase
+from django.test import (
+    TestCase, override_settings
+)
 
 from core.models import (
     User, Batch, Section, UserType, VoterProfile, Election
@@ -123,8 +126,10 @@ class UserModelTest(TestCase):
     # Test the meta class.
     def test_meta_indexes(self):
         indexes = self._user._meta.indexes
-        self.assertEqual(len(indexes), 1)
+        self.assertEqual(len(indexes), 3)
         self.assertEqual(indexes[0].fields, [ 'username' ])
+        self.assertEqual(indexes[1].fields, [ 'type', 'username' ])
+        self.assertEqual(indexes[2].name, 'core_user_full_name_idx')
 
     def test_meta_ordering(self):
         ordering = self._user._meta.ordering
@@ -213,6 +218,79 @@ class UserModelTest(TestCase):
         self.assertFalse(user.is_superuser)
         self.assertFalse(user.is_staff)
 
+    # Test the password functions.
+    def test_set_password_with_voter(self):
+        user = User(username='voter', type=UserType.VOTER)
+        user.set_password('password')
+        self.assertEqual(
+            identify_hasher(user.password).algorithm,
+            'voter_pbkdf2_sha256'
+        )
+        self.assertTrue(user.check_password('password'))
+
+    def test_set_password_with_admin(self):
+        user = User(username='admin', type=UserType.ADMIN)
+        user.set_password('password')
+        self.assertEqual(
+            identify_hasher(user.password).algorithm,
+            'pbkdf2_sha256'
+        )
+        self.assertTrue(user.check_password('password'))
+
+    @override_settings(VOTER_PASSWORD_HASHER='voter_scrypt')
+    def test_set_password_with_voter_and_scrypt_hasher(self):
+        user = User(username='voter', type=UserType.VOTER)
+        user.set_password('password')
+        self.assertEqual(
+            identify_hasher(user.password).algorithm,
+            'voter_scrypt'
+        )
+
+    def test_check_password_rehashes_voter_password_from_other_hasher(self):
+        user = User.objects.create(
+            username='voter',
+            password=make_password('password'),
+            type=UserType.VOTER
+        )
+        self.assertTrue(user.check_password('password'))
+
+        user.refresh_from_db()
+        self.assertEqual(
+            identify_hasher(user.password).algorithm,
+            'voter_pbkdf2_sha256'
+        )
+        self.assertTrue(user.check_password('password'))
+
+    def test_check_password_rehashes_voter_password_with_new_iterations(self):
+        user = User.objects.create(username='voter', type=UserType.VOTER)
+        user.set_password('password')
+        user.save()
+
+        with override_settings(VOTER_PASSWORD_ITERATIONS=1000):
+            self.assertTrue(user.check_password('password'))
+
+        user.refresh_from_db()
+        self.assertEqual(
+            identify_hasher(user.password).decode(user.password)['iterations'],
+            1000
+        )
+
+    def test_check_password_keeps_up_to_date_voter_password(self):
+        user = User.objects.create(username='voter', type=UserType.VOTER)
+        user.set_password('password')
+        user.save()
+        password = user.password
+
+        self.assertTrue(user.check_password('password'))
+
+        user.refresh_from_db()
+        self.assertEqual(user.password, password)
+
+    def test_check_password_with_wrong_password(self):
+        user = User(username='voter', type=UserType.VOTER)
+        user.set_password('password')
+        self.assertFalse(user.check_password('wrong password'))
+
 
 class VoterProfileModelTest(TestCase):
     """
@@ -1,6 +1,17 @@
-from django.test import TestCase
+from unittest import mock
 
-from core.utils import AppSettings
+from django.core.cache import cache
+from django.test import (
+    TestCase, TransactionTestCase, override_settings
+)
+
+from core.models import (
+    Batch, Candidate, CandidateParty, CandidatePosition, CandidateTally,
+    Election, Section, Setting, User, UserType, Vote, VoterProfile
+)
+from core.utils import (
+    AppSettings, change_cache_version, clear_election_votes
+)
 
 
 class AppSettingsTest(TestCase):
@@ -53,3 +64,112 @@ class AppSettingsTest(TestCase):
     def test_non_existent_key_gives_default(self):
         self.assertIsNone(AppSettings().get(69))
         self.assertEqual(AppSettings().get(143, default=69), 69)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+)
+class AppSettingsCacheTest(TransactionTestCase):
+    """
+    Tests the caching of settings in AppSettings.
+
+    The settings are cached in each process, and are only reloaded once the
+    settings version in the shared cache changes. Settings read inside a
+    transaction are always read from the database. This test case is a
+    TransactionTestCase, since the tests in a TestCase are run inside a
+    transaction.
+    """
+    def setUp(self):
+        AppSettings().clear_cache()
+        AppSettings().set('template', 'default')
+
+    def test_cached_settings_read_without_queries(self):
+        AppSettings().get('template')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(AppSettings().get('template'), 'default')
+            self.assertEqual(AppSettings().get(69, default=143), 143)
+
+    def test_setting_a_value_reloads_the_settings(self):
+        AppSettings().get('template')
+        AppSettings().set('template', 'ye-ye-bonel')
+
+        self.assertEqual(AppSettings().get('template'), 'ye-ye-bonel')
+
+    def test_settings_changed_by_another_process_get_reloaded(self):
+        AppSettings().get('template')
+
+        # Simulate another process changing the setting.
+        Setting.objects.filter(key='template').update(value='ye-ye-bonel')
+        self.assertEqual(AppSettings().get('template'), 'default')
+
+        change_cache_version('app_settings')
+        self.assertEqual(AppSettings().get('template'), 'ye-ye-bonel')
+
+    def test_evicted_settings_version_reloads_the_settings(self):
+        AppSettings().get('template')
+        Setting.objects.filter(key='template').update(value='ye-ye-bonel')
+
+        cache.clear()
+        self.assertEqual(AppSettings().get('template'), 'ye-ye-bonel')
+
+
+class ClearElectionVotesTest(TestCase):
+    """
+    Tests `clear_election_votes()`, which clears the votes of an election,
+    along with its encrypted ballots, receipts, and tallies, and lets its
+    voters vote again, in a single transaction.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        batch = Batch.objects.create(year=0, election=cls._election)
+        section = Section.objects.create(section_name='Section')
+
+        user = User.objects.create(username='juan', type=UserType.VOTER)
+        VoterProfile.objects.create(
+            user=user,
+            batch=batch,
+            section=section,
+            has_voted=True
+        )
+
+        candidate = Candidate.objects.create(
+            user=user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=cls._election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=cls._election
+            ),
+            election=cls._election
+        )
+        Vote.objects.create(
+            user=user,
+            candidate=candidate,
+            election=cls._election
+        )
+
+    def test_votes_get_cleared(self):
+        clear_election_votes(self._election)
+
+        self.assertFalse(Vote.objects.exists())
+        self.assertFalse(CandidateTally.objects.exists())
+        self.assertFalse(VoterProfile.objects.filter(has_voted=True).exists())
+
+    def test_nothing_gets_cleared_on_failure(self):
+        with mock.patch(
+                'core.utils.change_cache_version',
+                side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                clear_election_votes(self._election)
+
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(CandidateTally.objects.count(), 1)
+        self.assertTrue(VoterProfile.objects.filter(has_voted=True).exists())
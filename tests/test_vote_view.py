@@ -1,15 +1,26 @@
 import json
+import threading
+from unittest import mock
 
+from django.db import (
+    DatabaseError, connection, transaction
+)
 from django.test import (
-    Client, TestCase
+    Client, TestCase, TransactionTestCase, override_settings
 )
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.encryption import (
+    add_ciphertexts, generate_election_key, get_private_key, get_public_key
+)
 from core.models import (
     User, Batch, Section, Election, Candidate, CandidateParty,
-    CandidatePosition, Vote, VoterProfile, Setting, UserType
+    CandidatePosition, EncryptedBallot, EncryptedTally, Receipt, Vote,
+    VoterProfile, Setting, UserType
 )
 from core.utils import AppSettings
+from core.views import vote
 
 
 class VoteProcessingView(TestCase):
@@ -212,6 +223,23 @@ class VoteProcessingView(TestCase):
 
         self.assertRedirects(response, reverse('index'))
 
+    def test_cast_ballots_get_receipts(self):
+        self.client.login(username='juan', password='pepito')
+
+        self.client.post(
+            reverse('vote-processing'),
+            {
+                'candidates_voted': str([ self._candidate0.id ])
+            }
+        )
+
+        receipt = Receipt.objects.get()
+        self.assertEqual(receipt.index, 0)
+        self.assertEqual(
+            self.client.session['vote_receipt'],
+            receipt.receipt
+        )
+
     def test_non_voted_logged_in_post_requests_with_invalid_data(self):
         self.client.login(username='juan', password='pepito')
 
@@ -500,6 +528,51 @@ class VoteProcessingView(TestCase):
 
         self.assertRedirects(response, reverse('index'))
 
+    def test_casting_votes_again_after_casting_an_empty_ballot(self):
+        self.client.login(username='juan', password='pepito')
+
+        self.client.post(
+            reverse('vote-processing'),
+            { 'candidates_voted': str([]) },
+            follow=True
+        )
+        response = self.client.post(
+            reverse('vote-processing'),
+            { 'candidates_voted': str([ self._candidate0.id ]) },
+            follow=True
+        )
+
+        response_messages = list(response.context['messages'])
+        self.assertEqual(
+            response_messages[0].message,
+            'You are no longer allowed to vote since you have voted already.'
+        )
+
+        # Let's make sure no vote got casted.
+        try:
+            Vote.objects.get(user=self._non_voted_user0)
+            self.fail('Vote was casted.')
+        except Vote.DoesNotExist:
+            pass
+
+        self.assertRedirects(response, reverse('index'))
+
+    def test_casting_invalid_votes_does_not_mark_user_as_voted(self):
+        self.client.login(username='juan1', password='pepito')
+
+        self.client.post(
+            reverse('vote-processing'),
+            {
+                'candidates_voted': str([
+                    self._candidate1.id, self._candidate3.id
+                ])
+            },
+            follow=True
+        )
+
+        self._non_voted_user1.refresh_from_db()
+        self.assertFalse(self._non_voted_user1.voter_profile.has_voted)
+
 
 class VoteProcessingTargetBatchesTest(TestCase):
     """
@@ -648,3 +721,310 @@ class VoteProcessingTargetBatchesTest(TestCase):
             pass
 
         self.assertRedirects(response, reverse('index'))
+
+
+class VoteProcessingQueryCountTest(TestCase):
+    """
+    Tests that the number of queries made when casting votes does not depend
+    on the number of candidates voted.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        _election = Election.objects.create(name='Election')
+        _batch = Batch.objects.create(year=0, election=_election)
+        _section = Section.objects.create(section_name='Section')
+
+        _party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=_election
+        )
+        _position = CandidatePosition.objects.create(
+            position_name='Amazing Position',
+            position_level=0,
+            max_num_selected_candidates=3,
+            election=_election
+        )
+        _position.target_batches.add(_batch)
+
+        cls._candidates = list()
+        for i in range(3):
+            user = User.objects.create(
+                username='juan{}'.format(i),
+                type=UserType.VOTER
+            )
+            user.set_password('sample')
+            user.save()
+
+            VoterProfile.objects.create(
+                user=user,
+                batch=_batch,
+                section=_section
+            )
+
+            cls._candidates.append(
+                Candidate.objects.create(
+                    user=user,
+                    party=_party,
+                    position=_position,
+                    election=_election
+                )
+            )
+
+    def test_num_queries_independent_of_num_candidates_voted(self):
+        self.client.login(username='juan0', password='sample')
+        with CaptureQueriesContext(connection) as single_vote_queries:
+            self.client.post(
+                reverse('vote-processing'),
+                { 'candidates_voted': str([ self._candidates[0].id ]) }
+            )
+
+        self.client.login(username='juan1', password='sample')
+        with CaptureQueriesContext(connection) as many_votes_queries:
+            self.client.post(
+                reverse('vote-processing'),
+                {
+                    'candidates_voted': str([
+                        candidate.id for candidate in self._candidates
+                    ])
+                }
+            )
+
+        self.assertEqual(Vote.objects.count(), 4)
+        self.assertEqual(
+            len(single_vote_queries),
+            len(many_votes_queries)
+        )
+
+
+# Small keys are insecure, but make the tests fast.
+@override_settings(BALLOT_ENCRYPTION_KEY_SIZE=256)
+class VoteProcessingEncryptedTest(TestCase):
+    """
+    Tests the vote processing in elections whose ballots are encrypted.
+    Encrypted ballots are stored without being linked to their voters,
+    instead of being stored as votes. The encrypted tallies of the candidates
+    are only summed up from the ballots once the tallies are finalized.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls._election = Election.objects.create(name='Election')
+        _batch0 = Batch.objects.create(year=0, election=cls._election)
+        _batch1 = Batch.objects.create(year=1, election=cls._election)
+        _section0 = Section.objects.create(section_name='Section 0')
+        _section1 = Section.objects.create(section_name='Section 1')
+
+        _party = CandidateParty.objects.create(
+            party_name='Awesome Party',
+            election=cls._election
+        )
+
+        # The first position can be voted by everyone, while the second one
+        # can only be voted by the first batch, and the third one by the
+        # second batch.
+        cls._positions = list()
+        for i in range(3):
+            cls._positions.append(
+                CandidatePosition.objects.create(
+                    position_name='Amazing Position {}'.format(i),
+                    position_level=i,
+                    election=cls._election
+                )
+            )
+        cls._positions[1].target_batches.add(_batch0)
+        cls._positions[2].target_batches.add(_batch1)
+
+        # The first two candidates run for the first position, and the rest
+        # for the other positions.
+        cls._candidates = list()
+        for i, position in enumerate([ 0, 0, 1, 2 ]):
+            user = User.objects.create(
+                username='juan{}'.format(i),
+                type=UserType.VOTER
+            )
+            user.set_password('sample')
+            user.save()
+
+            VoterProfile.objects.create(
+                user=user,
+                batch=_batch0 if i < 3 else _batch1,
+                section=_section0 if i < 3 else _section1
+            )
+
+            cls._candidates.append(
+                Candidate.objects.create(
+                    user=user,
+                    party=_party,
+                    position=cls._positions[position],
+                    election=cls._election
+                )
+            )
+
+        cls._election_key = generate_election_key(cls._election)
+
+    def _vote(self, username, candidates):
+        self.client.login(username=username, password='sample')
+        self.client.post(
+            reverse('vote-processing'),
+            {
+                'candidates_voted': str([
+                    candidate.id for candidate in candidates
+                ])
+            }
+        )
+
+    def _get_decrypted_tallies(self):
+        public_key = get_public_key(self._election_key)
+        private_key = get_private_key(self._election_key)
+
+        candidate_ciphertexts = dict()
+        for ballot in EncryptedBallot.objects.all():
+            for candidate_id, ciphertext in ballot.votes.items():
+                candidate_ciphertexts.setdefault(
+                    int(candidate_id),
+                    list()
+                ).append(ciphertext)
+
+        return {
+            candidate_id: private_key.raw_decrypt(
+                add_ciphertexts(public_key, ciphertexts)
+            )
+            for candidate_id, ciphertexts in candidate_ciphertexts.items()
+        }
+
+    def test_encrypted_ballots_get_cast(self):
+        self._vote('juan0', [ self._candidates[0], self._candidates[2] ])
+
+        self.assertFalse(Vote.objects.exists())
+        self.assertTrue(
+            VoterProfile.objects.get(user__username='juan0').has_voted
+        )
+
+        # Only the positions the voter can vote in get ballots, including
+        # the position the voter did not vote in.
+        ballots = EncryptedBallot.objects.order_by('position__id')
+        self.assertEqual(
+            [ ballot.position for ballot in ballots ],
+            self._positions[:2]
+        )
+        self.assertEqual(
+            set(ballots[0].votes.keys()),
+            { str(self._candidates[0].id), str(self._candidates[1].id) }
+        )
+
+    def test_encrypted_ballots_sum_up_to_the_tallies(self):
+        self._vote('juan0', [ self._candidates[0], self._candidates[2] ])
+        self._vote('juan1', [ self._candidates[0] ])
+        self._vote('juan2', [])
+        self._vote('juan3', [ self._candidates[1], self._candidates[3] ])
+
+        self.assertEqual(
+            self._get_decrypted_tallies(),
+            {
+                self._candidates[0].id: 2,
+                self._candidates[1].id: 1,
+                self._candidates[2].id: 1,
+                self._candidates[3].id: 1
+            }
+        )
+
+        # The encrypted tallies are only written once the tallies are
+        # finalized, so that ballots do not lock them.
+        self.assertFalse(EncryptedTally.objects.exists())
+
+    def test_encrypted_ballots_get_receipts(self):
+        self._vote('juan0', [ self._candidates[0] ])
+        self._vote('juan3', [ self._candidates[3] ])
+
+        self.assertEqual(
+            list(Receipt.objects.values_list('index', flat=True)),
+            [ 0, 1 ]
+        )
+
+    def test_invalid_ballots_are_not_cast(self):
+        # The third candidate's position cannot be voted by the second batch.
+        self._vote('juan3', [ self._candidates[2] ])
+
+        self.assertFalse(EncryptedBallot.objects.exists())
+        self.assertFalse(EncryptedTally.objects.exists())
+        self.assertFalse(Receipt.objects.exists())
+        self.assertFalse(
+            VoterProfile.objects.get(user__username='juan3').has_voted
+        )
+
+
+class VoteProcessingElectionLockTest(TransactionTestCase):
+    """
+    Tests that ballots lock the row of their election until they are cast,
+    so that the election cannot get a key while a ballot is being cast. This
+    test case is a TransactionTestCase, since the ballot is cast in another
+    thread.
+    """
+    def setUp(self):
+        self._election = Election.objects.create(name='Election')
+        batch = Batch.objects.create(year=0, election=self._election)
+        section = Section.objects.create(section_name='Section')
+
+        user = User.objects.create(username='juan', type=UserType.VOTER)
+        user.set_password('sample')
+        user.save()
+        VoterProfile.objects.create(user=user, batch=batch, section=section)
+
+        self._candidate = Candidate.objects.create(
+            user=user,
+            party=CandidateParty.objects.create(
+                party_name='Awesome Party',
+                election=self._election
+            ),
+            position=CandidatePosition.objects.create(
+                position_name='Amazing Position',
+                election=self._election
+            ),
+            election=self._election
+        )
+
+    def test_ballots_lock_their_election(self):
+        ballot_started = threading.Event()
+        finish_ballot = threading.Event()
+        get_valid_voted_candidates = \
+            vote.VoteProcessingView._get_valid_voted_candidates
+
+        # The ballot is paused after it checks whether the election has a
+        # key, and before its votes are inserted.
+        def pause_ballot(view, *args):
+            ballot_started.set()
+            finish_ballot.wait(timeout=10)
+            return get_valid_voted_candidates(view, *args)
+
+        def cast_ballot():
+            try:
+                client = Client()
+                client.login(username='juan', password='sample')
+                client.post(
+                    reverse('vote-processing'),
+                    { 'candidates_voted': str([ self._candidate.id ]) }
+                )
+            finally:
+                connection.close()
+
+        with mock.patch.object(
+                vote.VoteProcessingView,
+                '_get_valid_voted_candidates',
+                autospec=True,
+                side_effect=pause_ballot):
+            thread = threading.Thread(target=cast_ballot)
+            thread.start()
+            try:
+                self.assertTrue(ballot_started.wait(timeout=10))
+
+                # The election key job locks the election before storing the
+                # key.
+                with self.assertRaises(DatabaseError):
+                    with transaction.atomic():
+                        Election.objects \
+                                .select_for_update(nowait=True) \
+                                .get(id=self._election.id)
+            finally:
+                finish_ballot.set()
+                thread.join()
+
+        self.assertEqual(Vote.objects.count(), 1)